@@ -0,0 +1,7 @@
+"""
+Benchmarks of state machine micro-service, run them from repository root e.g.
+
+    python -m benchmarks.write_path --requests 2000
+    python -m benchmarks.service --json results.json [--compare baseline.json]
+    python -m benchmarks.formats --entries 1000 [--json results.json]
+"""
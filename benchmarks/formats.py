@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- benchmarks.formats
+~~~~~~~~~~~~~~
+
+- Payload size, encode & decode time of response formats, for life cycles of growing length.
+
+    - Formats are DRF `JSONRenderer` / `JSONParser` (baseline), `FastJSONRenderer` / `FastJSONParser` and
+      `MessagePackRenderer` / `MessagePackParser`, each sent as it is, gzip & brotli compressed, with levels of
+      `STATE_MACHINE_COMPRESSION`. Formats & encodings whose optional package is missing are skipped.
+    - Life cycles are built in memory, shaped as life cycle endpoint serializes them (HTTP service attached to
+      every other entry), no database is needed.
+    - Times are medians of `--repeat` runs, encode is rendering (+ compression), decode is (decompression +)
+      parsing, as a client does it.
+
+    python -m benchmarks.formats [--entries 10 --entries 1000] [--repeat 20] [--json results.json]
+"""
+
+# future
+from __future__ import division, print_function, unicode_literals
+
+# 3rd party
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+SERVICE = OrderedDict((
+    ('headers', {'Content-Type': 'application/json', 'X-Request-Id': '6f1c2a9e-0d4b-4c5e-9a57-3e1b2f4d8c10'}),
+    ('dataIn', {'order_id': 1, 'items': [{'sku': 'A-1', 'quantity': 2}, {'sku': 'B-7', 'quantity': 1}]}),
+    ('dataOut', {'status': 'accepted', 'eta_seconds': 120}),
+    ('upstream_url', 'http://localhost:8002/orders/'),
+    ('method', 'post'),
+    ('created_at', '2017-04-01T10:00:00.000000Z'),
+))
+
+NO_SERVICE = OrderedDict((('headers', None), ('dataIn', None), ('dataOut', None), ('upstream_url', ''),
+                          ('method', None)))
+
+STATES = ('init', 'pending', 'processing', 'failed', 'processing', 'complete')
+
+
+def _setup(settings_module):
+    """
+    :param settings_module: Django settings module
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import django
+    django.setup()
+
+
+def life_cycle(entries):
+    """
+    :param entries: number of life cycle entries
+    :return: life cycle as serialized by `TransactionLifeCycleSerializer`, newest first
+    """
+    started = datetime(2017, 4, 1, 10)
+    rows = []
+    for number in range(entries, 0, -1):
+        rows.append(OrderedDict((
+            ('id', 1000000 + number),
+            ('task_identifier', 'order-7f3c9b'),
+            ('service', SERVICE if number % 2 else NO_SERVICE),
+            ('state', STATES[number % len(STATES)]),
+            ('created_at', (started + timedelta(seconds=number)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')),
+        )))
+    return rows
+
+
+def formats():
+    """
+    :return: OrderedDict of format name -> (renderer, parser), formats of missing packages left out
+    """
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from state_machine import parsers, renderers
+
+    available = OrderedDict((('json (drf)', (JSONRenderer(), JSONParser())), ))
+    if renderers.orjson is not None:
+        available['json (orjson)'] = (renderers.FastJSONRenderer(), parsers.FastJSONParser())
+    if renderers.msgpack is not None:
+        available['msgpack'] = (renderers.MessagePackRenderer(), parsers.MessagePackParser())
+    return available
+
+
+def encodings():
+    """
+    :return: OrderedDict of content encoding -> (compress, decompress), encodings of missing packages left out
+    """
+    import gzip
+
+    from state_machine import compression
+
+    available = OrderedDict((('identity', (None, None)), ('gzip', (compression.COMPRESSORS['gzip'], gzip.decompress))))
+    if compression.brotli is not None:
+        available['br'] = (compression.COMPRESSORS['br'], compression.brotli.decompress)
+    return available
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def measure(data, renderer, parser, compress, decompress, repeat):
+    """
+    :param data: response data
+    :param renderer: DRF renderer
+    :param parser: DRF parser
+    :param compress: compress function, None for identity
+    :param decompress: decompress function, None for identity
+    :param repeat: number of runs
+    :return: dict of bytes, encode & decode milliseconds
+    """
+    encode_times, decode_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = renderer.render(data, renderer.media_type, {})
+        if compress is not None:
+            body = compress(body)
+        encode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        content = decompress(body) if decompress is not None else body
+        parsed = parser.parse(io.BytesIO(content), parser.media_type, {'encoding': 'utf-8'})
+        decode_times.append(time.perf_counter() - start)
+    assert len(parsed) == len(data)
+
+    return OrderedDict((
+        ('bytes', len(body)),
+        ('encode_ms', round(_median(encode_times) * 1000, 3)),
+        ('decode_ms', round(_median(decode_times) * 1000, 3)),
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, action='append',
+                        help='life cycle entries, repeatable (default 10, 100 & 1000)')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per measurement')
+    parser.add_argument('--settings', default='config.local', help='Django settings module')
+    parser.add_argument('--json', help='write results to this file as JSON')
+    args = parser.parse_args()
+
+    _setup(args.settings)
+
+    results = OrderedDict()
+    for entries in args.entries or [10, 100, 1000]:
+        data = life_cycle(entries)
+        rows = results['{0} entries'.format(entries)] = OrderedDict()
+        for format_name, (renderer, format_parser) in formats().items():
+            for encoding, (compress, decompress) in encodings().items():
+                rows['{0} / {1}'.format(format_name, encoding)] = measure(
+                    data, renderer, format_parser, compress, decompress, args.repeat)
+
+    print('{0:<34}{1:>12}{2:>8}{3:>12}{4:>12}'.format('life cycle / format / encoding', 'bytes', 'size',
+                                                      'encode ms', 'decode ms'))
+    for size, rows in results.items():
+        print(size)
+        baseline = rows['json (drf) / identity']['bytes']
+        for label, row in rows.items():
+            print('{0:<34}{1:>12}{2:>7.0f}%{3:>12}{4:>12}'.format(
+                '  ' + label, row['bytes'], row['bytes'] / baseline * 100, row['encode_ms'], row['decode_ms']))
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
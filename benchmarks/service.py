@@ -0,0 +1,475 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- benchmarks.service
+~~~~~~~~~~~~~~
+
+- Load test of endpoints under `/micro-service/state/` with realistic request mixes, against a local PostgreSQL.
+
+    - `ingestion` is write heavy: every client creates a task, drives it to a final state with HTTP service data
+      attached and reads its state now and then.
+    - `polling` is read heavy: clients poll current state of existing tasks (one by one & in batches of 20) while
+      tasks slowly move forward.
+    - `long-history` reads life cycles of tasks with `--history` entries each: complete, paginated & streamed.
+    - Requests run in-process by default, through Django test client (URL routing, middleware & views, no network)
+      and queries per request are counted on every database connection. With `--url` they are sent over HTTP to a
+      running server by `--concurrency` threads and queries are not counted.
+    - Each client runs its requests in order, clients are interleaved. Request mix comes from a seeded RNG, same
+      arguments give same requests.
+    - Tasks are created under a unique identifier prefix and deleted at the end with their life cycles & HTTP
+      services, unless `--keep`. State counters are decreased by deleted tasks, transition rates keep them.
+
+    python -m benchmarks.service [--scenario ingestion] [--tasks 200] [--url http://localhost:8000]
+                                 [--json results.json] [--compare baseline.json]
+"""
+
+# future
+from __future__ import division, print_function, unicode_literals
+
+# 3rd party
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+PREFIX = '/micro-service/state/'
+
+Operation = namedtuple('Operation', ('name', 'method', 'path', 'body'))
+
+SERVICE = {
+    'type': 'http',
+    'upstream_url': 'http://localhost:8002/orders/',
+    'method': 'post',
+    'headers': {'Content-Type': 'application/json'},
+    'dataIn': {'order_id': 1, 'items': [{'sku': 'A-1', 'quantity': 2}, {'sku': 'B-7', 'quantity': 1}]},
+    'dataOut': {'status': 'accepted'},
+}
+
+
+def _setup(settings_module):
+    """
+    :param settings_module: Django settings module
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import django
+    django.setup()
+
+
+def _new(identifier, task_name):
+    return Operation('new', 'post', PREFIX + 'new/',
+                     {'task_name': task_name, 'task_identifier': identifier, 'state': 'init'})
+
+
+def _change(identifier, state, service=None):
+    body = {'state': state}
+    if service is not None:
+        body['service'] = service
+    return Operation('change', 'put', '{0}{1}/change/'.format(PREFIX, identifier), body)
+
+
+def _current(identifier):
+    return Operation('current', 'get', '{0}{1}/current/'.format(PREFIX, identifier), None)
+
+
+def _bulk(name, items):
+    return Operation(name, 'post', '{0}bulk/{1}/'.format(PREFIX, name.split('-')[-1]), items)
+
+
+def ingestion(rng, identifiers, args):
+    """
+    :param rng: seeded random.Random
+    :param identifiers: task identifiers to use
+    :param args: parsed arguments
+    :return: (setup operations, list of clients' operations)
+    """
+    clients = []
+    for identifier in identifiers:
+        operations = [_new(identifier, 'benchmark-ingestion'), _change(identifier, 'processing', SERVICE)]
+        for _ in range(rng.randint(0, 3)):
+            if rng.random() < 0.3:
+                operations.append(_current(identifier))
+            operations.append(_change(identifier, 'processing', SERVICE))
+        operations.append(_change(identifier, 'complete' if rng.random() < 0.9 else 'fail', SERVICE))
+        clients.append(operations)
+    return [], clients
+
+
+def polling(rng, identifiers, args):
+    """
+    :param rng: seeded random.Random
+    :param identifiers: task identifiers to use
+    :param args: parsed arguments
+    :return: (setup operations, list of clients' operations)
+    """
+    setup = _create_tasks(identifiers, 'benchmark-polling')
+    clients = []
+    for identifier in identifiers:
+        operations = []
+        for _ in range(args.polls):
+            if rng.random() < 0.05:
+                operations.append(Operation('current-batch', 'post', PREFIX + 'current/',
+                                            {'task_identifiers': rng.sample(identifiers, min(20, len(identifiers)))}))
+            else:
+                operations.append(_current(identifier))
+            if rng.random() < 0.05:
+                operations.append(_change(identifier, 'processing'))
+        clients.append(operations)
+    return setup, clients
+
+
+def long_history(rng, identifiers, args):
+    """
+    :param rng: seeded random.Random
+    :param identifiers: task identifiers to use
+    :param args: parsed arguments
+    :return: (setup operations, list of clients' operations)
+    """
+    identifiers = identifiers[:args.history_tasks]
+    setup = _create_tasks(identifiers, 'benchmark-history')
+    for _ in range(args.history - 1):
+        setup.append(_bulk('bulk-change', [{'task_identifier': identifier, 'state': 'processing'}
+                                            for identifier in identifiers]))
+    clients = []
+    for identifier in identifiers:
+        path = '{0}{1}/life-cycle/'.format(PREFIX, identifier)
+        clients.append([
+            _current(identifier),
+            Operation('life-cycle', 'get', path, None),
+            Operation('life-cycle-page', 'get', path + '?page_size=50', None),
+            Operation('life-cycle-stream', 'get', path + '?stream=true', None),
+        ])
+    return setup, clients
+
+
+def _create_tasks(identifiers, task_name, chunk_size=1000):
+    """
+    :return: setup operations creating tasks in `processing` state, through bulk endpoints
+    """
+    setup = []
+    for start in range(0, len(identifiers), chunk_size):
+        chunk = identifiers[start:start + chunk_size]
+        setup.append(_bulk('bulk-new', [{'task_name': task_name, 'task_identifier': identifier, 'state': 'init'}
+                                        for identifier in chunk]))
+        setup.append(_bulk('bulk-change', [{'task_identifier': identifier, 'state': 'processing'}
+                                           for identifier in chunk]))
+    return setup
+
+
+SCENARIOS = OrderedDict((
+    ('ingestion', ingestion),
+    ('polling', polling),
+    ('long-history', long_history),
+))
+
+
+class InProcessTransport(object):
+    """Requests through Django test client, counting queries of every database connection
+
+    """
+    concurrency = 1
+
+    def __init__(self):
+        from django.db import connections
+        from django.test import Client
+
+        self.client = Client(HTTP_HOST='localhost')
+        self.connections = [connections[alias] for alias in connections]
+        for connection in self.connections:
+            connection.force_debug_cursor = True
+
+    def __call__(self, operation):
+        """
+        :param operation: Operation
+        :return: (status code, number of queries)
+        """
+        for connection in self.connections:
+            connection.queries_log.clear()
+
+        kwargs = {}
+        if operation.body is not None:
+            kwargs = {'data': json.dumps(operation.body), 'content_type': 'application/json'}
+        response = getattr(self.client, operation.method)(operation.path, **kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+            response.close()
+        return response.status_code, sum(len(connection.queries_log) for connection in self.connections)
+
+
+class HttpTransport(object):
+    """Requests over HTTP to a running server, one session per thread
+
+    """
+
+    def __init__(self, url, concurrency):
+        """
+        :param url: base url of server e.g http://localhost:8000
+        :param concurrency: number of client threads
+        """
+        self.url = url.rstrip('/')
+        self.concurrency = concurrency
+        self._local = threading.local()
+
+    def __call__(self, operation):
+        """
+        :param operation: Operation
+        :return: (status code, None as queries are not known)
+        """
+        import requests
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(operation.method, self.url + operation.path, json=operation.body)
+        # body is read by requests, streamed responses included
+        return response.status_code, None
+
+
+def _interleave(clients):
+    """
+    :param clients: list of clients' operations
+    :return: operations of all clients, round robin, each client keeps its order
+    """
+    operations, position = [], 0
+    while True:
+        batch = [client[position] for client in clients if position < len(client)]
+        if not batch:
+            return operations
+        operations.extend(batch)
+        position += 1
+
+
+def _measure(transport, clients):
+    """
+    :param transport: callable sending an Operation
+    :param clients: list of clients' operations
+    :return: (list of (operation name, status, seconds, queries), wall seconds)
+    """
+    samples, lock = [], threading.Lock()
+
+    def run(operations):
+        measured = []
+        for operation in operations:
+            start = time.time()
+            status, queries = transport(operation)
+            measured.append((operation.name, status, time.time() - start, queries))
+        with lock:
+            samples.extend(measured)
+
+    start = time.time()
+    if transport.concurrency == 1:
+        run(_interleave(clients))
+    else:
+        # every thread runs whole clients, so requests of one task never race each other
+        groups = [_interleave(clients[index::transport.concurrency]) for index in range(transport.concurrency)]
+        threads = [threading.Thread(target=run, args=(group, )) for group in groups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return samples, time.time() - start
+
+
+def _percentile(ordered, percent):
+    """
+    :param ordered: sorted values
+    :param percent: percentile, 0 - 100
+    :return: nearest-rank percentile
+    """
+    index = max(int(math.ceil(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _summary(samples):
+    """
+    :param samples: list of (operation name, status, seconds, queries)
+    :return: OrderedDict of request count, errors, latencies in milliseconds & queries per request
+    """
+    latencies = sorted(seconds * 1000 for _, _, seconds, _ in samples)
+    queries = [count for _, _, _, count in samples if count is not None]
+    return OrderedDict((
+        ('requests', len(samples)),
+        ('errors', sum(1 for _, status, _, _ in samples if status >= 400)),
+        ('latency_ms', OrderedDict((
+            ('mean', round(sum(latencies) / len(latencies), 3)),
+            ('p50', round(_percentile(latencies, 50), 3)),
+            ('p95', round(_percentile(latencies, 95), 3)),
+            ('p99', round(_percentile(latencies, 99), 3)),
+            ('max', round(latencies[-1], 3)),
+        ))),
+        ('queries_per_request', round(sum(queries) / len(queries), 2) if queries else None),
+    ))
+
+
+def run_scenario(name, transport, args, identifier_prefix):
+    """
+    :param name: scenario name
+    :param transport: callable sending an Operation
+    :param args: parsed arguments
+    :param identifier_prefix: prefix of task identifiers of this run
+    :return: OrderedDict of results
+    """
+    rng = random.Random(args.seed)
+    identifiers = ['{0}-{1}-{2}'.format(identifier_prefix, name, number) for number in range(args.tasks)]
+    setup, clients = SCENARIOS[name](rng, identifiers, args)
+
+    for operation in setup:
+        status, _ = transport(operation)
+        if status >= 400:
+            raise RuntimeError('setup request {0} {1} failed with {2}'.format(operation.method, operation.path,
+                                                                              status))
+
+    samples, duration = _measure(transport, clients)
+    results = _summary(samples)
+    results['duration'] = round(duration, 3)
+    results['throughput'] = round(len(samples) / duration, 1)
+
+    operations = OrderedDict()
+    for operation_name in sorted(set(sample[0] for sample in samples)):
+        operations[operation_name] = _summary([sample for sample in samples if sample[0] == operation_name])
+    results['operations'] = operations
+    return results
+
+
+def _metadata(args, transport):
+    """
+    :return: OrderedDict describing run, so results of different commits can be told apart
+    """
+    from django.db import connection
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return OrderedDict((
+        ('commit', commit),
+        ('created_at', datetime.utcnow().isoformat() + 'Z'),
+        ('transport', args.url or 'in-process'),
+        ('concurrency', transport.concurrency),
+        ('python', platform.python_version()),
+        ('database', '{0} {1}'.format(connection.vendor, getattr(connection, 'pg_version', ''))),
+        ('arguments', OrderedDict((
+            ('tasks', args.tasks), ('polls', args.polls), ('history', args.history),
+            ('history_tasks', args.history_tasks), ('seed', args.seed),
+        ))),
+    ))
+
+
+def _cleanup(identifier_prefix):
+    """Delete tasks of this run with their life cycles & HTTP services, and take them off state counters.
+
+    :param identifier_prefix: prefix of task identifiers of this run
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connections, router, transaction
+    from django.db.models import Count
+
+    from state_machine import config, models, statistics
+
+    tasks = models.TransactionStateMachine.objects.filter(task_identifier__startswith=identifier_prefix + '-')
+    with transaction.atomic():
+        rows = sorted((task_name, state, 0, -total) for task_name, state, total in tasks.values_list(
+            'task_name', 'state').annotate(total=Count('id')).order_by())
+        service_ids = list(models.TransactionLifeCycle.objects.filter(
+            task__in=tasks, content_type=ContentType.objects.get_for_model(models.HttpService)).values_list(
+            'object_id', flat=True))
+
+        tasks.delete()
+        models.HttpService.objects.filter(id__in=service_ids).delete()
+
+        if rows and config.STATISTICS['ENABLED']:
+            # same upsert as transitions run, `statistics.rebuild_counts` would lock counters of every task name
+            connection = connections[router.db_for_write(models.TaskStateCount)]
+            with connection.cursor() as cursor:
+                cursor.execute(statistics.upsert_sql(models.TaskStateCount, ('task_name', 'state', 'shard'),
+                                                     len(rows), connection.ops.quote_name),
+                               [value for row in rows for value in row])
+
+
+def _print(results, baseline=None):
+    """
+    :param results: results of run
+    :param baseline: results of an earlier run to compare to, or None
+    """
+    print('{0:<32}{1:>9}{2:>7}{3:>10}{4:>10}{5:>10}{6:>10}{7:>9}'.format(
+        'scenario / operation', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for name, scenario in results['scenarios'].items():
+        rows = [(name, scenario, scenario['throughput'])]
+        rows.extend(('  ' + operation, summary, '') for operation, summary in scenario['operations'].items())
+        for label, summary, throughput in rows:
+            latency = summary['latency_ms']
+            print('{0:<32}{1:>9}{2:>7}{3:>10}{4:>10}{5:>10}{6:>10}{7:>9}'.format(
+                label, summary['requests'], summary['errors'], throughput, latency['p50'], latency['p95'],
+                latency['p99'], '-' if summary['queries_per_request'] is None else summary['queries_per_request']))
+
+    if baseline is None:
+        return
+    print('\ncompared to {0}:'.format(baseline['meta'].get('commit')))
+    for name, scenario in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        print('{0:<32}req/s {1:+.1f}%   p95 {2:+.1f}%   queries {3}'.format(
+            name,
+            (scenario['throughput'] / before['throughput'] - 1) * 100,
+            (scenario['latency_ms']['p95'] / before['latency_ms']['p95'] - 1) * 100,
+            '{0} -> {1}'.format(before['queries_per_request'], scenario['queries_per_request'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='scenario to run, repeatable (default all)')
+    parser.add_argument('--tasks', type=int, default=200, help='tasks (clients) per scenario')
+    parser.add_argument('--polls', type=int, default=20, help='polls per client of polling scenario')
+    parser.add_argument('--history', type=int, default=500, help='life cycle entries per task of long-history')
+    parser.add_argument('--history-tasks', type=int, default=20, help='tasks of long-history scenario')
+    parser.add_argument('--seed', type=int, default=1, help='seed of request mix')
+    parser.add_argument('--url', help='base url of a running server, requests run in-process when missing')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads, with --url only')
+    parser.add_argument('--settings', default='config.local', help='Django settings module')
+    parser.add_argument('--json', help='write results to this file as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare to')
+    parser.add_argument('--keep', action='store_true', help='keep tasks created by benchmark')
+    args = parser.parse_args()
+
+    _setup(args.settings)
+
+    transport = HttpTransport(args.url, args.concurrency) if args.url else InProcessTransport()
+    identifier_prefix = 'bench-{0}'.format(uuid.uuid4().hex[:8])
+
+    results = OrderedDict((('meta', _metadata(args, transport)), ('scenarios', OrderedDict())))
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            results['scenarios'][name] = run_scenario(name, transport, args, identifier_prefix)
+    finally:
+        if not args.keep:
+            _cleanup(identifier_prefix)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)
+    _print(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
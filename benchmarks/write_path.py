@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- benchmarks.write_path
+~~~~~~~~~~~~~~
+
+- Micro-benchmark of `create_initial_state` & `change_state`, legacy DRF serializer path vs lean write path.
+
+    - Requests are dispatched in-process through `APIRequestFactory`, so numbers exclude network & WSGI server.
+    - Everything runs in one transaction which is rolled back at the end, database needs migrations applied only.
+      Rolled back rows stay behind as dead tuples & slow down next runs, VACUUM between runs to compare them.
+
+    python -m benchmarks.write_path --requests 2000 [--settings config.local] [--json results.json]
+"""
+
+# future
+from __future__ import print_function, unicode_literals
+
+# 3rd party
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+
+def _setup(settings_module):
+    """
+    :param settings_module: Django settings module
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import django
+    django.setup()
+
+
+def _legacy_views():
+    """
+    :return: (create, change) view callables validating through DRF model serializers, as before lean path
+    """
+    from rest_framework import status, viewsets
+    from rest_framework.response import Response
+
+    from state_machine import models, serializers
+
+    class LegacyTransactionStateViewSet(viewsets.GenericViewSet):
+        permission_classes = ()
+
+        def create_initial_state(self, request):
+            transaction_state = serializers.TransactionStateMachineSerializer(data=request.data)
+            transaction_state.is_valid(raise_exception=True)
+            task = transaction_state.save()
+            models.TransactionLifeCycle.objects.create(task=task, state=task.state)
+            return Response(status=status.HTTP_200_OK)
+
+        def change_state(self, request, task_identifier):
+            task = models.TransactionStateMachine.objects.get(task_identifier=task_identifier)
+            serializer = serializers.ChangeStateSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            task.state = serializer.data.get('state')
+            task.save()
+            models.TransactionLifeCycle.objects.create(task=task, state=task.state)
+            return Response(status=status.HTTP_200_OK)
+
+    return (LegacyTransactionStateViewSet.as_view({'post': 'create_initial_state'}),
+            LegacyTransactionStateViewSet.as_view({'put': 'change_state'}))
+
+
+def _run(create_view, change_view, requests):
+    """
+    :param create_view: view creating tasks
+    :param change_view: view changing state of tasks
+    :param requests: number of requests per endpoint
+    :return: dict of endpoint -> requests/second
+    """
+    from rest_framework.test import APIRequestFactory
+
+    factory = APIRequestFactory()
+    prefix = uuid.uuid4().hex[:8]
+    identifiers = ['{0}-{1}'.format(prefix, number) for number in range(requests)]
+
+    start = time.time()
+    for identifier in identifiers:
+        request = factory.post('/new/', {'task_name': 'benchmark', 'task_identifier': identifier, 'state': 'init'},
+                               format='json')
+        response = create_view(request)
+        response.render()
+        assert response.status_code == 200, response.content
+    create_rps = requests / (time.time() - start)
+
+    start = time.time()
+    for identifier in identifiers:
+        request = factory.put('/change/', {'state': 'processing'}, format='json')
+        response = change_view(request, task_identifier=identifier)
+        response.render()
+        assert response.status_code == 200, response.content
+    change_rps = requests / (time.time() - start)
+
+    return {'create_initial_state': round(create_rps, 1), 'change_state': round(change_rps, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint and path')
+    parser.add_argument('--settings', default='config.local', help='Django settings module')
+    parser.add_argument('--json', help='write results to this file as JSON')
+    args = parser.parse_args()
+
+    _setup(args.settings)
+
+    from django.db import transaction
+
+    from state_machine import router
+
+    results = {}
+    with transaction.atomic():
+        legacy_create, legacy_change = _legacy_views()
+        results['legacy'] = _run(legacy_create, legacy_change, args.requests)
+        results['lean'] = _run(router.create_initial_state, router.change_state, args.requests)
+        transaction.set_rollback(True)
+
+    print('{0:<24}{1:>12}{2:>12}{3:>10}'.format('endpoint', 'legacy r/s', 'lean r/s', 'speedup'))
+    for endpoint in ('create_initial_state', 'change_state'):
+        legacy, lean = results['legacy'][endpoint], results['lean'][endpoint]
+        print('{0:<24}{1:>12}{2:>12}{3:>9.2f}x'.format(endpoint, legacy, lean, lean / legacy))
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+ASGI config for veris project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. Core state machine operations are
+served by the async application in ``state_machine.asgi``, every other request by the WSGI application in a
+thread pool, ``FALLBACK_WORKERS`` of ``STATE_MACHINE_ASYNC`` threads per process.
+Both are observed into same per process metrics (``metrics/``): requests of the async application by it, including
+its ``asyncpg`` queries, fallback requests by ``InstrumentationMiddleware``.
+
+Run it with any ASGI server, e.g. ``uvicorn config.asgi:application --workers 4``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.production")
+django.setup()
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402 (needs configured settings)
+
+from state_machine.asgi import StateMachineASGI, ThreadedWsgiToAsgi  # noqa: E402 (needs configured settings)
+
+application = StateMachineASGI(fallback=ThreadedWsgiToAsgi(get_wsgi_application()))
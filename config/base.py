@@ -87,8 +87,12 @@ DATABASES = {
 
 
 # ######### ATOMICITY CONFIGURATION
+# Requests are not wrapped in a transaction (`ATOMIC_REQUESTS` of `DATABASES` is left False), write paths open
+# their own scoped `transaction.atomic()` blocks and reads run in autocommit, without BEGIN / COMMIT round trips.
 # https://docs.djangoproject.com/en/dev/ref/settings/#std:setting-DATABASE-ATOMIC_REQUESTS
-ATOMIC_REQUESTS = True
+
+# Reads go to `replica` database when one is configured, see state_machine.db.routers
+DATABASE_ROUTERS = ['state_machine.db.routers.ReadReplicaRouter']
 # ######### END ATOMICITY CONFIGURATION
 
 
@@ -207,6 +211,10 @@ MIDDLEWARE = [
     # 'django.middleware.cache.UpdateCacheMiddleware',
     # 'reversion.middleware.RevisionMiddleware',
 
+    # first, so that time of other middleware is part of request time
+    'state_machine.instrumentation.InstrumentationMiddleware',
+    # right after instrumentation, so it compresses final response & its time is measured
+    'state_machine.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -322,3 +330,120 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 50
 }
 # ######### END DJANGO REST FRAMEWORK CONFIGURATION
+
+
+# ######### STATE MACHINE CONFIGURATION
+# Read-through cache of current task states, `ALIAS` is one of `CACHES`, see state_machine.cache
+STATE_MACHINE_STATE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+}
+
+# Transition graphs of specific task names, they replace `state_machine.config.DEFAULT_TRANSITIONS` (any state to any
+# other, except out of `complete`) for those tasks, e.g a stricter one with at most 3 restarts:
+# {'report': {'edges': {'init': ('processing', ), 'processing': ('complete', 'fail'), 'fail': ('restart', ),
+#                       'restart': ('init', )}, 'terminal': ('complete', ), 'max_retries': 3}}
+STATE_MACHINE_TRANSITIONS = {}
+
+# `created_at` partitions of life cycle & service tables, maintained by `manage_partitions` management command.
+# `RETENTION` is number of `INTERVAL`s kept (None keeps everything), expired partitions are archived as gzipped CSV
+# into `ARCHIVE_DIR` (when set) before they are dropped. Defaults are `state_machine.config.PARTITIONS`, only keys
+# which differ need to be set, e.g.
+# STATE_MACHINE_PARTITIONS = {'RETENTION': 12, 'ARCHIVE_DIR': '/var/backups/state_machine'}
+
+# Service payloads (headers, request / response bodies) larger than `THRESHOLD` bytes are compressed with `CODEC`
+# (`gzip`, or `zstd` when `zstandard` is installed) into a content-addressed store at `LOCATION`, rows keep a
+# reference & a `PREVIEW_LENGTH` characters preview, see state_machine.payloads
+STATE_MACHINE_PAYLOAD_STORE = {
+    'ENABLED': False,
+    'LOCATION': normpath(join(SITE_ROOT, 'payloads')),
+    'THRESHOLD': 64 * 1024,
+    'CODEC': 'gzip',
+    'PREVIEW_LENGTH': 256,
+}
+
+# Life cycle & service rows are appended to a local journal at `PATH` after commit and flushed to database by
+# `flush_life_cycle_journal` management command in `BATCH_SIZE` batches, see state_machine.journal
+STATE_MACHINE_LIFE_CYCLE_JOURNAL = {
+    'ENABLED': False,
+    'PATH': normpath(join(SITE_ROOT, 'journal', 'life_cycle.sqlite3')),
+    'NAME': None,
+    'BATCH_SIZE': 5000,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+# Read replica used by `DATABASE_ROUTERS` when `ALIAS` is one of `DATABASES`, a task is read from primary for
+# `READ_YOUR_WRITES_WINDOW` seconds after its own transition (pins are kept in `CACHE_ALIAS` cache).
+STATE_MACHINE_READ_REPLICA = {
+    'ALIAS': 'replica',
+    'CACHE_ALIAS': 'default',
+    'READ_YOUR_WRITES_WINDOW': 5,
+}
+
+# `<task_identifier>/wait/` long-poll & server-sent events, waiters are woken through LISTEN / NOTIFY on `CHANNEL`,
+# timeouts are in seconds, see state_machine.notifications
+STATE_MACHINE_WAIT = {
+    'CHANNEL': 'state_machine_state_changed',
+    'DEFAULT_TIMEOUT': 30,
+    'MAX_TIMEOUT': 60,
+    'SSE_MAX_DURATION': 300,
+    'HEARTBEAT': 15,
+}
+
+# Change feed of state transitions (`feed/`), events come in order of transactions which committed them, see
+# state_machine.feed
+STATE_MACHINE_FEED = {
+    'BATCH_SIZE': 500,
+    'MAX_BATCH_SIZE': 5000,
+}
+
+# Counters of tasks per task name & state and per minute transition rollups, maintained on every transition
+# (see state_machine.statistics). More `SHARDS` means less waiting on counter rows by concurrent transitions of a
+# task name, at the cost of more rows to sum on read. `RATE_WINDOW` & `MAX_RATE_WINDOW` are in minutes,
+# `ROLLUP_RETENTION` in days (see `state_statistics --prune`).
+STATE_MACHINE_STATISTICS = {
+    'ENABLED': True,
+    'SHARDS': 16,
+    'RATE_WINDOW': 60,
+    'MAX_RATE_WINDOW': 1440,
+    'ROLLUP_RETENTION': 7,
+}
+
+# Per request query count, database, serializer & render time of every endpoint, served as Prometheus histograms
+# by `metrics/` and sent as `Server-Timing` header (see state_machine.instrumentation). Queries are counted with
+# `state_machine.db` backend & `asyncpg` connections of ASGI application only. Set `SERVER_TIMING` False to keep
+# timings away from clients.
+STATE_MACHINE_INSTRUMENTATION = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+}
+
+# Sampling profiler of hot tasks (a `TASK_SAMPLE_RATE` share of transitions, counted in a top-`CAPACITY` sketch)
+# and queries slower than `SLOW_QUERY_THRESHOLD` seconds. Every worker flushes its samples each `FLUSH_INTERVAL`
+# seconds, see `profile_samples` management command & Profile Samples in admin (state_machine.sampler).
+STATE_MACHINE_SAMPLER = {
+    'ENABLED': True,
+    'TASK_SAMPLE_RATE': 0.1,
+    'SLOW_QUERY_THRESHOLD': 0.05,
+    'CAPACITY': 500,
+    'FLUSH_INTERVAL': 60,
+}
+
+# Life cycles of tasks in a terminal state, not modified for `AFTER_DAYS` days, are moved by `archive_life_cycles`
+# management command to gzip JSON lines files in `LOCATION`, `BATCH_SIZE` tasks per transaction. Life cycle
+# endpoint reads them back from there, so `LOCATION` must be shared by all web servers, one which can not read a
+# record answers 503 (state_machine.archive).
+STATE_MACHINE_ARCHIVE = {
+    'LOCATION': normpath(join(SITE_ROOT, 'archive')),
+    'AFTER_DAYS': 30,
+    'BATCH_SIZE': 500,
+}
+
+# Responses of at least `MIN_SIZE` bytes are compressed with brotli (when `brotli` is installed) or gzip, as client
+# accepts. Streaming responses are never compressed. Disable it when a proxy in front compresses already
+# (state_machine.compression).
+STATE_MACHINE_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+}
+# ######### END STATE MACHINE CONFIGURATION
@@ -31,12 +31,25 @@ DATABASES = {
         # https://docs.djangoproject.com/en/1.10/releases/1.9/#database-backends
         # The PostgreSQL backend (django.db.backends.postgresql_psycopg2)
         # is also available as django.db.backends.postgresql. :)
-        'ENGINE': 'django.db.backends.postgresql',
+        #
+        # `state_machine.db` is the same backend with an in-process connection pool, connections go back to pool
+        # at end of request (CONN_MAX_AGE 0) and are health checked before reuse, see state_machine.db.base
+        'ENGINE': 'state_machine.db',
         'NAME': get_env_setting('DATABASE_NAME_STATES'),
         'USER': get_env_setting('DATABASE_USER'),
         'PASSWORD': get_env_setting('DATABASE_PASSWORD'),
         'HOST': get_env_setting('DATABASE_HOST'),
-        'PORT': get_env_setting('DATABASE_PORT')
+        'PORT': get_env_setting('DATABASE_PORT'),
+        # seconds a connection is kept by a worker thread, only useful when pool is disabled
+        'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'OPTIONS': {
+            'POOL': environ.get('DATABASE_POOL_ENABLED', 'true').lower() == 'true' and {
+                'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                'timeout': float(environ.get('DATABASE_POOL_TIMEOUT', 10)),
+                'health_check_interval': float(environ.get('DATABASE_POOL_HEALTH_CHECK_INTERVAL', 30)),
+                'max_lifetime': float(environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+            },
+        },
     }
 }
 ########## END DATABASE CONFIGURATION
@@ -47,8 +60,18 @@ DATABASES = {
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    },
+    'states': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'states',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000
+        }
     }
 }
+
+STATE_MACHINE_STATE_CACHE['ALIAS'] = 'states'
 ########## END CACHE CONFIGURATION
 
 
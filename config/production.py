@@ -45,14 +45,42 @@ DATABASES = {
         # https://docs.djangoproject.com/en/1.10/releases/1.9/#database-backends
         # The PostgreSQL backend (django.db.backends.postgresql_psycopg2)
         # is also available as django.db.backends.postgresql. :)
-        'ENGINE': 'django.db.backends.postgresql',
+        #
+        # `state_machine.db` is the same backend with an in-process connection pool, connections go back to pool
+        # at end of request (CONN_MAX_AGE 0) and are health checked before reuse, see state_machine.db.base
+        'ENGINE': 'state_machine.db',
         'NAME': get_env_setting('DATABASE_NAME'),
         'USER': get_env_setting('DATABASE_USER'),
         'PASSWORD': get_env_setting('DATABASE_PASSWORD'),
         'HOST': get_env_setting('DATABASE_HOST'),
-        'PORT': get_env_setting('DATABASE_PORT')
+        'PORT': get_env_setting('DATABASE_PORT'),
+        # seconds a connection is kept by a worker thread, only useful when pool is disabled
+        'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'OPTIONS': {
+            'POOL': environ.get('DATABASE_POOL_ENABLED', 'true').lower() == 'true' and {
+                'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                'timeout': float(environ.get('DATABASE_POOL_TIMEOUT', 10)),
+                'health_check_interval': float(environ.get('DATABASE_POOL_HEALTH_CHECK_INTERVAL', 30)),
+                'max_lifetime': float(environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+            },
+        },
     }
 }
+
+# optional streaming replica, read endpoints use it (see state_machine.db.routers)
+if environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=environ['DATABASE_REPLICA_HOST'],
+        PORT=environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+
+STATE_MACHINE_READ_REPLICA = dict(
+    STATE_MACHINE_READ_REPLICA,
+    CACHE_ALIAS='states',
+    READ_YOUR_WRITES_WINDOW=int(environ.get('DATABASE_REPLICA_READ_YOUR_WRITES_WINDOW', 5)),
+)
 ########## END DATABASE CONFIGURATION
 
 
@@ -87,8 +115,21 @@ CACHES = {
     'default': {
         'BACKEND': DEFAULT_CACHE_BACKEND,
         'LOCATION': DEFAULT_CACHE_LOCATION
+    },
+    # current task states, see state_machine.cache
+    'states': {
+        'BACKEND': DEFAULT_CACHE_BACKEND,
+        'LOCATION': environ.get('STATE_CACHE_LOCATION', DEFAULT_CACHE_LOCATION),
+        'TIMEOUT': int(environ.get('STATE_CACHE_TIMEOUT', 300)),
+        # size of memcached is set on memcached server itself (`-m`), point to a dedicated server to bound it
+        'KEY_PREFIX': 'states',
     }
 }
+
+STATE_MACHINE_STATE_CACHE = {
+    'ENABLED': environ.get('STATE_CACHE_ENABLED', 'true').lower() == 'true',
+    'ALIAS': 'states',
+}
 ########## END CACHE CONFIGURATION
 
 
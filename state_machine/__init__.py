@@ -0,0 +1 @@
+default_app_config = 'state_machine.apps.StateMachineConfig'
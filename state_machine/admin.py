@@ -60,6 +60,23 @@ class HttpServiceAdmin(admin.ModelAdmin):
     ordering = ('-id',)
 
 
+class ProfileSampleAdmin(admin.ModelAdmin):
+    """Samples of hot tasks & slow queries, one row per worker process (`profile_samples` command merges them)
+
+    """
+    list_display = ('id', 'kind', 'key', 'count', 'error', 'max_time', 'total_time', 'process', 'modified_at')
+    list_display_links = ('id', 'key',)
+    list_filter = ('kind', 'process')
+    search_fields = ('key', )
+    list_per_page = 50
+    ordering = ('kind', '-count', '-max_time')
+    readonly_fields = ('process', 'kind', 'key', 'count', 'error', 'total_time', 'max_time', 'modified_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(models.TransactionStateMachine, TransactionStateMachineAdmin)
 admin.site.register(models.TransactionLifeCycle, TransactionLifeCycleAdmin)
 admin.site.register(models.HttpService, HttpServiceAdmin)
+admin.site.register(models.ProfileSample, ProfileSampleAdmin)
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class StateMachineConfig(AppConfig):
     name = 'state_machine'
+
+    def ready(self):
+        from state_machine import cache, notifications, sampler, signals, statistics
+        from state_machine.db import routers
+
+        signals.state_changed.connect(cache.on_state_changed, dispatch_uid='state_machine.cache')
+        signals.state_changed.connect(routers.on_state_changed, dispatch_uid='state_machine.db.routers')
+        signals.state_changed.connect(notifications.on_state_changed, dispatch_uid='state_machine.notifications')
+        signals.state_changed.connect(statistics.on_state_changed, dispatch_uid='state_machine.statistics')
+        signals.state_changed.connect(sampler.on_state_changed, dispatch_uid='state_machine.sampler')
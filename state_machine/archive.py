@@ -0,0 +1,233 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.archive
+~~~~~~~~~~~~~~
+
+- Archive of life cycles of finished tasks, so live tables hold life cycles of active work only.
+
+    - Tasks in a terminal state of their transition graph which were not modified for `AFTER_DAYS` days are
+      archived in batches. Life cycle of each task, as life cycle endpoint serves it (services included), is appended
+      to a gzip JSON lines file in `LOCATION`, one gzip member per task. Then its life cycle & service rows are
+      deleted and task keeps `archive` location (`<file>:<offset>`). All of this happens in one transaction which
+      locks tasks of batch.
+    - File is fsynced before transaction commits, members of a batch which rolled back are simply never referenced.
+    - Task rows stay, so current state, uniqueness of identifiers & statistics are unchanged. Life cycle endpoint
+      reads an archived life cycle back by seeking to its member (see `read_life_cycle`).
+    - Archive files are plain `.jsonl.gz`, `zcat` reads them whole.
+    - Candidates are found by walking tasks in `id` order, one pass per run. Run one archiver at a time.
+    - `LOCATION` must be storage shared by every API host & the archiver, mounted at same path, any host may serve
+      life cycle of an archived task. A record which can not be read raises `ArchiveUnavailable`, life cycle
+      endpoint answers 503 then.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+import os
+import zlib
+from datetime import timedelta
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Django
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config, models, serializers, transitions
+
+# gzip container of zlib
+GZIP_WBITS = 31
+
+TASK_FIELDS = ('id', 'task_identifier', 'task_name', 'state', 'version', 'retries', 'created_at', 'modified_at')
+
+
+class ArchiveUnavailable(Exception):
+    """Archive record is missing, truncated or can not be read on this host
+
+    """
+
+
+def is_configured():
+    """
+    :return: whether an archive location is configured
+    """
+    return bool(config.ARCHIVE['LOCATION'])
+
+
+def terminal_states():
+    """
+    :return: states which are terminal in any transition graph
+    """
+    return sorted(set(state for graph in transitions.GRAPHS.values() for state in graph.terminal))
+
+
+class ArchiveFile(object):
+    """Append only gzip JSON lines file, one gzip member per record
+
+    """
+
+    def __init__(self, name):
+        """
+        :param name: file name, relative to `ARCHIVE['LOCATION']`
+        """
+        self.name = name
+        self._file = None
+
+    def append(self, record):
+        """
+        :param record: JSON serializable record
+        :return: location of record
+        """
+        if self._file is None:
+            if not os.path.isdir(config.ARCHIVE['LOCATION']):
+                os.makedirs(config.ARCHIVE['LOCATION'])
+            self._file = open(os.path.join(config.ARCHIVE['LOCATION'], self.name), 'ab')
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+        line = (JSONEncoder().encode(record) + '\n').encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(compressor.compress(line) + compressor.flush())
+        return '{0}:{1}'.format(self.name, offset)
+
+    def sync(self):
+        """Make appended records durable.
+
+        """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read(location):
+    """
+    :param location: location of record, as returned by `ArchiveFile.append`
+    :return: record
+    :raise ArchiveUnavailable: when record is missing, truncated or can not be read
+    """
+    if not is_configured():
+        raise ArchiveUnavailable('archive location is not configured.')
+    name, offset = location.rsplit(':', 1)
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    data = []
+    try:
+        with open(os.path.join(config.ARCHIVE['LOCATION'], name), 'rb') as source:
+            source.seek(int(offset))
+            while not decompressor.eof:
+                chunk = source.read(64 * 1024)
+                if not chunk:
+                    raise ArchiveUnavailable('archive record {0} is truncated.'.format(location))
+                data.append(decompressor.decompress(chunk))
+        return json.loads(b''.join(data).decode('utf-8'))
+    except (EnvironmentError, zlib.error, ValueError) as exc:
+        raise ArchiveUnavailable('archive record {0} can not be read: {1}'.format(location, exc))
+
+
+def read_life_cycle(task_instance):
+    """
+    :param task_instance: archived Transaction/task instance
+    :return: serialized life cycle of task, newest entry first, archived entries & any written after archiving
+    """
+    archived = read(task_instance.archive)['life_cycle']
+    live = serializers.TransactionLifeCycleSerializer(instance=task_instance.fetch_complete_life_cycle, many=True).data
+    return sorted(list(live) + archived, key=lambda row: row['id'], reverse=True)
+
+
+def candidates(cutoff, after_id, limit):
+    """
+    :param cutoff: tasks modified before it are candidates
+    :param after_id: id of last task already considered
+    :param limit: max number of ids
+    :return: ids of tasks which may be archived, in id order
+    """
+    return list(models.TransactionStateMachine.objects.filter(
+        id__gt=after_id,
+        state__in=terminal_states(),
+        modified_at__lt=cutoff,
+        archive__isnull=True,
+    ).order_by('id').values_list('id', flat=True)[:limit])
+
+
+def archive_batch(task_ids, archive_file):
+    """Archive life cycles of tasks & delete them from live tables.
+
+    :param task_ids: ids of candidate tasks
+    :param archive_file: ArchiveFile to append to
+    :return: number of archived tasks
+    """
+    with transaction.atomic():
+        tasks = [
+            task for task in models.TransactionStateMachine.objects.select_for_update().filter(
+                id__in=task_ids, archive__isnull=True).order_by('id')
+            # terminal states depend on graph of task name
+            if task.state in transitions.graph_for(task.task_name).terminal
+        ]
+        if not tasks:
+            return 0
+        ids = [task.id for task in tasks]
+
+        rows = models.TransactionLifeCycle.objects.filter(task_id__in=ids).select_related('task').prefetch_related(
+            'entity').order_by('task_id', '-id')
+        life_cycles, services = {}, {}
+        for row, data in zip(rows, serializers.TransactionLifeCycleSerializer(instance=rows, many=True).data):
+            life_cycles.setdefault(row.task_id, []).append(data)
+            if row.content_type_id is not None:
+                services.setdefault(row.content_type_id, []).append(row.object_id)
+
+        locations = {}
+        for task in tasks:
+            locations[task.id] = archive_file.append({
+                'task': dict((field, getattr(task, field)) for field in TASK_FIELDS),
+                'life_cycle': life_cycles.get(task.id, []),
+            })
+        archive_file.sync()
+
+        models.TransactionLifeCycle.objects.filter(task_id__in=ids).delete()
+        for content_type_id, object_ids in services.items():
+            ContentType.objects.get_for_id(content_type_id).model_class().objects.filter(id__in=object_ids).delete()
+        for task_id, location in locations.items():
+            models.TransactionStateMachine.objects.filter(id=task_id).update(archive=location)
+    return len(tasks)
+
+
+def run(after_days=None, batch_size=None, limit=None, dry_run=False):
+    """Archive every task which is due.
+
+    :param after_days: archive tasks not modified for this many days, default `AFTER_DAYS`
+    :param batch_size: tasks per transaction, default `BATCH_SIZE`
+    :param limit: max number of tasks to archive, None for all
+    :param dry_run: only count candidates
+    :return: number of archived tasks (candidates on dry run)
+    """
+    after_days = config.ARCHIVE['AFTER_DAYS'] if after_days is None else after_days
+    batch_size = batch_size or config.ARCHIVE['BATCH_SIZE']
+    cutoff = timezone.now() - timedelta(days=after_days)
+    now = timezone.now()
+    archive_file = ArchiveFile('life-cycles-{0:%Y%m%d-%H%M%S}-{1}.jsonl.gz'.format(now, os.getpid()))
+
+    done, after_id = 0, 0
+    try:
+        while limit is None or done < limit:
+            ids = candidates(cutoff, after_id, batch_size if limit is None else min(batch_size, limit - done))
+            if not ids:
+                break
+            after_id = ids[-1]
+            done += len(ids) if dry_run else archive_batch(ids, archive_file)
+    finally:
+        archive_file.close()
+    return done
@@ -0,0 +1,740 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.asgi
+~~~~~~~~~~~~~~
+
+- ASGI application serving the core operations of `TransactionStateViewSet` on `asyncpg`, so one process
+  serves many concurrent requests instead of one per worker thread. Anything else (bulk, streams, paginated life
+  cycle, admin, docs) is handed to `fallback`, usually the Django WSGI application (see config.asgi).
+
+    - create initial state, get current state, complete life cycle (plain list) & change state keep same URLs,
+      payloads, validation (`state_machine.validators`), transition SQL (`models.transition_sql`), status codes
+      & response bodies as the viewset.
+    - wait for state (long-poll & server-sent events) waits on event loop, listener thread of
+      `state_machine.notifications` wakes it, so a waiter holds no thread. A stream ends when client disconnects.
+    - Database calls go through one `asyncpg` pool per process, configured by `STATE_MACHINE_ASYNC`.
+    - Django APIs which block (cache, signals, payload store, journal) run in a small thread pool. Journal is
+      appended before commit, as the viewset does, the rest runs after commit the same way the viewset runs them
+      on commit. `state_changed` receivers run there too, except statistics counters which are upserted on the
+      `asyncpg` connection inside the transaction, so they commit or roll back with the transition.
+    - Reads go to primary, so they always see own writes.
+    - Requests of its routes are observed into metrics of `state_machine.instrumentation` (requests, duration,
+      database time & queries), `asyncpg` queries are timed by `TimedConnection`. Requests handed to `fallback`
+      are observed by `InstrumentationMiddleware`.
+    - Responses are JSON (`orjson` when installed) & compressed as `state_machine.compression` does, MessagePack
+      requests & responses are handed to `fallback`.
+    - `ThreadedWsgiToAsgi` adapts WSGI fallback, each request runs in a thread of its own pool. asgiref's
+      `WsgiToAsgi` runs all of them in one shared thread, so one stream or long poll would stall every other
+      fallback request of the process.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import asyncio
+import functools
+import inspect
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import asyncpg
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from rest_framework import exceptions
+
+
+# Django
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import (archive, cache, compression, config, instrumentation, journal, models, notifications,
+                           payloads, renderers, sampler, signals, statistics, transitions, validators)
+from state_machine.exceptions import Conflict, ServiceUnavailable
+from state_machine.views import TransactionStateViewSet
+
+SERVICE_MODELS = {
+    config.HTTP: (models.HttpService, validators.HTTP_SERVICE),
+}
+
+TASK_TABLE = '"{0}"'.format(models.TransactionStateMachine._meta.db_table)
+LIFE_CYCLE_TABLE = '"{0}"'.format(models.TransactionLifeCycle._meta.db_table)
+SERVICE_TABLE = '"{0}"'.format(models.HttpService._meta.db_table)
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+def _numbered(sql):
+    """
+    :param sql: statement with `%s` placeholders
+    :return: statement with asyncpg `$n` placeholders
+    """
+    counter = iter(range(1, sql.count('%s') + 1))
+    return _PLACEHOLDER.sub(lambda match: '${0}'.format(next(counter)), sql)
+
+
+def _datetime(value):
+    """
+    :param value: aware datetime or None
+    :return: same representation as DRF `DateTimeField`
+    """
+    if value is None:
+        return None
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _header(scope, name):
+    """
+    :param scope: ASGI scope
+    :param name: lower case header name
+    :return: value of header, empty when missing
+    """
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _timed(method):
+    """
+    :param method: query method of asyncpg connection
+    :return: same method, recording duration of query in timings of current request & slow query sampler
+    """
+    @functools.wraps(method)
+    async def timed(self, query, *args, **kwargs):
+        started = time.time()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            duration = time.time() - started
+            instrumentation.record_task_query(duration)
+            sampler.observe_query(query, duration)
+    return timed
+
+
+class TimedConnection(asyncpg.Connection):
+    """asyncpg connection timing its queries, as cursors of `state_machine.db` backend do
+
+    """
+    execute = _timed(asyncpg.Connection.execute)
+    executemany = _timed(asyncpg.Connection.executemany)
+    fetch = _timed(asyncpg.Connection.fetch)
+    fetchrow = _timed(asyncpg.Connection.fetchrow)
+    fetchval = _timed(asyncpg.Connection.fetchval)
+
+
+class _ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """WSGI request run in a thread of given pool
+
+    """
+
+    def __init__(self, wsgi_application, executor):
+        """
+        :param wsgi_application: WSGI application
+        :param executor: thread pool to run it in
+        """
+        super(_ThreadedWsgiToAsgiInstance, self).__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # `WsgiToAsgiInstance.run_wsgi_app` is thread sensitive, it would run in one thread shared by all requests,
+        # its undecorated function runs here instead
+        run_wsgi_app = vars(WsgiToAsgiInstance)['run_wsgi_app'].func
+        await sync_to_async(run_wsgi_app, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """WSGI application as ASGI application, requests run concurrently in a thread pool
+
+    """
+
+    def __init__(self, wsgi_application, max_workers=None):
+        """
+        :param wsgi_application: WSGI application
+        :param max_workers: requests served at once, `FALLBACK_WORKERS` of `STATE_MACHINE_ASYNC` when None
+        """
+        super(ThreadedWsgiToAsgi, self).__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or config.ASYNC['FALLBACK_WORKERS'])
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiToAsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class StateMachineASGI(object):
+    """ASGI application of core state machine operations
+
+    """
+
+    def __init__(self, fallback=None, prefix=None):
+        """
+        :param fallback: ASGI application of every other request, 404 when None
+        :param prefix: URL prefix of state machine routes
+        """
+        self.fallback = fallback
+        self.prefix = prefix or config.ASYNC['PREFIX']
+        # (method, path, handler, URL name of same endpoint of viewset, for metrics)
+        self.routes = (
+            ('POST', re.compile(r'^new/$'), self.create_initial_state, 'create-initial-state'),
+            ('GET', re.compile(r'^(?P<task_identifier>[0-9a-z-]+)/current/$'), self.get_current_state,
+             'get-current-state'),
+            ('GET', re.compile(r'^(?P<task_identifier>[0-9a-z-]+)/life-cycle/$'),
+             self.get_complete_transaction_life_cycle, 'get-complete-transaction-life-cycle'),
+            ('PUT', re.compile(r'^(?P<task_identifier>[0-9a-z-]+)/change/$'), self.change_state, 'change-state'),
+            ('GET', re.compile(r'^(?P<task_identifier>[0-9a-z-]+)/wait/$'), self.wait_for_state, 'wait-for-state'),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=config.ASYNC['EXECUTOR_WORKERS'])
+        self._pool = None
+        self._pool_lock = None
+        self._content_types = {}
+
+    # ----- plumbing ---- #
+
+    async def pool(self):
+        """
+        :return: asyncpg pool, created on first use
+        """
+        if self._pool is None:
+            # created lazily, it must belong to event loop of server
+            self._pool_lock = self._pool_lock or asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    database = settings.DATABASES['default']
+                    self._pool = await asyncpg.create_pool(
+                        database=database['NAME'], user=database['USER'] or None,
+                        password=database['PASSWORD'] or None, host=database['HOST'] or None,
+                        port=database['PORT'] or None, min_size=config.ASYNC['POOL_MIN_SIZE'],
+                        max_size=config.ASYNC['POOL_MAX_SIZE'], init=self._init_connection,
+                        connection_class=TimedConnection)
+        return self._pool
+
+    @staticmethod
+    async def _init_connection(connection):
+        """
+        :param connection: new asyncpg connection, JSON columns are decoded like psycopg2 does
+        """
+        for json_type in ('json', 'jsonb'):
+            await connection.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads,
+                                            schema='pg_catalog')
+
+    def run_sync(self, function, *args):
+        """
+        :param function: blocking callable
+        :return: future of its result, run in thread pool, its queries count to current request
+        """
+        return asyncio.get_event_loop().run_in_executor(
+            self.executor, functools.partial(self._recorded, instrumentation.task_timings(), function), *args)
+
+    @staticmethod
+    def _recorded(timings, function, *args):
+        """
+        :param timings: Timings of request function runs for, None outside of a request
+        :param function: blocking callable
+        :return: its result
+        """
+        with instrumentation.recording(timings):
+            return function(*args)
+
+    async def content_type(self, model):
+        """
+        :param model: service model
+        :return: ContentType of model, fetched once
+        """
+        if model not in self._content_types:
+            self._content_types[model] = await self.run_sync(ContentType.objects.get_for_model, model)
+        return self._content_types[model]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(scope, receive, send)
+
+        handler, kwargs, endpoint = self.resolve(scope)
+        if handler is None:
+            if self.fallback is None:
+                return await self.respond(send, 404, {'detail': 'Not found.'})
+            return await self.fallback(scope, receive, send)
+
+        instrumented = config.INSTRUMENTATION['ENABLED']
+        if instrumented:
+            timings, started = instrumentation.start_task(), time.time()
+        # an unhandled error ends as 500 response of server
+        status_code = 500
+        try:
+            body = await self.read_body(receive)
+            try:
+                status_code, data = await handler(scope, body, **kwargs)
+            except exceptions.APIException as exc:
+                status_code = exc.status_code
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            if inspect.isasyncgen(data):
+                if instrumented:
+                    # body of a streaming response is not part of request, as with middleware
+                    instrumented = False
+                    instrumentation.finish_task()
+                    instrumentation.observe(endpoint, scope['method'], status_code, timings, time.time() - started)
+                return await self.stream(receive, send, status_code, data)
+            await self.respond(send, status_code, data, _header(scope, b'accept-encoding'))
+        finally:
+            if instrumented:
+                instrumentation.finish_task()
+                instrumentation.observe(endpoint, scope['method'], status_code, timings, time.time() - started)
+
+    async def lifespan(self, scope, receive, send):
+        """Open pool on startup, close it on shutdown.
+
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.pool()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._pool is not None:
+                    await self._pool.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def resolve(self, scope):
+        """
+        :param scope: ASGI scope
+        :return: (handler, URL kwargs, URL name), handler is None when request is not served here
+        """
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            return None, {}, None
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        if query.keys() & {'stream', 'cursor', 'page_size'}:
+            # streamed & paginated life cycle stay on the viewset
+            return None, {}, None
+        if any(renderers.MessagePackRenderer.media_type in _header(scope, name)
+               for name in (b'accept', b'content-type')):
+            # MessagePack is negotiated by the viewset
+            return None, {}, None
+
+        path = scope['path'][len(self.prefix):]
+        for method, pattern, handler, name in self.routes:
+            match = pattern.match(path)
+            if match and scope['method'] == method:
+                return handler, match.groupdict(), name
+        return None, {}, None
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        :param receive: ASGI receive callable
+        :return: request body
+        """
+        body, more_body = [], True
+        while more_body:
+            message = await receive()
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        return b''.join(body)
+
+    @staticmethod
+    async def respond(send, status_code, data, accept_encoding=''):
+        """
+        :param send: ASGI send callable
+        :param status_code: HTTP status code
+        :param data: JSON response data
+        :param accept_encoding: value of `Accept-Encoding` header of request
+        """
+        # no data renders an empty body, same as DRF `Response(status=...)`
+        body = renderers.FastJSONRenderer().render(data)
+        headers = [(b'content-type', b'application/json')]
+        if config.COMPRESSION['ENABLED'] and len(body) >= config.COMPRESSION['MIN_SIZE']:
+            headers.append((b'vary', b'Accept-Encoding'))
+            body, encoding = compression.compress(body, accept_encoding)
+            if encoding is not None:
+                headers.append((b'content-encoding', encoding.encode('latin-1')))
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def stream(receive, send, status_code, events):
+        """
+        :param receive: ASGI receive callable, request body is read already
+        :param send: ASGI send callable
+        :param status_code: HTTP status code
+        :param events: async generator of server-sent events, closed when client disconnects
+        """
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': [
+            (b'content-type', renderers.EventStreamRenderer.media_type.encode('latin-1')),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        async def forward():
+            async for event in events:
+                if not isinstance(event, bytes):
+                    event = event.encode(renderers.EventStreamRenderer.charset)
+                await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+            await send({'type': 'http.response.body'})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        forwarding = asyncio.ensure_future(forward())
+        disconnect = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait([forwarding, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect.cancel()
+            if not forwarding.done():
+                # client is gone, generator must not be running when it is closed
+                forwarding.cancel()
+                await asyncio.wait([forwarding])
+            await events.aclose()
+        if not forwarding.cancelled():
+            # re-raise error of generator
+            forwarding.result()
+
+    @staticmethod
+    def parse(body):
+        """
+        :param body: request body
+        :return: parsed JSON document, same errors as DRF JSONParser
+        """
+        try:
+            return json.loads(body.decode(settings.DEFAULT_CHARSET) or '{}')
+        except ValueError as exc:
+            raise exceptions.ParseError('JSON parse error - {0}'.format(exc))
+
+    @staticmethod
+    def validate_service_type(data):
+        """
+        :param data: request data
+        :return: type of requested service, None when request has no service
+        """
+        if not isinstance(data, dict) or 'service' not in data:
+            return None
+        return TransactionStateViewSet()._validate_service(data)
+
+    @staticmethod
+    def validate_service(data, service_type):
+        """
+        :param data: request data
+        :param service_type: type of requested service or None
+        :return: (service model, validated service data) or None when request has no service
+        """
+        if service_type is None:
+            return None
+        model, validator = SERVICE_MODELS[service_type]
+        return model, validator(data['service'])
+
+    async def save_life_cycle(self, connection, task_id, state, service):
+        """
+        :param connection: asyncpg connection, inside transaction
+        :param task_id: id of task
+        :param state: state of life cycle entry
+        :param service: (service model, validated service data) or None
+        """
+        content_type = await self.content_type(service[0]) if service is not None else None
+
+        if journal.is_enabled():
+            # appended before commit, tagged with id of this transaction, see state_machine.journal
+            entries = [await self.run_sync(journal.entry, task_id, state,
+                                           (content_type, service[1]) if service is not None else None)]
+            xid = await connection.fetchval('SELECT txid_current()')
+            if await self.run_sync(journal.append, entries, xid):
+                return
+            # journal is unavailable, rows are inserted below
+
+        object_id, now = None, timezone.now()
+        if service is not None:
+            model, data = service
+            data = await self.run_sync(payloads.offload_service_data, model, data)
+            fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+            values = [now if field.name == 'created_at' else data.get(field.name, field.get_default())
+                      for field in fields]
+            object_id = await connection.fetchval(
+                'INSERT INTO {table} ({columns}) VALUES ({values}) RETURNING id'.format(
+                    table=SERVICE_TABLE,
+                    columns=', '.join('"{0}"'.format(field.column) for field in fields),
+                    values=', '.join('${0}'.format(position) for position in range(1, len(fields) + 1))),
+                *values)
+
+        await connection.execute(
+            'INSERT INTO {table} (task_id, state, content_type_id, object_id, created_at) '
+            'VALUES ($1, $2, $3, $4, $5)'.format(table=LIFE_CYCLE_TABLE),
+            task_id, state, content_type.id if content_type is not None else None, object_id, now)
+
+    @staticmethod
+    async def record_statistics(connection, transitions):
+        """Same as `statistics.record`, on asyncpg connection
+
+        :param connection: asyncpg connection, inside transaction
+        :param transitions: list of signals.Transition
+        """
+        if not config.STATISTICS['ENABLED']:
+            return
+        for model, key_fields, rows in statistics.counter_rows(transitions):
+            sql = statistics.upsert_sql(model, key_fields, len(rows), '"{0}"'.format)
+            await connection.execute(_numbered(sql), *[value for row in rows for value in row])
+
+    def after_commit(self, transitions):
+        """Run side effects of a committed transition, in thread pool.
+
+        :param transitions: list of signals.Transition
+        """
+        # no Django transaction is open in this thread, `on_commit` callbacks of receivers run right away
+        signals.state_changed.send(sender=self.__class__, transitions=transitions, counted=True)
+
+    # ----- operations ---- #
+
+    async def create_initial_state(self, scope, body):
+        """Same as `TransactionStateViewSet.create_initial_state`
+
+        """
+        data = self.parse(body)
+        service_type = self.validate_service_type(data)
+        task_data = validators.CREATE_STATE(data)
+        service = self.validate_service(data, service_type)
+        state = task_data['state']
+
+        pool = await self.pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                now = timezone.now()
+                task_id = await connection.fetchval(
+                    'INSERT INTO {table} (task_name, task_identifier, state, retries, version, created_at, '
+                    'modified_at) VALUES ($1, $2, $3, 0, 0, $4, $4) '
+                    'ON CONFLICT (task_identifier) DO NOTHING RETURNING id'.format(table=TASK_TABLE),
+                    task_data['task_name'], task_data['task_identifier'], state, now)
+                if task_id is None:
+                    raise Conflict({'detail': 'task_identifier already exists.'})
+                await self.save_life_cycle(connection, task_id, state, service)
+                changes = [signals.Transition(task_data['task_identifier'], task_data['task_name'], None, state)]
+                await self.record_statistics(connection, changes)
+
+        await self.run_sync(self.after_commit, changes)
+        return 200, None
+
+    async def get_current_state(self, scope, body, task_identifier):
+        """Same as `TransactionStateViewSet.get_current_state`, through read-through cache when it is enabled
+
+        """
+        key = cache.cache_key(task_identifier)
+        if cache.is_enabled():
+            state = await self.run_sync(cache._cache().get, key)
+            if state is not None and state != cache.TOMBSTONE:
+                return 200, {'current_state': state}
+
+        pool = await self.pool()
+        state = await pool.fetchval('SELECT state FROM {table} WHERE task_identifier = $1'.format(table=TASK_TABLE),
+                                    task_identifier)
+        if state is None:
+            raise exceptions.NotFound()
+        if cache.is_enabled():
+            await self.run_sync(cache._cache().add, key, state)
+        return 200, {'current_state': state}
+
+    async def get_complete_transaction_life_cycle(self, scope, body, task_identifier):
+        """Same as `TransactionStateViewSet.get_complete_transaction_life_cycle` without `stream` / pagination
+
+        """
+        pool = await self.pool()
+        content_type = await self.content_type(models.HttpService)
+        async with pool.acquire() as connection:
+            task = await connection.fetchrow(
+                'SELECT id, archive FROM {table} WHERE task_identifier = $1'.format(table=TASK_TABLE), task_identifier)
+            if task is None:
+                raise exceptions.NotFound()
+            task_id = task['id']
+            rows = await connection.fetch(
+                'SELECT l.id, l.state, l.created_at, s.id AS service_id, s.upstream_url, s.method, s.headers, '
+                's."dataIn", s."dataOut", s.created_at AS service_created_at '
+                'FROM {life_cycle} l LEFT JOIN {service} s ON l.content_type_id = $2 AND s.id = l.object_id '
+                'WHERE l.task_id = $1 ORDER BY l.id DESC'.format(life_cycle=LIFE_CYCLE_TABLE,
+                                                                  service=SERVICE_TABLE),
+                task_id, content_type.id)
+
+        life_cycle = []
+        for row in rows:
+            if row['service_id'] is None:
+                service = {'headers': None, 'dataIn': None, 'dataOut': None, 'upstream_url': '', 'method': None}
+            else:
+                service = {name: row[name] for name in ('headers', 'dataIn', 'dataOut')}
+                if any(payloads.is_reference(value) for value in service.values()):
+                    service = await self.run_sync(self._resolve_payloads, service)
+                service.update(upstream_url=row['upstream_url'], method=row['method'],
+                               created_at=_datetime(row['service_created_at']))
+            life_cycle.append({
+                'id': row['id'],
+                'task_identifier': task_identifier,
+                'service': service,
+                'state': row['state'],
+                'created_at': _datetime(row['created_at']),
+            })
+
+        if task['archive']:
+            try:
+                archived = await self.run_sync(archive.read, task['archive'])
+            except archive.ArchiveUnavailable:
+                raise ServiceUnavailable({'detail': 'archived life cycle of task is unavailable.'})
+            life_cycle = sorted(life_cycle + archived['life_cycle'], key=lambda entry: entry['id'], reverse=True)
+        return 200, life_cycle
+
+    async def read_state(self, task_identifier):
+        """
+        :param task_identifier: task unique identifier
+        :return: (task_name, state, version), None if task does not exist
+        """
+        pool = await self.pool()
+        row = await pool.fetchrow(
+            'SELECT task_name, state, version FROM {table} WHERE task_identifier = $1'.format(table=TASK_TABLE),
+            task_identifier)
+        return tuple(row) if row is not None else None
+
+    async def wait_for_state(self, scope, body, task_identifier):
+        """Same as `TransactionStateViewSet.wait_for_state`, waiter waits on event loop instead of a thread
+
+        """
+        event_stream = renderers.EventStreamRenderer.media_type in _header(scope, b'accept')
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        try:
+            states, version, timeout = TransactionStateViewSet()._wait_params(
+                {name: values[-1] for name, values in query.items()}, _header(scope, b'last-event-id') or None)
+
+            # subscribe before reading, a change committed in between still wakes waiter
+            waiter = notifications.listener.subscribe(task_identifier, loop=asyncio.get_event_loop())
+            try:
+                row = await self.read_state(task_identifier)
+                if row is None:
+                    raise exceptions.NotFound()
+            except Exception:
+                notifications.listener.unsubscribe(waiter)
+                raise
+        except exceptions.APIException as exc:
+            if not event_stream:
+                raise
+            # rendered as one `error` event, same as viewset does
+            return exc.status_code, self._error_event(exc)
+
+        if event_stream:
+            return 200, self._state_events(task_identifier, waiter, row, states, version)
+
+        try:
+            task_name, state, current_version = row
+            since = current_version if version is None else version
+            deadline = time.time() + timeout
+            while not (state in states if states else current_version > since):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if not await waiter.wait(remaining):
+                    continue
+                row = await self.read_state(task_identifier)
+                if row is None:
+                    break
+                _, state, current_version = row
+        finally:
+            notifications.listener.unsubscribe(waiter)
+
+        reached = state in states if states else current_version > since
+        return 200, {'current_state': state, 'version': current_version, 'timeout': not reached}
+
+    @staticmethod
+    async def _error_event(exc):
+        """
+        :param exc: APIException
+        :return: async generator of one `error` event
+        """
+        yield renderers.EventStreamRenderer().render(
+            exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail})
+
+    async def _state_events(self, task_identifier, waiter, row, states, last_version=None):
+        """Same as `TransactionStateViewSet._stream_state_events`
+
+        """
+        task_name, state, version = row
+        final_states = states or transitions.graph_for(task_name).terminal
+        deadline = time.time() + config.WAIT['SSE_MAX_DURATION']
+        try:
+            if version != last_version:
+                yield renderers.server_sent_event('state', {'current_state': state, 'version': version}, version)
+            while state not in final_states:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if not await waiter.wait(min(remaining, config.WAIT['HEARTBEAT'])):
+                    # comment line, keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                row = await self.read_state(task_identifier)
+                if row is None:
+                    break
+                if row[2] != version:
+                    _, state, version = row
+                    yield renderers.server_sent_event('state', {'current_state': state, 'version': version},
+                                                      version)
+        finally:
+            notifications.listener.unsubscribe(waiter)
+
+    @staticmethod
+    def _resolve_payloads(service):
+        """
+        :param service: dict of payload columns
+        :return: same dict with offloaded payloads resolved, missing blobs are left as references
+        """
+        resolved = {}
+        for name, value in service.items():
+            try:
+                resolved[name] = payloads.resolve(value)
+            except payloads.PayloadNotFound:
+                resolved[name] = value
+        return resolved
+
+    async def change_state(self, scope, body, task_identifier):
+        """Same as `TransactionStateViewSet.change_state`
+
+        """
+        data = self.parse(body)
+        change_data = validators.CHANGE_STATE(data)
+        new_state = change_data.get('state')
+        service = self.validate_service(data, self.validate_service_type(data))
+
+        sql, params = models.transition_sql(TASK_TABLE, new_state, timezone.now(), task_identifier,
+                                            expected_state=change_data.get('expected_state'),
+                                            expected_version=change_data.get('expected_version'))
+
+        pool = await self.pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                row = await connection.fetchrow(_numbered(sql), *params)
+                if row is None:
+                    await self._raise_transition_error(connection, task_identifier, new_state)
+                result = models.TransitionResult(*row)
+                await self.save_life_cycle(connection, result.id, new_state, service)
+                changes = [signals.Transition(task_identifier, result.task_name, result.previous_state, new_state)]
+                await self.record_statistics(connection, changes)
+
+        await self.run_sync(self.after_commit, changes)
+        return 200, {'state': new_state, 'version': result.version}
+
+    async def _raise_transition_error(self, connection, task_identifier, new_state):
+        """Same as `TransactionStateViewSet._raise_transition_error`
+
+        """
+        row = await connection.fetchrow(
+            'SELECT task_name, state, retries FROM {table} WHERE task_identifier = $1'.format(table=TASK_TABLE),
+            task_identifier)
+        if row is None:
+            raise exceptions.NotFound()
+        graph = transitions.graph_for(row['task_name'])
+        if not graph.allows(row['state'], new_state, row['retries']):
+            raise Conflict({'detail': 'transition from {0} to {1} is not allowed.'.format(row['state'], new_state)})
+        raise Conflict()
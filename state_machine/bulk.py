@@ -0,0 +1,360 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.bulk
+~~~~~~~~~~~~~~
+
+- Batch write helpers of state machine micro-service, bulk endpoints use them to apply thousands of
+  transitions with a constant number of SQL statements.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+from io import StringIO
+from rest_framework import status
+
+# Django
+from django.db import connection, transaction
+
+# local
+
+
+# own app
+from state_machine import config, journal, models, payloads, signals, transitions
+
+
+class StateChange(namedtuple('StateChange', ('task_identifier', 'state', 'expected_state', 'expected_version',
+                                              'service'))):
+    """Single state change of a bulk request, `service` is either None or a (content_type, validated_data) tuple
+
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_validated_data(cls, data, service):
+        """
+        :param data: data validated by `validators.BULK_CHANGE_STATE`
+        :param service: requested service or None
+        :return: StateChange
+        """
+        return cls(data.get('task_identifier'), data.get('state'), data.get('expected_state'),
+                   data.get('expected_version'), service)
+
+
+NewTask = namedtuple('NewTask', ('task_name', 'task_identifier', 'state', 'service'))
+
+# columns written while inserting new tasks, order matters for VALUES & COPY
+TASK_COLUMNS = ('task_name', 'task_identifier', 'state', 'version', 'retries', 'created_at', 'modified_at')
+
+
+def _chunks(items, size):
+    """
+    :param items: list of items
+    :param size: chunk size
+    :return: generator of list slices of `size` length
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _update_states(final_states, modified_at):
+    """Update `state` of many tasks with one `UPDATE ... FROM (VALUES ...)` statement per chunk.
+
+        - A task is updated only if it is still at version it was read at, so tasks changed concurrently
+          since they were read are left untouched.
+
+    :param final_states: dict of task id -> (new state, version read, new version, new retries)
+    :param modified_at: modification time of all tasks
+    :return: set of ids of updated tasks
+    """
+    table = connection.ops.quote_name(models.TransactionStateMachine._meta.db_table)
+    rows = list(final_states.items())
+    updated = set()
+
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows, config.BULK_BATCH_SIZE):
+            values = ', '.join(['(%s::integer, %s, %s::integer, %s::integer, %s::integer)'] * len(chunk))
+            params = [modified_at]
+            for task_id, (state, read_version, new_version, retries) in chunk:
+                params.extend((task_id, state, read_version, new_version, retries))
+
+            cursor.execute(
+                'UPDATE {table} AS t SET state = v.state, version = v.new_version, retries = v.retries, '
+                'modified_at = %s '
+                'FROM (VALUES {values}) AS v (id, state, read_version, new_version, retries) '
+                'WHERE t.id = v.id AND t.version = v.read_version '
+                'RETURNING t.id'.format(table=table, values=values),
+                params
+            )
+            updated.update(row[0] for row in cursor.fetchall())
+
+    return updated
+
+
+def _create_services(changes):
+    """Insert services of all changes, one `bulk_create` per service model.
+
+    :param changes: list of StateChange
+    :return: list of (content_type, service object) aligned with `changes`, None where no service was sent
+    """
+    services = [None] * len(changes)
+    per_model = OrderedDict()
+
+    for position, change in enumerate(changes):
+        if change.service is None:
+            continue
+        content_type, data = change.service
+        model = content_type.model_class()
+        service = model(**payloads.offload_service_data(model, data))
+        services[position] = (content_type, service)
+        per_model.setdefault(service.__class__, []).append(service)
+
+    for model, objects in per_model.items():
+        # PostgreSQL returns primary keys of bulk inserted rows, they are needed for the Generic FK
+        model.objects.bulk_create(objects, batch_size=config.BULK_BATCH_SIZE)
+
+    return services
+
+
+def _create_life_cycles(rows):
+    """Insert services & life cycle rows of many tasks.
+
+    :param rows: list of (task id, StateChange or NewTask) tuples
+    """
+    if journal.is_enabled():
+        # written behind, see state_machine.journal
+        journal.record([journal.entry(task_id, change.state, change.service) for task_id, change in rows])
+        return
+
+    services = _create_services([change for _, change in rows])
+
+    life_cycles = []
+    for (task_id, change), service in zip(rows, services):
+        life_cycle = models.TransactionLifeCycle(task_id=task_id, state=change.state)
+        if service is not None:
+            life_cycle.content_type, life_cycle.object_id = service[0], service[1].id
+        life_cycles.append(life_cycle)
+
+    models.TransactionLifeCycle.objects.bulk_create(life_cycles, batch_size=config.BULK_BATCH_SIZE)
+
+
+def _copy_value(value):
+    """
+    :param value: python value
+    :return: value escaped for PostgreSQL COPY text format
+    """
+    return '{0}'.format(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def _insert_tasks_values(cursor, table, rows):
+    """Insert tasks with multi-row `INSERT ... ON CONFLICT DO NOTHING`, one statement per chunk.
+
+    :param cursor: database cursor
+    :param table: quoted table name
+    :param rows: list of TASK_COLUMNS tuples
+    :return: dict of inserted task_identifier -> id
+    """
+    inserted = {}
+    for chunk in _chunks(rows, config.BULK_BATCH_SIZE):
+        placeholders = ', '.join(['({0})'.format(', '.join(['%s'] * len(TASK_COLUMNS)))] * len(chunk))
+        cursor.execute(
+            'INSERT INTO {table} ({columns}) VALUES {values} '
+            'ON CONFLICT (task_identifier) DO NOTHING '
+            'RETURNING task_identifier, id'.format(table=table, columns=', '.join(TASK_COLUMNS),
+                                                   values=placeholders),
+            [value for row in chunk for value in row]
+        )
+        inserted.update(cursor.fetchall())
+    return inserted
+
+
+def _insert_tasks_copy(cursor, table, rows):
+    """Insert tasks by COPYing them into a temporary staging table and moving them with a single
+    `INSERT ... SELECT ... ON CONFLICT DO NOTHING`.
+
+    :param cursor: database cursor
+    :param table: quoted table name
+    :param rows: list of TASK_COLUMNS tuples
+    :return: dict of inserted task_identifier -> id
+    """
+    columns = ', '.join(TASK_COLUMNS)
+
+    buffer = StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    cursor.execute(
+        'CREATE TEMPORARY TABLE state_machine_task_staging '
+        'ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA'.format(columns=columns, table=table)
+    )
+    cursor.copy_expert('COPY state_machine_task_staging ({columns}) FROM STDIN'.format(columns=columns), buffer)
+    cursor.execute(
+        'INSERT INTO {table} ({columns}) SELECT {columns} FROM state_machine_task_staging '
+        'ON CONFLICT (task_identifier) DO NOTHING '
+        'RETURNING task_identifier, id'.format(table=table, columns=columns)
+    )
+    return dict(cursor.fetchall())
+
+
+def create_tasks(new_tasks):
+    """Create many tasks at once along with their initial life cycle entry & service.
+
+        - Tasks are inserted with multi-row INSERTs, or with COPY when batch is larger than
+          `BULK_COPY_THRESHOLD`. Both skip already existing `task_identifier`s via `ON CONFLICT DO NOTHING`,
+          so one duplicate does not abort the whole batch.
+        - Services & life cycle rows are written via `bulk_create` for inserted tasks only.
+
+    :param new_tasks: list of (index, NewTask) tuples, index is position of task in request data
+    :return: list of (index, result dict) tuples
+    """
+    results = []
+    if not new_tasks:
+        return results
+
+    # repeated identifiers within the batch, first occurrence wins
+    unique_tasks = OrderedDict()
+    for index, new_task in new_tasks:
+        if new_task.task_identifier in unique_tasks:
+            results.append((index, _conflict(new_task)))
+        else:
+            unique_tasks[new_task.task_identifier] = (index, new_task)
+
+    created_at = modified_at = datetime.now()
+    rows = [(new_task.task_name, new_task.task_identifier, new_task.state, 0, 0, created_at, modified_at)
+            for _, new_task in unique_tasks.values()]
+    table = connection.ops.quote_name(models.TransactionStateMachine._meta.db_table)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if len(rows) > config.BULK_COPY_THRESHOLD:
+                inserted = _insert_tasks_copy(cursor, table, rows)
+            else:
+                inserted = _insert_tasks_values(cursor, table, rows)
+
+        _create_life_cycles([(inserted[identifier], new_task)
+                             for identifier, (_, new_task) in unique_tasks.items() if identifier in inserted])
+
+        signals.state_changed.send(sender=create_tasks, transitions=[
+            signals.Transition(identifier, new_task.task_name, None, new_task.state)
+            for identifier, (_, new_task) in unique_tasks.items() if identifier in inserted
+        ])
+
+    for identifier, (index, new_task) in unique_tasks.items():
+        if identifier not in inserted:
+            results.append((index, _conflict(new_task)))
+            continue
+        results.append((index, {
+            'task_identifier': identifier,
+            'status': status.HTTP_200_OK,
+            'state': new_task.state,
+        }))
+    return results
+
+
+def _conflict(new_task):
+    """
+    :param new_task: NewTask
+    :return: result dict of a task whose identifier already exists
+    """
+    return {
+        'task_identifier': new_task.task_identifier,
+        'status': status.HTTP_409_CONFLICT,
+        'detail': 'task_identifier already exists.',
+    }
+
+
+def _result(change, status_code, **kwargs):
+    """
+    :param change: StateChange
+    :param status_code: HTTP status of change
+    :return: result dict of change
+    """
+    result = {
+        'task_identifier': change.task_identifier,
+        'status': status_code,
+    }
+    result.update(kwargs)
+    return result
+
+
+def apply_state_changes(changes):
+    """Apply many state changes at once.
+
+        - Tasks are fetched with a single `IN` query, states are written with one UPDATE per
+          `BULK_BATCH_SIZE` tasks and services & life cycle rows are inserted via `bulk_create`.
+        - If a task appears more than once, every change is logged in its life cycle & the last one wins,
+          `expected_state` / `expected_version` of a change are checked against outcome of previous one.
+        - Changes whose expectations are not met, which transition graph of task name does not allow, or whose
+          task was changed concurrently, are reported as 409. Graph is checked in memory on state read above.
+
+    :param changes: list of (index, StateChange) tuples, index is position of change in request data
+    :return: list of (index, result dict) tuples
+    """
+    results = []
+    if not changes:
+        return results
+
+    identifiers = set(change.task_identifier for _, change in changes)
+    # task_identifier -> [id, task_name, state, version read, version, retries after changes of this batch]
+    tasks = dict(
+        (row[0], list(row[1:4]) + [row[4], row[4], row[5]])
+        for row in models.TransactionStateMachine.objects.filter(
+            task_identifier__in=identifiers
+        ).values_list('task_identifier', 'id', 'task_name', 'state', 'version', 'retries')
+    )
+
+    applied = []
+    final_states = OrderedDict()
+    for index, change in changes:
+        task = tasks.get(change.task_identifier)
+        if task is None:
+            results.append((index, _result(change, status.HTTP_404_NOT_FOUND, detail='Not found.')))
+            continue
+
+        task_id, task_name, current_state, read_version, current_version, retries = task
+        if (change.expected_state is not None and change.expected_state != current_state) or \
+                (change.expected_version is not None and change.expected_version != current_version):
+            results.append((index, _result(change, status.HTTP_409_CONFLICT, detail='Task state has changed.',
+                                           state=current_state, version=current_version)))
+            continue
+        if not transitions.graph_for(task_name).allows(current_state, change.state, retries):
+            results.append((index, _result(change, status.HTTP_409_CONFLICT, state=current_state,
+                                           detail='transition from {0} to {1} is not allowed.'.format(
+                                               current_state, change.state))))
+            continue
+
+        # a task changed more than once in a batch moves on from its previous change
+        task[2], task[4] = change.state, current_version + 1
+        if change.state == config.RESTART:
+            task[5] = retries + 1
+        final_states[task_id] = (change.state, read_version, task[4], task[5])
+        applied.append((index, task_id, change, task[4],
+                        signals.Transition(change.task_identifier, task_name, current_state, change.state)))
+
+    if not applied:
+        return results
+
+    with transaction.atomic():
+        updated = _update_states(final_states, datetime.now())
+
+        concurrent = [row for row in applied if row[1] not in updated]
+        applied = [row for row in applied if row[1] in updated]
+
+        _create_life_cycles([(task_id, change) for _, task_id, change, _, _ in applied])
+
+        signals.state_changed.send(sender=apply_state_changes,
+                                   transitions=[transition for _, _, _, _, transition in applied])
+
+    for index, _, change, _, _ in concurrent:
+        results.append((index, _result(change, status.HTTP_409_CONFLICT, detail='Task state has changed.')))
+    for index, _, change, version, _ in applied:
+        results.append((index, _result(change, status.HTTP_200_OK, state=change.state, version=version)))
+    return results
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.cache
+~~~~~~~~~~~~~~
+
+- Read-through cache of current task states.
+
+    - Readers fill cache with `add()` i.e only if key is absent.
+    - Writers do not write new state through, after their transaction commits they replace key with a short lived
+      tombstone. While tombstone lives readers go to database and do not fill the cache, so a reader which fetched
+      a state before commit can never put it back after commit (unless it is slower than `TOMBSTONE_TIMEOUT`),
+      and two writers committing in any order can never leave an older state in the cache.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import hashlib
+
+# Django
+from django.core.cache import caches
+from django.db import transaction
+
+# local
+
+
+# own app
+from state_machine import config, models
+
+TOMBSTONE = '__invalidated__'
+TOMBSTONE_TIMEOUT = 2
+
+
+def _cache():
+    """
+    :return: cache backend of task states
+    """
+    return caches[config.STATE_CACHE.get('ALIAS', 'default')]
+
+
+def is_enabled():
+    """
+    :return: whether current state cache is enabled
+    """
+    return config.STATE_CACHE.get('ENABLED', False)
+
+
+def cache_key(task_identifier):
+    """
+    :param task_identifier: task unique identifier
+    :return: cache key, hashed as identifiers may contain characters memcached does not accept
+    """
+    return 'state_machine:state:{0}'.format(hashlib.md5(task_identifier.encode('utf-8')).hexdigest())
+
+
+def get_current_state(task_identifier):
+    """
+    :param task_identifier: task unique identifier
+    :return: current state of task, None if task does not exist
+    """
+    if not is_enabled():
+        return models.TransactionStateMachine.objects.filter(
+            task_identifier=task_identifier
+        ).values_list('state', flat=True).first()
+
+    key = cache_key(task_identifier)
+    state = _cache().get(key)
+    if state is not None and state != TOMBSTONE:
+        return state
+
+    state = models.TransactionStateMachine.objects.filter(
+        task_identifier=task_identifier
+    ).values_list('state', flat=True).first()
+    if state is not None:
+        _cache().add(key, state)
+    return state
+
+
+def invalidate(task_identifiers):
+    """Replace cached states of tasks with tombstones once current transaction commits.
+
+    :param task_identifiers: identifiers of changed tasks
+    """
+    if not is_enabled() or not task_identifiers:
+        return
+    keys = dict((cache_key(identifier), TOMBSTONE) for identifier in task_identifiers)
+    transaction.on_commit(lambda: _cache().set_many(keys, timeout=TOMBSTONE_TIMEOUT))
+
+
+def on_state_changed(sender, transitions, **kwargs):
+    """`state_changed` receiver
+
+    :param sender: sender of signal
+    :param transitions: list of Transition
+    """
+    invalidate(set(transition.task_identifier for transition in transitions))
+
+
+def get_current_states(task_identifiers):
+    """
+    :param task_identifiers: list of task unique identifiers
+    :return: dict of task_identifier -> current state, tasks which do not exist are left out
+    """
+    states = {}
+    missing = set(task_identifiers)
+
+    if is_enabled():
+        keys = dict((cache_key(identifier), identifier) for identifier in missing)
+        for key, state in _cache().get_many(list(keys)).items():
+            if state != TOMBSTONE:
+                states[keys[key]] = state
+        missing.difference_update(states)
+
+    if missing:
+        fetched = dict(models.TransactionStateMachine.objects.filter(
+            task_identifier__in=missing
+        ).values_list('task_identifier', 'state'))
+        if is_enabled():
+            for identifier, state in fetched.items():
+                _cache().add(cache_key(identifier), state)
+        states.update(fetched)
+
+    return states
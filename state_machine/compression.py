@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.compression
+~~~~~~~~~~~~~~
+
+- Response compression, brotli or gzip as client accepts (`Accept-Encoding`), for bodies of at least `MIN_SIZE`.
+
+    - Encodings are tried in order of `ENCODINGS`, `br` needs `brotli` to be installed. A body which does not get
+      smaller is sent as it is.
+    - Streaming responses (streamed life cycle, change feed, event streams, NDJSON acks) are never compressed,
+      compressing them would hold back chunks their clients wait for.
+    - Compression happens inside `InstrumentationMiddleware`, its time is part of request time.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional, only needed for `br` encoding
+    brotli = None
+
+
+# Django
+from django.utils.cache import patch_vary_headers
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=config.COMPRESSION['GZIP_LEVEL'])
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=config.COMPRESSION['BROTLI_QUALITY'])
+
+
+COMPRESSORS = {
+    'gzip': _gzip,
+    'br': _brotli,
+}
+
+
+def available_encodings():
+    """
+    :return: configured encodings which can be produced here, in order of preference
+    """
+    return [encoding for encoding in config.COMPRESSION['ENCODINGS']
+            if encoding in COMPRESSORS and (encoding != 'br' or brotli is not None)]
+
+
+def accepted_encodings(header):
+    """
+    :param header: value of `Accept-Encoding` header
+    :return: set of encodings client accepts, `*` included when it accepts any
+    """
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    """
+    :param header: value of `Accept-Encoding` header
+    :return: encoding of response, None when body should not be compressed
+    """
+    accepted = accepted_encodings(header)
+    for encoding in available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress(content, header):
+    """
+    :param content: response body
+    :param header: value of `Accept-Encoding` header
+    :return: (body, encoding), encoding is None when body is returned as it is
+    """
+    if not config.COMPRESSION['ENABLED'] or len(content) < config.COMPRESSION['MIN_SIZE']:
+        return content, None
+    encoding = choose_encoding(header)
+    if encoding is None:
+        return content, None
+    compressed = COMPRESSORS[encoding](content)
+    if len(compressed) >= len(content):
+        return content, None
+    return compressed, encoding
+
+
+class CompressionMiddleware(object):
+    """Response compression, it should come right after `InstrumentationMiddleware` so it sees final body
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (not config.COMPRESSION['ENABLED'] or response.streaming or response.has_header('Content-Encoding') or
+                len(response.content) < config.COMPRESSION['MIN_SIZE']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        content, encoding = compress(response.content, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # body differs from identity one
+            response['ETag'] = 'W/' + etag
+        return response
@@ -15,7 +15,7 @@ from __future__ import unicode_literals
 
 
 # Django
-
+from django.conf import settings
 
 # local
 
@@ -54,3 +54,138 @@ METHODS = (
 HTTP = 'http'
 
 ENABLED_SERVICES = (HTTP, )
+
+# max number of items accepted by one bulk request
+BULK_MAX_ITEMS = 10000
+# number of rows written by one SQL statement in bulk requests
+BULK_BATCH_SIZE = 1000
+# bulk create requests having more items than this are loaded via PostgreSQL COPY
+BULK_COPY_THRESHOLD = 2000
+# default & max number of events committed together by the streaming ingestion endpoint
+STREAM_BATCH_SIZE = 500
+STREAM_MAX_BATCH_SIZE = 5000
+# default & max page size of cursor paginated life cycle
+LIFE_CYCLE_PAGE_SIZE = 50
+LIFE_CYCLE_MAX_PAGE_SIZE = 1000
+# number of life cycle rows fetched per query while streaming a life cycle
+LIFE_CYCLE_STREAM_CHUNK_SIZE = 500
+# read-through cache of current task states, see state_machine.cache
+STATE_CACHE = getattr(settings, 'STATE_MACHINE_STATE_CACHE', {})
+
+# Allowed transitions of tasks, state -> states it may change to. `terminal` states can not change any more and
+# `max_retries` caps how many times a task may `restart` (None for no limit). Default graph keeps any state free to
+# change to any other, only `complete` is terminal. Stricter graphs of specific `task_name`s can be set in
+# `STATE_MACHINE_TRANSITIONS` setting, keyed by task name, they replace this default for those tasks.
+DEFAULT_TRANSITIONS = {
+    'edges': dict((state, tuple(target for target, _ in STATES)) for state, _ in STATES),
+    'terminal': (COMPLETE, ),
+    'max_retries': None,
+}
+TRANSITIONS = getattr(settings, 'STATE_MACHINE_TRANSITIONS', {})
+
+# time partitioning of append only tables (`INTERVAL` is `day`, `week` or `month`, `AHEAD` & `RETENTION` are
+# counted in intervals, RETENTION None keeps everything), see `manage_partitions` management command
+PARTITIONS = dict({
+    'INTERVAL': 'month',
+    'AHEAD': 3,
+    'RETENTION': None,
+    'ARCHIVE_DIR': None,
+}, **getattr(settings, 'STATE_MACHINE_PARTITIONS', {}))
+
+# offload of large service payloads to a content-addressed blob store, see state_machine.payloads
+PAYLOAD_STORE = dict({
+    'ENABLED': False,
+    'LOCATION': None,
+    'THRESHOLD': 64 * 1024,
+    'CODEC': 'gzip',
+    'PREVIEW_LENGTH': 256,
+}, **getattr(settings, 'STATE_MACHINE_PAYLOAD_STORE', {}))
+
+# write-behind of life cycle rows through a local journal, see state_machine.journal
+LIFE_CYCLE_JOURNAL = dict({
+    'ENABLED': False,
+    'PATH': None,
+    'NAME': None,
+    'BATCH_SIZE': 5000,
+    'FLUSH_INTERVAL': 1.0,
+}, **getattr(settings, 'STATE_MACHINE_LIFE_CYCLE_JOURNAL', {}))
+
+# optional read replica, `ALIAS` is used only when it is one of `DATABASES`, pins of read-your-writes live in
+# `CACHE_ALIAS` cache, see state_machine.db.routers
+READ_REPLICA = dict({
+    'ALIAS': 'replica',
+    'CACHE_ALIAS': 'default',
+    'READ_YOUR_WRITES_WINDOW': 5,
+}, **getattr(settings, 'STATE_MACHINE_READ_REPLICA', {}))
+
+# ASGI application of core operations (see state_machine.asgi), `PREFIX` is URL prefix of state machine routes,
+# `FALLBACK_WORKERS` bounds requests of WSGI fallback served at once per process, a stream or long poll holds one
+ASYNC = dict({
+    'PREFIX': '/micro-service/state/',
+    'POOL_MIN_SIZE': 1,
+    'POOL_MAX_SIZE': 50,
+    'EXECUTOR_WORKERS': 8,
+    'FALLBACK_WORKERS': 64,
+}, **getattr(settings, 'STATE_MACHINE_ASYNC', {}))
+
+# waiting for state changes (see state_machine.notifications), timeouts & heartbeat are in seconds
+WAIT = dict({
+    'CHANNEL': 'state_machine_state_changed',
+    'DEFAULT_TIMEOUT': 30,
+    'MAX_TIMEOUT': 60,
+    'SSE_MAX_DURATION': 300,
+    'HEARTBEAT': 15,
+}, **getattr(settings, 'STATE_MACHINE_WAIT', {}))
+
+# change feed of state transitions (see state_machine.feed)
+FEED = dict({
+    'BATCH_SIZE': 500,
+    'MAX_BATCH_SIZE': 5000,
+}, **getattr(settings, 'STATE_MACHINE_FEED', {}))
+
+# counters of task states & transition rates (see state_machine.statistics), `RATE_WINDOW` & `MAX_RATE_WINDOW` are in
+# minutes, `ROLLUP_RETENTION` in days
+STATISTICS = dict({
+    'ENABLED': True,
+    'SHARDS': 16,
+    'RATE_WINDOW': 60,
+    'MAX_RATE_WINDOW': 1440,
+    'ROLLUP_RETENTION': 7,
+}, **getattr(settings, 'STATE_MACHINE_STATISTICS', {}))
+
+# per request instrumentation (see state_machine.instrumentation), buckets of duration histograms are in seconds
+INSTRUMENTATION = dict({
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'DURATION_BUCKETS': (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'QUERY_BUCKETS': (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+}, **getattr(settings, 'STATE_MACHINE_INSTRUMENTATION', {}))
+
+# sampling profiler of hot tasks & slow queries (see state_machine.sampler), `SLOW_QUERY_THRESHOLD`, `FLUSH_INTERVAL`
+# & `STALE_AFTER` are in seconds
+SAMPLER = dict({
+    'ENABLED': True,
+    'TASK_SAMPLE_RATE': 0.1,
+    'SLOW_QUERY_THRESHOLD': 0.05,
+    'CAPACITY': 500,
+    'FLUSH_INTERVAL': 60,
+    'STALE_AFTER': 600,
+}, **getattr(settings, 'STATE_MACHINE_SAMPLER', {}))
+
+# archive of life cycles of finished tasks (see state_machine.archive), archiving is disabled while `LOCATION`
+# (a directory) is not set
+ARCHIVE = dict({
+    'LOCATION': None,
+    'AFTER_DAYS': 30,
+    'BATCH_SIZE': 500,
+}, **getattr(settings, 'STATE_MACHINE_ARCHIVE', {}))
+
+# response compression (see state_machine.compression), `MIN_SIZE` is in bytes, `br` is used only when `brotli` is
+# installed
+COMPRESSION = dict({
+    'ENABLED': False,
+    'MIN_SIZE': 1024,
+    'ENCODINGS': ('br', 'gzip'),
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+}, **getattr(settings, 'STATE_MACHINE_COMPRESSION', {}))
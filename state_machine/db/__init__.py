@@ -0,0 +1,4 @@
+"""
+PostgreSQL database backend of state_machine micro-service with an in-process connection pool,
+use `'ENGINE': 'state_machine.db'` (see state_machine.db.base).
+"""
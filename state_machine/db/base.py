@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.db.base
+~~~~~~~~~~~~~~
+
+- Django PostgreSQL backend which takes connections from an in-process pool (see state_machine.db.pool) and gives
+  them back on close, instead of opening a new connection per request.
+
+    - Pool is configured by `OPTIONS['POOL']` of database settings, `{'max_size', 'timeout', 'health_check_interval',
+      'max_lifetime'}`, `OPTIONS['POOL'] = False` disables it.
+    - Works with any `CONN_MAX_AGE`, with 0 a connection goes back to pool at end of each request.
+    - Cursors time every query for per request instrumentation & slow query sampler (see
+      state_machine.instrumentation & state_machine.sampler).
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import time
+
+
+# Django
+from django.db.backends import utils
+from django.db.backends.postgresql import base
+
+
+# local
+
+
+# own app
+from state_machine import instrumentation, sampler
+from state_machine.db import pool
+
+
+class TimedCursorWrapper(utils.CursorWrapper):
+    """Cursor wrapper recording duration of queries in timings of current request & slow query sampler
+
+    """
+
+    def execute(self, sql, params=None):
+        started = time.time()
+        try:
+            return super(TimedCursorWrapper, self).execute(sql, params)
+        finally:
+            duration = time.time() - started
+            instrumentation.record_query(duration)
+            sampler.observe_query(sql, duration)
+
+    def executemany(self, sql, param_list):
+        started = time.time()
+        try:
+            return super(TimedCursorWrapper, self).executemany(sql, param_list)
+        finally:
+            duration = time.time() - started
+            instrumentation.record_query(duration)
+            sampler.observe_query(sql, duration)
+
+
+class TimedCursorDebugWrapper(TimedCursorWrapper, utils.CursorDebugWrapper):
+    """Debug cursor wrapper (`DEBUG` on or queries captured) recording duration of queries
+
+    """
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL database wrapper with connection pool
+
+    """
+
+    def _pool_options(self):
+        """
+        :return: pool options, None when pool is disabled
+        """
+        options = self.settings_dict['OPTIONS'].get('POOL', {})
+        if options is False:
+            return None
+        return options
+
+    def get_connection_params(self):
+        """
+        :return: keyword arguments of `psycopg2.connect`, without pool options
+        """
+        conn_params = super(DatabaseWrapper, self).get_connection_params()
+        conn_params.pop('POOL', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        """
+        :param conn_params: keyword arguments of `psycopg2.connect`
+        :return: connection taken from pool
+        """
+        options = self._pool_options()
+        if options is None:
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        connection = pool.get_pool(self.alias, conn_params, options).getconn()
+
+        # same as `base.DatabaseWrapper.get_new_connection`, isolation level must be known before autocommit is set
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is None:
+            self.isolation_level = connection.isolation_level
+        else:
+            self.isolation_level = isolation_level
+            if isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=isolation_level)
+        return connection
+
+    def _close(self):
+        """Give connection back to pool instead of closing it.
+
+        """
+        options = self._pool_options()
+        if options is None or self.connection is None:
+            return super(DatabaseWrapper, self)._close()
+
+        with self.wrap_database_errors:
+            pool.get_pool(self.alias, self.get_connection_params(), options).putconn(self.connection)
+
+    def make_cursor(self, cursor):
+        return TimedCursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        return TimedCursorDebugWrapper(cursor, self)
+
+    def pool_stats(self):
+        """
+        :return: metrics of pool of this database, None when pool is disabled
+        """
+        options = self._pool_options()
+        if options is None:
+            return None
+        return pool.get_pool(self.alias, self.get_connection_params(), options).stats()
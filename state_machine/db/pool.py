@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.db.pool
+~~~~~~~~~~~~~~
+
+- In-process pool of PostgreSQL connections, shared by all threads of a worker process.
+
+    - A connection is checked (`SELECT 1`) before it is handed out when it was idle longer than
+      `health_check_interval`, so connections killed by server, proxy or failover are replaced instead of failing
+      a request. Check runs outside of pool lock, a dead connection frees its slot & caller tries again.
+      Connections older than `max_lifetime` are closed when they come back.
+    - A connection which comes back inside a transaction is rolled back, a broken one is discarded.
+    - Pools are recreated after fork, a forked worker never shares sockets of its parent.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+# Django
+
+
+# local
+
+
+# own app
+
+DEFAULTS = {
+    'max_size': 10,
+    'timeout': 10.0,
+    'health_check_interval': 30.0,
+    'max_lifetime': 3600.0,
+}
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within pool timeout
+
+    """
+
+
+class ConnectionPool(object):
+    """Bounded pool of psycopg2 connections
+
+    """
+
+    def __init__(self, conn_params, max_size=10, timeout=10.0, health_check_interval=30.0, max_lifetime=3600.0):
+        """
+        :param conn_params: keyword arguments of `psycopg2.connect`
+        :param max_size: max open connections, callers wait for a free one beyond it
+        :param timeout: seconds a caller waits for a free connection
+        :param health_check_interval: idle seconds after which a connection is checked before use
+        :param max_lifetime: seconds after which a connection is closed instead of being reused
+        """
+        self.conn_params = conn_params
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, idle since), most recently used last
+        self._created_at = {}  # id(connection) -> created at
+        self._size = 0
+
+        # metrics
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        """
+        :return: new connection
+        """
+        connection = psycopg2.connect(**self.conn_params)
+        self._created_at[id(connection)] = time.time()
+        return connection
+
+    def _discard(self, connection):
+        """
+        :param connection: connection which is not returned to pool
+        """
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    @staticmethod
+    def _is_alive(connection):
+        """
+        :param connection: idle connection
+        :return: whether connection still answers
+        """
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        :return: healthy connection, raises PoolTimeout when none is free within timeout
+        """
+        started = None
+        while True:
+            with self._condition:
+                connection, idle_since, started = self._checkout(started)
+
+            if connection is None:
+                # slot was reserved, connect outside of lock
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            # checked outside of lock, other callers are not held up by a slow or dead server
+            if not connection.closed and (time.time() - idle_since <= self.health_check_interval or
+                                          self._is_alive(connection)):
+                return connection
+            self._discard(connection)
+            with self._condition:
+                self._size -= 1
+                self._discarded += 1
+                self._condition.notify()
+
+    def _checkout(self, started):
+        """Take most recently used idle connection or reserve a slot for a new one, waiting for either. Called
+        with lock held.
+
+        :param started: time caller started waiting, None when it did not wait yet
+        :return: (connection, idle since, started), connection is None when a slot was reserved
+        """
+        while True:
+            if self._idle:
+                connection, idle_since = self._idle.pop()
+                self._record_wait(started)
+                return connection, idle_since, None
+
+            if self._size < self.max_size:
+                self._size += 1
+                self._record_wait(started)
+                return None, None, None
+
+            if started is None:
+                started = time.time()
+                self._waits += 1
+            remaining = self.timeout - (time.time() - started)
+            if remaining <= 0:
+                self._timeouts += 1
+                raise PoolTimeout('no database connection became free within {0} seconds.'.format(self.timeout))
+            self._condition.wait(remaining)
+
+    def _record_wait(self, started):
+        """
+        :param started: time caller started waiting, None when it did not wait
+        """
+        if started is None:
+            return
+        waited = time.time() - started
+        self._wait_time += waited
+        self._max_wait_time = max(self._max_wait_time, waited)
+
+    def putconn(self, connection):
+        """
+        :param connection: connection taken from this pool
+        """
+        reusable = not connection.closed
+        if reusable and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        created_at = self._created_at.get(id(connection), 0)
+        if reusable and time.time() - created_at > self.max_lifetime:
+            reusable = False
+
+        with self._condition:
+            if reusable:
+                self._idle.append((connection, time.time()))
+            else:
+                self._size -= 1
+                self._discarded += 1
+                self._discard(connection)
+            self._condition.notify()
+
+    def close(self):
+        """Close all idle connections.
+
+        """
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._size -= 1
+                self._discard(connection)
+
+    def stats(self):
+        """
+        :return: pool metrics, `wait_time` & `max_wait_time` are in seconds
+        """
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'max_wait_time': round(self._max_wait_time, 6),
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    :param alias: database alias
+    :param conn_params: keyword arguments of `psycopg2.connect`
+    :param options: pool options, missing ones default to `DEFAULTS`
+    :return: pool of alias, created on first use
+    """
+    global _pid
+    key = (alias, conn_params.get('database'))
+    with _pools_lock:
+        if _pid != os.getpid():
+            # forked, sockets of parent must not be used
+            _pools.clear()
+            _pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(conn_params, **dict(DEFAULTS, **options))
+        return pool
+
+
+def stats():
+    """
+    :return: dict of database alias -> pool metrics, of current process
+    """
+    with _pools_lock:
+        return {alias: pool.stats() for (alias, _), pool in _pools.items()}
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.db.routers
+~~~~~~~~~~~~~~
+
+- Database router which sends reads to an optional read replica, with read-your-writes for recently changed tasks.
+
+    - Reads go to replica (`STATE_MACHINE_READ_REPLICA['ALIAS']`, when it is configured in `DATABASES`) unless
+      they run inside a transaction of primary or inside `use_primary()`.
+    - Every committed transition pins its task to primary for `READ_YOUR_WRITES_WINDOW` seconds. Pins live in a
+      shared cache, so they hold across workers & hosts. Read endpoints of a task wrap their queries in
+      `read_for(task_identifiers)`, which reads from primary while any of those tasks is pinned.
+    - Window must be longer than replica lag for the guarantee to hold.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+_local = threading.local()
+
+
+def replica_alias():
+    """
+    :return: alias of read replica, None when no replica is configured
+    """
+    alias = config.READ_REPLICA['ALIAS']
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def _cache():
+    """
+    :return: cache backend of pins
+    """
+    return caches[config.READ_REPLICA['CACHE_ALIAS']]
+
+
+def pin_key(task_identifier):
+    """
+    :param task_identifier: task unique identifier
+    :return: cache key of pin of task
+    """
+    return 'state_machine:pin:{0}'.format(hashlib.md5(task_identifier.encode('utf-8')).hexdigest())
+
+
+def pin(task_identifiers):
+    """Pin tasks to primary once current transaction commits.
+
+    :param task_identifiers: identifiers of changed tasks
+    """
+    if replica_alias() is None or not task_identifiers:
+        return
+    keys = dict((pin_key(identifier), 1) for identifier in task_identifiers)
+    transaction.on_commit(lambda: _cache().set_many(keys, timeout=config.READ_REPLICA['READ_YOUR_WRITES_WINDOW']))
+
+
+def is_pinned(task_identifiers):
+    """
+    :param task_identifiers: task unique identifiers
+    :return: whether any of tasks changed within read-your-writes window
+    """
+    if replica_alias() is None or not task_identifiers:
+        return False
+    return bool(_cache().get_many([pin_key(identifier) for identifier in task_identifiers]))
+
+
+def on_state_changed(sender, transitions, **kwargs):
+    """`state_changed` receiver
+
+    :param sender: sender of signal
+    :param transitions: list of Transition
+    """
+    pin(set(transition.task_identifier for transition in transitions))
+
+
+@contextmanager
+def use_primary(enabled=True):
+    """Route reads of current thread to primary.
+
+    :param enabled: False makes it a no-op
+    """
+    if not enabled:
+        yield
+        return
+    _local.primary = getattr(_local, 'primary', 0) + 1
+    try:
+        yield
+    finally:
+        _local.primary -= 1
+
+
+@contextmanager
+def read_for(task_identifiers):
+    """Route reads of current thread to primary while any of tasks is pinned.
+
+    :param task_identifiers: task unique identifiers which are read
+    """
+    with use_primary(is_pinned(task_identifiers)):
+        yield
+
+
+class ReadReplicaRouter(object):
+    """Primary / read replica router
+
+    """
+
+    def db_for_read(self, model, **hints):
+        """
+        :param model: model which is read
+        :return: replica, or primary when reads must see own writes
+        """
+        replica = replica_alias()
+        if replica is None or getattr(_local, 'primary', 0) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        """
+        :param model: model which is written
+        :return: primary
+        """
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        :return: replica holds same data as primary, any relation is allowed
+        """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """
+        :return: replica is migrated through replication, never directly
+        """
+        if db == replica_alias():
+            return False
+        return None
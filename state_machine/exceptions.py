@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.exceptions
+~~~~~~~~~~~~~~
+
+- API exceptions of state_machine micro-service
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+# Django
+from django.utils.translation import ugettext_lazy as _
+
+
+# local
+
+
+# own app
+
+
+class Conflict(APIException):
+    """Request conflicts with current state of task
+
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('Task state has changed.')
+    default_code = 'conflict'
+
+
+class ServiceUnavailable(APIException):
+    """Data of request is kept where this host can not read it right now
+
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Service temporarily unavailable, try again later.')
+    default_code = 'service_unavailable'
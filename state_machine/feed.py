@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.feed
+~~~~~~~~~~~~~~
+
+- Global change feed of state transitions, i.e `TransactionLifeCycle` rows in order of transaction which committed
+  them.
+
+    - Every row carries `txid`, id of transaction which inserted it (see migration 0013). Feed is ordered by
+      (txid, id) & a batch only holds rows of transactions older than every transaction still running (xmin of
+      snapshot of query), such transactions are all finished & no new one gets a smaller id, so rows after a cursor
+      never show up later. Ids from sequence or `created_at` are not used, they are decided before commit.
+    - Consumers keep `cursor` of last event they processed (`<txid>-<id>`) & ask for events after it, which is a
+      range scan of (txid, id) index.
+    - A long running transaction holds feed back until it ends, whatever tables it touches.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from collections import OrderedDict
+
+
+# Django
+
+
+# local
+
+
+# own app
+from state_machine import models
+
+EVENT_FIELDS = ('txid', 'id', 'task__task_identifier', 'task__task_name', 'state', 'created_at')
+
+START = (0, 0)
+
+
+def parse_cursor(value):
+    """
+    :param value: cursor as returned by feed, `0` for beginning of feed
+    :return: (txid, id) tuple
+    :raise ValueError: value is not a cursor
+    """
+    if value in ('', '0'):
+        return START
+    txid, separator, event_id = value.partition('-')
+    if not separator:
+        raise ValueError(value)
+    return int(txid), int(event_id)
+
+
+def format_cursor(position):
+    """
+    :param position: (txid, id) tuple
+    :return: cursor of position
+    """
+    return '{0}-{1}'.format(*position) if position != START else '0'
+
+
+def events_after(position):
+    """
+    :param position: (txid, id) of last event consumer has seen
+    :return: queryset of committed events after position, in feed order
+    """
+    table = models.TransactionLifeCycle._meta.db_table
+    return models.TransactionLifeCycle.objects.extra(
+        select={'txid': '{0}.txid'.format(table)},
+        where=['({0}.txid, {0}.id) > (%s, %s)'.format(table),
+               '{0}.txid < txid_snapshot_xmin(txid_current_snapshot())'.format(table)],
+        params=list(position),
+        order_by=['txid', 'id'],
+    )
+
+
+def read_events(position, limit):
+    """
+    :param position: (txid, id) of last event consumer has seen, `START` for beginning of feed
+    :param limit: max events to return
+    :return: list of events, in feed order
+    """
+    events = []
+    for txid, event_id, task_identifier, task_name, state, created_at in events_after(position).values_list(
+            *EVENT_FIELDS)[:limit]:
+        events.append(OrderedDict((
+            ('cursor', format_cursor((txid, event_id))),
+            ('id', event_id),
+            ('task_identifier', task_identifier),
+            ('task_name', task_name),
+            ('state', state),
+            ('created_at', created_at),
+        )))
+    return events
@@ -0,0 +1,338 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.instrumentation
+~~~~~~~~~~~~~~
+
+- Always-on per request instrumentation: database queries & time, serializer time and render time per endpoint.
+
+    - `InstrumentationMiddleware` keeps timings of current request in a thread local. Queries are counted by cursors
+      of `state_machine.db` backend, serializer time by `timed('serialize')` blocks of views, render time between
+      `process_template_response` and end of rendering. Serializer & render times exclude queries run inside them.
+    - Timings are observed into Prometheus histograms, labelled by URL name & method, served as text exposition
+      format by `metrics/` endpoint, and sent back as `Server-Timing` header.
+    - Histograms live in memory of each worker process, every process must be scraped (or run one per container).
+    - Body of a streaming response is produced after middleware returns, its queries are not counted.
+    - Routes of ASGI application (state_machine.asgi) never reach middleware. It observes requests, duration,
+      database time & queries of them itself, keeping timings per asyncio task: its `asyncpg` connections time
+      their queries, Django queries of its thread pool are counted by cursors as above. Serializer & render time
+      and `Server-Timing` header are not recorded there.
+    - Cost per request is a few clock reads, one thread local & an uncontended lock per histogram.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import asyncio
+import bisect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+
+# Django
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+_local = threading.local()
+
+# Timings of requests served by asyncio tasks
+_tasks = weakref.WeakKeyDictionary()
+
+# `asyncio.current_task` is Python 3.7+
+_current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+
+class Timings(object):
+    """Timings of one request, in seconds
+
+    """
+    __slots__ = ('queries', 'db', 'serialize', 'render')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+
+
+def current():
+    """
+    :return: Timings of request handled by current thread, None outside of a request
+    """
+    return getattr(_local, 'timings', None)
+
+
+def record_query(seconds):
+    """
+    :param seconds: duration of a query run by current thread
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.queries += 1
+        timings.db += seconds
+
+
+@contextmanager
+def recording(timings):
+    """Add queries of current thread to given timings meanwhile, e.g while a thread works for an asyncio task.
+
+    :param timings: Timings of request, None to record nothing
+    """
+    previous = getattr(_local, 'timings', None)
+    _local.timings = timings
+    try:
+        yield
+    finally:
+        _local.timings = previous
+
+
+def start_task():
+    """
+    :return: new Timings of request served by current asyncio task
+    """
+    timings = _tasks[_current_task()] = Timings()
+    return timings
+
+
+def finish_task():
+    _tasks.pop(_current_task(), None)
+
+
+def task_timings():
+    """
+    :return: Timings of request served by current asyncio task, None outside of one
+    """
+    task = _current_task()
+    return _tasks.get(task) if task is not None else None
+
+
+def record_task_query(seconds):
+    """
+    :param seconds: duration of a query run by current asyncio task
+    """
+    timings = task_timings()
+    if timings is not None:
+        timings.queries += 1
+        timings.db += seconds
+
+
+def _add(timings, phase, started, db):
+    """
+    :param timings: Timings of request
+    :param phase: `serialize` or `render`
+    :param started: time phase started
+    :param db: database time of request when phase started
+    """
+    setattr(timings, phase, getattr(timings, phase) + (time.time() - started) - (timings.db - db))
+
+
+@contextmanager
+def timed(phase):
+    """Add time spent in block, less its queries, to `phase` of current request.
+
+    :param phase: `serialize` or `render`
+    """
+    timings = current()
+    if timings is None:
+        yield
+        return
+    started, db = time.time(), timings.db
+    try:
+        yield
+    finally:
+        _add(timings, phase, started, db)
+
+
+def _label_value(value):
+    return '{0}'.format(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    """
+    :return: Prometheus label set e.g `{endpoint="change-state",method="PUT"}`
+    """
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join('{0}="{1}"'.format(name, _label_value(value)) for name, value in pairs) + '}'
+
+
+class Counter(object):
+    """Prometheus counter
+
+    """
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, labels, amount=1):
+        """
+        :param labels: tuple of label values, in order of `labelnames`
+        :param amount: increment
+        """
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def expose(self):
+        """
+        :return: lines of text exposition format
+        """
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation), '# TYPE {0} counter'.format(self.name)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, value in series:
+            lines.append('{0}{1} {2}'.format(self.name, _labels(self.labelnames, labels), value))
+        return lines
+
+
+class Histogram(object):
+    """Prometheus histogram
+
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        """
+        :param buckets: sorted upper bounds of buckets, `+Inf` is implied
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [counts per bucket, sum, count]
+
+    def observe(self, labels, value):
+        """
+        :param labels: tuple of label values, in order of `labelnames`
+        :param value: observed value
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        """
+        :return: lines of text exposition format
+        """
+        lines = ['# HELP {0} {1}'.format(self.name, self.documentation), '# TYPE {0} histogram'.format(self.name)]
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count)
+                            in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf', ), counts):
+                cumulative += bucket_count
+                lines.append('{0}_bucket{1} {2}'.format(self.name, _labels(self.labelnames, labels,
+                                                                           [('le', bound)]), cumulative))
+            lines.append('{0}_sum{1} {2!r}'.format(self.name, _labels(self.labelnames, labels), total))
+            lines.append('{0}_count{1} {2}'.format(self.name, _labels(self.labelnames, labels), count))
+        return lines
+
+
+LABELS = ('endpoint', 'method')
+
+REQUESTS = Counter('state_machine_requests_total', 'Requests by endpoint, method & status.',
+                   LABELS + ('status', ))
+DURATION = Histogram('state_machine_request_duration_seconds', 'Time spent in request, body of streaming '
+                     'responses excluded.', LABELS, config.INSTRUMENTATION['DURATION_BUCKETS'])
+DB_TIME = Histogram('state_machine_request_db_seconds', 'Time spent in database queries per request.',
+                    LABELS, config.INSTRUMENTATION['DURATION_BUCKETS'])
+DB_QUERIES = Histogram('state_machine_request_db_queries', 'Database queries per request.',
+                       LABELS, config.INSTRUMENTATION['QUERY_BUCKETS'])
+SERIALIZE_TIME = Histogram('state_machine_request_serialize_seconds', 'Time spent validating & serializing data '
+                           'per request, queries excluded.', LABELS, config.INSTRUMENTATION['DURATION_BUCKETS'])
+RENDER_TIME = Histogram('state_machine_request_render_seconds', 'Time spent rendering response, queries excluded.',
+                        LABELS, config.INSTRUMENTATION['DURATION_BUCKETS'])
+
+METRICS = (REQUESTS, DURATION, DB_TIME, DB_QUERIES, SERIALIZE_TIME, RENDER_TIME)
+
+
+def expose():
+    """
+    :return: all metrics of this process, in Prometheus text exposition format
+    """
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
+
+
+def observe(endpoint, method, status_code, timings, total):
+    """Observe request into metrics.
+
+    :param endpoint: URL name of endpoint
+    :param method: HTTP method
+    :param status_code: status code of response
+    :param timings: Timings of request
+    :param total: duration of request in seconds
+    """
+    labels = (endpoint, method)
+    REQUESTS.inc(labels + (status_code, ))
+    DURATION.observe(labels, total)
+    DB_TIME.observe(labels, timings.db)
+    DB_QUERIES.observe(labels, timings.queries)
+
+
+def server_timing(timings, total):
+    """
+    :param timings: Timings of request
+    :param total: duration of request in seconds
+    :return: value of `Server-Timing` header, durations in milliseconds
+    """
+    return 'db;dur={0:.3f};desc="{1} queries", serialize;dur={2:.3f}, render;dur={3:.3f}, total;dur={4:.3f}'.format(
+        timings.db * 1000, timings.queries, timings.serialize * 1000, timings.render * 1000, total * 1000)
+
+
+class InstrumentationMiddleware(object):
+    """Per request instrumentation, it should come first in `MIDDLEWARE` so other middleware is timed too
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not config.INSTRUMENTATION['ENABLED']:
+            return self.get_response(request)
+
+        timings = _local.timings = Timings()
+        started = time.time()
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.timings = None
+        total = time.time() - started
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        endpoint = (resolver_match.url_name or 'unnamed') if resolver_match is not None else 'unmatched'
+        labels = (endpoint, request.method)
+        observe(endpoint, request.method, response.status_code, timings, total)
+        SERIALIZE_TIME.observe(labels, timings.serialize)
+        RENDER_TIME.observe(labels, timings.render)
+
+        if config.INSTRUMENTATION['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        """Start render timer, response is rendered right after this hook.
+
+        """
+        timings = current()
+        if timings is not None:
+            started, db = time.time(), timings.db
+            response.add_post_render_callback(lambda rendered: _add(timings, 'render', started, db))
+        return response
@@ -0,0 +1,309 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.journal
+~~~~~~~~~~~~~~
+
+- Write-behind of life cycle (and service) rows through a durable local journal.
+
+    - State updates stay synchronous. When `STATE_MACHINE_LIFE_CYCLE_JOURNAL` is enabled, life cycle rows of a
+      request are appended to a local SQLite journal (WAL, `synchronous=FULL`) instead of being inserted, inside
+      its transaction, before it commits. Entries are tagged with id of that PostgreSQL transaction, so a request
+      which fails to commit leaves entries the flusher knows to skip, and a committed request never misses its own.
+    - When journal can not be appended to (e.g disk full), rows are inserted synchronously in request transaction
+      instead, request does not fail because of journal.
+    - `flush_life_cycle_journal` management command drains journal into PostgreSQL in large batches. Every batch is
+      inserted together with a checkpoint (sequence of its last entry) in one transaction, entries up to checkpoint
+      are discarded from journal afterwards, so a flusher restarted after a crash neither loses nor repeats entries.
+      Flusher asks PostgreSQL (`txid_status`) whether transaction of every entry committed: entries of aborted
+      ones are discarded, and a batch stops before first entry whose transaction is still in progress.
+    - Entries must be recorded at outermost level of a write, entries of a savepoint which rolls back while its
+      transaction commits would still be flushed.
+    - Life cycle reads are eventually consistent, entries show up once they are flushed. `created_at` is the time
+      of request, not of flush.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+
+
+# Django
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# local
+
+
+# own app
+from state_machine import config, models, payloads
+
+LIFE_CYCLE_COLUMNS = ('task_id', 'state', 'content_type_id', 'object_id', 'created_at')
+
+# `txid_status` of unfinished & rolled back transactions
+IN_PROGRESS = 'in progress'
+ABORTED = 'aborted'
+
+logger = logging.getLogger(__name__)
+
+
+class LifeCycleJournal(object):
+    """Append only journal of life cycle entries on local disk
+
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of SQLite journal file
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        :return: SQLite connection of current thread
+        """
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            # an entry is on disk before request returns
+            db.execute('PRAGMA synchronous=FULL')
+            # AUTOINCREMENT, sequences of discarded entries are never reused
+            db.execute('CREATE TABLE IF NOT EXISTS entries '
+                       '(seq INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL)')
+            self._local.db = db
+        return db
+
+    def append(self, entries):
+        """
+        :param entries: list of JSON serializable entries, appended in one journal transaction
+        """
+        db = self._connection()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.executemany('INSERT INTO entries (entry) VALUES (?)',
+                           [(json.dumps(entry, separators=(',', ':')), ) for entry in entries])
+
+    def read(self, limit):
+        """
+        :param limit: max entries to read
+        :return: list of (sequence, entry), oldest first
+        """
+        rows = self._connection().execute('SELECT seq, entry FROM entries ORDER BY seq LIMIT ?', (limit, ))
+        return [(sequence, json.loads(entry)) for sequence, entry in rows]
+
+    def discard(self, sequence):
+        """
+        :param sequence: entries up to this sequence (inclusive) are removed
+        """
+        db = self._connection()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('DELETE FROM entries WHERE seq <= ?', (sequence, ))
+
+    def pending(self):
+        """
+        :return: number of entries which are not flushed yet
+        """
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+_journal = None
+
+
+def is_enabled():
+    """
+    :return: whether life cycle rows are written behind
+    """
+    return config.LIFE_CYCLE_JOURNAL['ENABLED']
+
+
+def journal_name():
+    """
+    :return: name of local journal, checkpoints are kept per journal
+    """
+    return config.LIFE_CYCLE_JOURNAL['NAME'] or '{0}:{1}'.format(socket.gethostname(), get_journal().path)
+
+
+def get_journal():
+    """
+    :return: local journal configured by `STATE_MACHINE_LIFE_CYCLE_JOURNAL`
+    """
+    global _journal
+    if _journal is None:
+        if not config.LIFE_CYCLE_JOURNAL['PATH']:
+            raise ImproperlyConfigured('STATE_MACHINE_LIFE_CYCLE_JOURNAL requires `PATH` when it is enabled.')
+        _journal = LifeCycleJournal(config.LIFE_CYCLE_JOURNAL['PATH'])
+    return _journal
+
+
+def entry(task_id, state, service=None):
+    """
+    :param task_id: id of task
+    :param state: state of life cycle entry
+    :param service: (content_type, validated service data) or None
+    :return: journal entry
+    """
+    if service is not None:
+        content_type, data = service
+        service = {
+            'content_type_id': content_type.id,
+            'data': payloads.offload_service_data(content_type.model_class(), data),
+        }
+    return {
+        'task_id': task_id,
+        'state': state,
+        'created_at': timezone.now().isoformat(),
+        'service': service,
+    }
+
+
+def append(entries, xid):
+    """Append entries of a database transaction to local journal.
+
+    :param entries: list of journal entries
+    :param xid: id of database transaction which writes them (`txid_current()`)
+    :return: whether entries are in journal, False when journal is unavailable & caller has to insert rows itself
+    """
+    tagged = [dict(item, xid=xid) for item in entries]
+    try:
+        get_journal().append(tagged)
+    except (sqlite3.Error, IOError, OSError):
+        logger.exception('life cycle journal is unavailable, %s entries are inserted synchronously', len(entries))
+        return False
+    return True
+
+
+def record(entries):
+    """Append entries to local journal before current transaction commits, or insert their rows in it when
+    journal is unavailable.
+
+    :param entries: list of journal entries
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_current()')
+        xid = cursor.fetchone()[0]
+    if not append(entries, xid):
+        _insert_entries(entries)
+
+
+def _insert(cursor, model, columns, rows):
+    """
+    :param cursor: database cursor
+    :param model: model of rows
+    :param columns: column names
+    :param rows: list of value tuples, aligned with columns
+    :return: ids of inserted rows, in order of rows
+    """
+    fields_by_column = {field.column: field for field in model._meta.concrete_fields}
+    fields = [fields_by_column[column] for column in columns]
+    ids = []
+    for start in range(0, len(rows), config.BULK_BATCH_SIZE):
+        chunk = rows[start:start + config.BULK_BATCH_SIZE]
+        placeholders = ', '.join(['({0})'.format(', '.join(['%s'] * len(columns)))] * len(chunk))
+        params = [field.get_db_prep_save(value, connection)
+                  for row in chunk for field, value in zip(fields, row)]
+        cursor.execute('INSERT INTO {table} ({columns}) VALUES {values} RETURNING id'.format(
+            table=connection.ops.quote_name(model._meta.db_table),
+            columns=', '.join(connection.ops.quote_name(column) for column in columns),
+            values=placeholders), params)
+        ids.extend(row[0] for row in cursor.fetchall())
+    return ids
+
+
+def _insert_entries(entries):
+    """Insert services & life cycle rows of entries, keeping their `created_at`.
+
+    :param entries: list of journal entries
+    """
+    object_ids = [None] * len(entries)
+    per_content_type = {}
+    for position, item in enumerate(entries):
+        if item['service'] is not None:
+            per_content_type.setdefault(item['service']['content_type_id'], []).append(position)
+
+    with connection.cursor() as cursor:
+        for content_type_id, positions in per_content_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            names = sorted(set(name for position in positions for name in entries[position]['service']['data']))
+            fields = [model._meta.get_field(name) for name in names]
+            columns = [field.column for field in fields] + ['created_at']
+            # fields a request did not send get their model default, same as `Model.objects.create`
+            rows = [tuple(entries[position]['service']['data'][field.name]
+                          if field.name in entries[position]['service']['data'] else field.get_default()
+                          for field in fields) + (parse_datetime(entries[position]['created_at']), )
+                    for position in positions]
+            for position, object_id in zip(positions, _insert(cursor, model, columns, rows)):
+                object_ids[position] = object_id
+
+        rows = [(item['task_id'], item['state'],
+                 item['service']['content_type_id'] if item['service'] is not None else None,
+                 object_id, parse_datetime(item['created_at'])) for item, object_id in zip(entries, object_ids)]
+        _insert(cursor, models.TransactionLifeCycle, list(LIFE_CYCLE_COLUMNS), rows)
+
+
+def _transaction_statuses(xids):
+    """
+    :param xids: ids of database transactions
+    :return: dict of id -> `committed`, `aborted` or `in progress`, None when it is too old to be known (it is
+        flushed as committed, history is never dropped on doubt)
+    """
+    if not xids:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT xid, txid_status(xid) FROM unnest(%s::bigint[]) AS xid', [sorted(xids)])
+        return dict(cursor.fetchall())
+
+
+def flush(batch_size=None):
+    """Move one batch of entries from local journal to database.
+
+    :param batch_size: max entries to flush, defaults to `BATCH_SIZE` of journal configuration
+    :return: number of entries taken from journal (entries of rolled back transactions included)
+    """
+    journal, name = get_journal(), journal_name()
+    batch_size = batch_size or config.LIFE_CYCLE_JOURNAL['BATCH_SIZE']
+
+    with transaction.atomic():
+        checkpoint, _ = models.LifeCycleJournalCheckpoint.objects.select_for_update().get_or_create(journal=name)
+        # recovery, entries of a batch which was committed right before a crash are still in journal
+        journal.discard(checkpoint.sequence)
+
+        batch = journal.read(batch_size)
+        statuses = _transaction_statuses(set(item['xid'] for _, item in batch if item.get('xid') is not None))
+
+        committed, done = [], 0
+        for _, item in batch:
+            # entries without transaction id were appended after commit (journals of earlier versions)
+            status = statuses.get(item.get('xid'))
+            if status == IN_PROGRESS:
+                break
+            done += 1
+            if status != ABORTED:
+                committed.append(item)
+        if not done:
+            return 0
+
+        if committed:
+            _insert_entries(committed)
+        checkpoint.sequence = batch[done - 1][0]
+        checkpoint.save(update_fields=['sequence', 'modified_at'])
+
+    journal.discard(checkpoint.sequence)
+    return done
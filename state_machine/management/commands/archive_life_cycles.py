@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.management.commands.archive_life_cycles
+~~~~~~~~~~~~~~
+
+- Move life cycles of finished tasks from live tables to archive files (see state_machine.archive), meant to run
+  periodically e.g from cron. Run one at a time.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+
+# local
+
+
+# own app
+from state_machine import archive, config
+
+
+class Command(BaseCommand):
+    help = 'Archive life cycles of tasks in a terminal state which were not modified for a number of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=config.ARCHIVE['AFTER_DAYS'],
+                            help='archive tasks not modified for this many days.')
+        parser.add_argument('--batch-size', type=int, default=config.ARCHIVE['BATCH_SIZE'],
+                            help='tasks archived per transaction.')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='max number of tasks to archive in this run.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='only count tasks which are due.')
+
+    def handle(self, *args, **options):
+        if not archive.is_configured():
+            raise CommandError('STATE_MACHINE_ARCHIVE["LOCATION"] is not set.')
+
+        done = archive.run(after_days=options['days'], batch_size=options['batch_size'], limit=options['limit'],
+                           dry_run=options['dry_run'])
+        self.stdout.write('{0} tasks {1}.'.format(done, 'are due' if options['dry_run'] else 'archived'))
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.management.commands.flush_life_cycle_journal
+~~~~~~~~~~~~~~
+
+- Background flusher of write-behind life cycle journal, run one per host next to app servers (see
+  state_machine.journal). On start it recovers from an earlier crash before flushing anything.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import time
+
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+# local
+
+
+# own app
+from state_machine import config, journal
+
+
+class Command(BaseCommand):
+    help = 'Flush write-behind life cycle journal to database in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=config.LIFE_CYCLE_JOURNAL['BATCH_SIZE'],
+                            help='max entries flushed per database transaction.')
+        parser.add_argument('--interval', type=float, default=config.LIFE_CYCLE_JOURNAL['FLUSH_INTERVAL'],
+                            help='seconds to sleep when journal is drained.')
+        parser.add_argument('--once', action='store_true',
+                            help='drain journal once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = journal.flush(options['batch_size'])
+            if options['verbosity'] > 1 and flushed:
+                self.stdout.write('flushed {0} entries'.format(flushed))
+
+            # a full batch means journal is most probably not drained yet
+            if flushed == options['batch_size']:
+                continue
+            if options['once']:
+                break
+
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.management.commands.manage_partitions
+~~~~~~~~~~~~~~
+
+- Creates future `created_at` partitions & applies retention policy to old ones, meant to run daily (cron).
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+
+# local
+
+
+# own app
+from state_machine import config, partitions
+
+
+class Command(BaseCommand):
+    help = 'Create future partitions of life cycle & service tables and drop (or archive) expired ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=partitions.INTERVALS, default=config.PARTITIONS['INTERVAL'],
+                            help='size of a partition.')
+        parser.add_argument('--ahead', type=int, default=config.PARTITIONS['AHEAD'],
+                            help='number of future intervals to create partitions for.')
+        parser.add_argument('--retention', type=int, default=config.PARTITIONS['RETENTION'],
+                            help='number of past intervals to keep, older partitions are dropped.')
+        parser.add_argument('--archive-dir', default=config.PARTITIONS['ARCHIVE_DIR'],
+                            help='archive expired partitions as gzipped CSV into this directory before drop.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only list expired partitions, do not create or drop anything.')
+
+    def handle(self, *args, **options):
+        if options['retention'] is not None and options['retention'] < 1:
+            raise CommandError('--retention must be at least 1.')
+
+        for model in partitions.PARTITIONED_MODELS:
+            table = model._meta.db_table
+
+            if not options['dry_run']:
+                for name in partitions.create_partitions(table, options['ahead'], options['interval']):
+                    self.stdout.write('created {0}'.format(name))
+
+            if options['retention'] is None:
+                continue
+
+            for partition in partitions.expired_partitions(table, options['retention'], options['interval']):
+                if options['dry_run']:
+                    self.stdout.write('expired {0}'.format(partition.name))
+                    continue
+                path = partitions.drop_partition(table, partition.name, options['archive_dir'])
+                self.stdout.write('dropped {0}{1}'.format(partition.name,
+                                                          ' (archived to {0})'.format(path) if path else ''))
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.management.commands.profile_samples
+~~~~~~~~~~~~~~
+
+- Report of hottest tasks & slowest queries, merged from samples flushed by every worker process (see
+  state_machine.sampler).
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.core.management.base import BaseCommand
+
+
+# local
+
+
+# own app
+from state_machine import config, sampler
+
+
+class Command(BaseCommand):
+    help = 'Show hottest task identifiers and slowest queries sampled by worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=('task', 'query'), action='append',
+                            help='report only this kind of samples, repeatable.')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='number of entries per report.')
+        parser.add_argument('--max-age', type=int, default=config.SAMPLER['STALE_AFTER'],
+                            help='seconds, ignore samples of processes which did not flush since.')
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or ['task', 'query']
+
+        if 'task' in kinds:
+            self.stdout.write('hot tasks (estimated transitions, max over-estimation):')
+            for task_identifier, count, error in sampler.top_tasks(options['limit'], options['max_age']):
+                self.stdout.write('{0:>12} {1:>10}  {2}'.format(count, '+{0}'.format(error), task_identifier))
+
+        if 'query' in kinds:
+            self.stdout.write('slow queries (max & total seconds, executions):')
+            for sql, count, total, slowest in sampler.slow_queries(options['limit'], options['max_age']):
+                self.stdout.write('{0:>10.3f} {1:>10.3f} {2:>8}  {3}'.format(slowest, total, count, sql))
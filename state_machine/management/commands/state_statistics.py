@@ -0,0 +1,46 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.management.commands.state_statistics
+~~~~~~~~~~~~~~
+
+- Maintenance of state statistics counters (see state_machine.statistics), `--prune` is meant to run from cron.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+
+# local
+
+
+# own app
+from state_machine import config, statistics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild task state counters and prune old transition rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='recompute task state counters from tasks.')
+        parser.add_argument('--prune', action='store_true',
+                            help='delete transition rollups older than retention.')
+        parser.add_argument('--retention', type=int, default=config.STATISTICS['ROLLUP_RETENTION'],
+                            help='days of transition rollups to keep.')
+
+    def handle(self, *args, **options):
+        if not (options['rebuild'] or options['prune']):
+            raise CommandError('nothing to do, pass --rebuild and/or --prune.')
+
+        if options['rebuild']:
+            self.stdout.write('counted {0} tasks'.format(statistics.rebuild_counts()))
+        if options['prune']:
+            self.stdout.write('deleted {0} rollups'.format(statistics.prune_rollups(options['retention'])))
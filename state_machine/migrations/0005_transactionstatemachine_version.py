@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0004_auto_20170316_1133'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionstatemachine',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every state change, used for optimistic concurrency.', verbose_name='version of task state'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 10:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0005_transactionstatemachine_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionstatemachine',
+            name='retries',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every restart, capped by transition graph of task name.', verbose_name='number of restarts of task'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 13:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Converts append only tables into tables range partitioned by `created_at` (PostgreSQL 11+).
+#
+#   - existing table is kept as is and attached as first partition (MINVALUE -> start of next month), so no row
+#     is copied, attaching only scans it once to validate the range.
+#   - partitions of next months are created here, later ones by `manage_partitions` management command,
+#     a DEFAULT partition catches rows no partition was created for yet.
+#   - primary key becomes (id, created_at) as a partition key must be part of it, `id` still comes from
+#     the same sequence, which now belongs to the partitioned table so dropping old partitions never drops it.
+#   - reverse copies all rows of all partitions back into a plain table with primary key (id), it rewrites whole
+#     tables & blocks writes meanwhile. Its indexes & FK constraints get `_plain` names, different from those Django
+#     created first, later migrations (0010) look them up by column, not by name.
+
+PARTITIONED_TABLES = (
+    (
+        'state_machine_httpservice',
+        ('created_at', ),
+        (),
+    ),
+    (
+        'state_machine_transactionlifecycle',
+        ('created_at', 'content_type_id', 'object_id', 'task_id'),
+        (
+            ('task_id', 'state_machine_transactionstatemachine'),
+            ('content_type_id', 'django_content_type'),
+        ),
+    ),
+)
+
+MONTHS_AHEAD = 3
+
+
+def _partition_sql(table, indexes, foreign_keys):
+    """
+    :param table: table name
+    :param indexes: columns to index
+    :param foreign_keys: (column, referenced table) tuples
+    :return: SQL statements partitioning table
+    """
+    statements = [
+        'ALTER TABLE {t} RENAME TO {t}_legacy',
+        'ALTER TABLE {t}_legacy DROP CONSTRAINT {t}_pkey',
+        'CREATE TABLE {t} (LIKE {t}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)',
+        'ALTER SEQUENCE {t}_id_seq OWNED BY {t}.id',
+        'ALTER TABLE {t} ADD CONSTRAINT {t}_pkey PRIMARY KEY (id, created_at)',
+    ]
+    statements.extend('CREATE INDEX {{t}}_{0}_idx ON {{t}} ({0})'.format(column) for column in indexes)
+    statements.extend(
+        'ALTER TABLE {{t}} ADD CONSTRAINT {{t}}_{0}_fk FOREIGN KEY ({0}) REFERENCES {1} (id) '
+        'DEFERRABLE INITIALLY DEFERRED'.format(column, referenced) for column, referenced in foreign_keys
+    )
+    statements.append('''
+        DO $$
+        DECLARE
+            boundary timestamptz := date_trunc('month', now()) + interval '1 month';
+        BEGIN
+            EXECUTE format('ALTER TABLE {t} ATTACH PARTITION {t}_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                           boundary);
+            FOR month IN 1..{months} LOOP
+                EXECUTE format('CREATE TABLE {t}_p%s PARTITION OF {t} FOR VALUES FROM (%L) TO (%L)',
+                               to_char(boundary, 'YYYYMMDD'), boundary, boundary + interval '1 month');
+                boundary := boundary + interval '1 month';
+            END LOOP;
+        END
+        $$
+    ''')
+    statements.append('CREATE TABLE {t}_default PARTITION OF {t} DEFAULT')
+    return [statement.format(t=table, months=MONTHS_AHEAD) for statement in statements]
+
+
+def partition_tables(apps, schema_editor):
+    for table, indexes, foreign_keys in PARTITIONED_TABLES:
+        for statement in _partition_sql(table, indexes, foreign_keys):
+            # no params, statements contain `%` of format()
+            schema_editor.execute(statement, params=None)
+
+
+def _unpartition_sql(table, indexes, foreign_keys):
+    """
+    :param table: table name
+    :param indexes: columns to index
+    :param foreign_keys: (column, referenced table) tuples
+    :return: SQL statements turning partitioned table back into a plain table
+    """
+    statements = [
+        'ALTER TABLE {t} RENAME TO {t}_partitioned',
+        'ALTER TABLE {t}_partitioned RENAME CONSTRAINT {t}_pkey TO {t}_partitioned_pkey',
+        'CREATE TABLE {t} (LIKE {t}_partitioned INCLUDING DEFAULTS)',
+        'INSERT INTO {t} SELECT * FROM {t}_partitioned',
+        # sequence must not be dropped with partitioned table
+        'ALTER SEQUENCE {t}_id_seq OWNED BY {t}.id',
+        'DROP TABLE {t}_partitioned',
+        'ALTER TABLE {t} ADD CONSTRAINT {t}_pkey PRIMARY KEY (id)',
+    ]
+    # partitioning again keeps these on the partition it attaches, so names must not clash with partitioned ones
+    statements.extend('CREATE INDEX {{t}}_{0}_plain_idx ON {{t}} ({0})'.format(column) for column in indexes)
+    statements.extend(
+        'ALTER TABLE {{t}} ADD CONSTRAINT {{t}}_{0}_plain_fk FOREIGN KEY ({0}) REFERENCES {1} (id) '
+        'DEFERRABLE INITIALLY DEFERRED'.format(column, referenced) for column, referenced in foreign_keys
+    )
+    return [statement.format(t=table) for statement in statements]
+
+
+def unpartition_tables(apps, schema_editor):
+    for table, indexes, foreign_keys in PARTITIONED_TABLES:
+        for statement in _unpartition_sql(table, indexes, foreign_keys):
+            schema_editor.execute(statement, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('state_machine', '0006_transactionstatemachine_retries'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
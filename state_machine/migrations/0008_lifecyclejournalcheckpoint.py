@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 15:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0007_partition_by_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LifeCycleJournalCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.CharField(help_text='Required. 200 characters or fewer.', max_length=200, unique=True, verbose_name='name of local journal')),
+                ('sequence', models.BigIntegerField(default=0, verbose_name='sequence of last flushed entry')),
+                ('modified_at', models.DateTimeField(auto_now=True, verbose_name='last flush time.')),
+            ],
+            options={
+                'verbose_name': 'Life Cycle Journal Checkpoint',
+                'verbose_name_plural': 'Life Cycle Journal Checkpoints',
+            },
+        ),
+    ]
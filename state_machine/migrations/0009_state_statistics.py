@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 15:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_state_counts(apps, schema_editor):
+    """Counters start from current tasks, transitions keep them up to date from here on.
+
+    """
+    TransactionStateMachine = apps.get_model('state_machine', 'TransactionStateMachine')
+    TaskStateCount = apps.get_model('state_machine', 'TaskStateCount')
+    alias = schema_editor.connection.alias
+
+    rows = TransactionStateMachine.objects.using(alias).values('task_name', 'state').annotate(
+        total=Count('id')).order_by()
+    TaskStateCount.objects.using(alias).bulk_create([
+        TaskStateCount(task_name=row['task_name'], state=row['state'], shard=0, count=row['total']) for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0008_lifecyclejournalcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStateCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=30, verbose_name='task name')),
+                ('state', models.CharField(choices=[('init', 'Initialize'), ('processing', 'processing'), ('complete', 'complete'), ('fail', 'fail'), ('resume', 'resume'), ('restart', 'restart')], max_length=20, verbose_name='state of tasks')),
+                ('shard', models.PositiveSmallIntegerField(default=0, verbose_name='counter shard')),
+                ('count', models.IntegerField(default=0, verbose_name='number of tasks')),
+            ],
+            options={
+                'verbose_name': 'Task State Count',
+                'verbose_name_plural': 'Task State Counts',
+            },
+        ),
+        migrations.CreateModel(
+            name='TransitionRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='start of minute')),
+                ('task_name', models.CharField(max_length=30, verbose_name='task name')),
+                ('state', models.CharField(choices=[('init', 'Initialize'), ('processing', 'processing'), ('complete', 'complete'), ('fail', 'fail'), ('resume', 'resume'), ('restart', 'restart')], max_length=20, verbose_name='new state of tasks')),
+                ('shard', models.PositiveSmallIntegerField(default=0, verbose_name='counter shard')),
+                ('count', models.IntegerField(default=0, verbose_name='number of transitions')),
+            ],
+            options={
+                'verbose_name': 'Transition Rollup',
+                'verbose_name_plural': 'Transition Rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='transitionrollup',
+            unique_together=set([('bucket', 'task_name', 'state', 'shard')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskstatecount',
+            unique_together=set([('task_name', 'state', 'shard')]),
+        ),
+        migrations.RunPython(seed_state_counts, migrations.RunPython.noop),
+    ]
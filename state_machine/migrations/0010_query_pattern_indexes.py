@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 15:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Indexes follow access paths of endpoints instead of single columns (see state_machine.tests.test_query_plans).
+#
+#   - tasks: (task_name, state) for counts & filters per task name, partial (state, id) of tasks which are not in
+#     a terminal state, for listing in-flight tasks newest first. `created_at` & `modified_at` are never filtered
+#     on, their indexes were only rewritten on every transition.
+#   - predicate of partial index is fixed here, it excludes `complete`, terminal state of `DEFAULT_TRANSITIONS`, as
+#     the state a task ends in. Changing `STATE_MACHINE_TRANSITIONS` later does not change it: results stay
+#     correct, an extra terminal state only means its finished tasks are kept in index, a query for `complete`
+#     tasks can not use it. Such a graph needs a migration replacing this index.
+#   - life cycles: (task_id, id) for life cycle of a task newest first, (content_type_id, object_id) for generic
+#     lookups, they replace single column indexes of these columns, FK constraints are kept. `created_at` is
+#     partition key only (see migration 0007), its index is dropped.
+#   - services: `created_at` is partition key, it is set once (`auto_now_add`) and its index is dropped.
+#
+# Indexes are changed with SQL, altering FK fields through schema editor would drop & re-validate FK constraints.
+# Old single column indexes are looked up by column, names differ between tables created by Django & migration 0007,
+# dropping an index of a partitioned table drops indexes of its partitions too.
+#
+# Migration is not atomic so indexes of tasks table are built CONCURRENTLY, without blocking writes. PostgreSQL can
+# not build an index of a partitioned table (life cycles) concurrently, those are built as usual. A concurrent build
+# which fails leaves an INVALID index behind, drop it before running migration again.
+
+DROP_COLUMN_INDEXES = """
+    DO $$
+    DECLARE
+        index_name text;
+    BEGIN
+        FOR index_name IN
+            SELECT i.indexrelid::regclass::text FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = '{table}'::regclass AND i.indnatts = 1 AND NOT i.indisunique AND NOT i.indisprimary
+                  AND a.attname = '{column}'
+        LOOP
+            EXECUTE 'DROP INDEX ' || index_name;
+        END LOOP;
+    END
+    $$
+"""
+
+SINGLE_COLUMN_INDEXES = (
+    ('state_machine_transactionstatemachine', 'created_at'),
+    ('state_machine_transactionstatemachine', 'modified_at'),
+    ('state_machine_transactionlifecycle', 'task_id'),
+    ('state_machine_transactionlifecycle', 'content_type_id'),
+    ('state_machine_transactionlifecycle', 'object_id'),
+    ('state_machine_transactionlifecycle', 'created_at'),
+    ('state_machine_httpservice', 'created_at'),
+)
+
+TERMINAL_STATE = 'complete'
+
+# (name, definition, whether table allows a concurrent build)
+COMPOSITE_INDEXES = (
+    ('state_machine_transactionstatemachine_task_name_state_idx',
+     'state_machine_transactionstatemachine (task_name, state)', True),
+    ('state_machine_transactionstatemachine_in_flight_idx',
+     "state_machine_transactionstatemachine (state, id) WHERE state <> '{0}'".format(TERMINAL_STATE), True),
+    ('state_machine_transactionlifecycle_task_id_id_idx',
+     'state_machine_transactionlifecycle (task_id, id)', False),
+    ('state_machine_transactionlifecycle_entity_idx',
+     'state_machine_transactionlifecycle (content_type_id, object_id)', False),
+)
+
+FORWARD_SQL = (
+    ['CREATE INDEX {0}{1} ON {2}'.format('CONCURRENTLY ' if concurrently else '', name, definition)
+     for name, definition, concurrently in COMPOSITE_INDEXES] +
+    [DROP_COLUMN_INDEXES.format(table=table, column=column) for table, column in SINGLE_COLUMN_INDEXES]
+)
+
+REVERSE_SQL = (
+    ['CREATE INDEX {0}_{1}_idx ON {0} ({1})'.format(table, column) for table, column in SINGLE_COLUMN_INDEXES] +
+    ['DROP INDEX {0}'.format(name) for name, _, _ in COMPOSITE_INDEXES]
+)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('state_machine', '0009_state_statistics'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='httpservice',
+                    name='created_at',
+                    field=models.DateTimeField(auto_now_add=True, verbose_name='service request time.'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlifecycle',
+                    name='content_type',
+                    field=models.ForeignKey(blank=True, db_index=False, help_text='Content Type of Object you want tyo map.', null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlifecycle',
+                    name='created_at',
+                    field=models.DateTimeField(auto_now_add=True, verbose_name='Task state activity create time.'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlifecycle',
+                    name='object_id',
+                    field=models.PositiveIntegerField(blank=True, null=True, verbose_name='id of object you want to map'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionlifecycle',
+                    name='task',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='state_machine.TransactionStateMachine', verbose_name='transaction state machine'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionstatemachine',
+                    name='created_at',
+                    field=models.DateTimeField(verbose_name='Task state activity create time.'),
+                ),
+                migrations.AlterField(
+                    model_name='transactionstatemachine',
+                    name='modified_at',
+                    field=models.DateTimeField(verbose_name='Task state activity modify time.'),
+                ),
+                migrations.AlterIndexTogether(
+                    name='transactionlifecycle',
+                    index_together=set([('task', 'id'), ('content_type', 'object_id')]),
+                ),
+                migrations.AlterIndexTogether(
+                    name='transactionstatemachine',
+                    index_together=set([('task_name', 'state')]),
+                ),
+            ],
+        ),
+    ]
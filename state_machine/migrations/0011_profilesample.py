@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 15:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0010_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileSample',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=100, verbose_name='host:pid of worker process')),
+                ('kind', models.CharField(choices=[('task', 'hot task'), ('query', 'slow query')], max_length=10, verbose_name='kind of sample')),
+                ('key', models.TextField(verbose_name='task identifier or SQL')),
+                ('count', models.BigIntegerField(default=0, verbose_name='number of occurrences')),
+                ('error', models.BigIntegerField(default=0, verbose_name='max over-estimation of count')),
+                ('total_time', models.FloatField(default=0, verbose_name='total seconds')),
+                ('max_time', models.FloatField(default=0, verbose_name='max seconds')),
+                ('modified_at', models.DateTimeField(verbose_name='last flush time.')),
+            ],
+            options={
+                'verbose_name': 'Profile Sample',
+                'verbose_name_plural': 'Profile Samples',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='profilesample',
+            index_together=set([('process', 'kind')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 15:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0011_profilesample'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionstatemachine',
+            name='archive',
+            field=models.CharField(blank=True, help_text='Set once life cycle & services of a finished task are moved to archive, see state_machine.archive.', max_length=255, null=True, verbose_name='archive location of life cycle'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Id of the (top level) transaction which inserted a life cycle row, change feed orders by it (see state_machine.feed).
+#
+#   - column is filled by its default `txid_current()` and is not a model field, so no insert path (ORM, bulk,
+#     journal flush, ASGI) sends it & rows flushed from journal get id of flushing transaction, the one which commits
+#     them. Existing rows get 0, added with a constant default first so table is not rewritten.
+#   - (txid, id) index makes "events after a cursor" a range scan, it is created on partitioned table so every
+#     partition gets one.
+
+FORWARD_SQL = (
+    'ALTER TABLE state_machine_transactionlifecycle ADD COLUMN txid bigint NOT NULL DEFAULT 0',
+    'ALTER TABLE state_machine_transactionlifecycle ALTER COLUMN txid SET DEFAULT txid_current()',
+    'CREATE INDEX state_machine_transactionlifecycle_txid_id_idx ON state_machine_transactionlifecycle (txid, id)',
+)
+
+REVERSE_SQL = (
+    'ALTER TABLE state_machine_transactionlifecycle DROP COLUMN txid',
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('state_machine', '0012_transactionstatemachine_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -4,3 +4,6 @@
 
 from state_machine.models.states import *
 from state_machine.models.services import *
+from state_machine.models.journal import *
+from state_machine.models.statistics import *
+from state_machine.models.sampler import *
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.models.journal
+~~~~~~~~~~~~~~
+
+- This file contains bookkeeping models of write-behind life cycle journal (see state_machine.journal)
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+# Django
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+# local
+
+# own app
+
+
+class LifeCycleJournalCheckpoint(models.Model):
+    """Last journal entry of a local journal which is flushed to database.
+
+        - It is updated in same transaction as flushed rows, so a flusher which crashes between commit and local
+          discard never flushes same entries twice.
+    """
+    journal = models.CharField(
+        _('name of local journal'),
+        max_length=200,
+        unique=True,
+        help_text=_('Required. 200 characters or fewer.'),
+    )
+    sequence = models.BigIntegerField(
+        _('sequence of last flushed entry'),
+        default=0,
+    )
+    modified_at = models.DateTimeField(
+        _('last flush time.'),
+        auto_now=True,
+    )
+
+    # Meta
+    class Meta:
+        verbose_name = _("Life Cycle Journal Checkpoint")
+        verbose_name_plural = _("Life Cycle Journal Checkpoints")
+
+    # Functions
+    def __str__(self):
+        return "{journal}:{sequence}".format(
+            journal=self.journal,
+            sequence=self.sequence,
+        )
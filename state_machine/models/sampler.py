@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.models.sampler
+~~~~~~~~~~~~~~
+
+- This file contains samples of hot tasks & slow queries flushed by worker processes (see state_machine.sampler)
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+# Django
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+# local
+
+# own app
+
+TASK = 'task'
+QUERY = 'query'
+
+KINDS = (
+    (TASK, 'hot task'),
+    (QUERY, 'slow query'),
+)
+
+
+class ProfileSample(models.Model):
+    """One entry of top-K of a worker process.
+
+        - `task`: `key` is a task identifier, `count` its (estimated) number of transitions, over-estimated by at
+          most `error`.
+        - `query`: `key` is SQL of a query, `count` number of its executions slower than threshold, with their
+          total & max time.
+    """
+    process = models.CharField(
+        _('host:pid of worker process'),
+        max_length=100,
+    )
+    kind = models.CharField(
+        _('kind of sample'),
+        max_length=10,
+        choices=KINDS,
+    )
+    key = models.TextField(
+        _('task identifier or SQL'),
+    )
+    count = models.BigIntegerField(
+        _('number of occurrences'),
+        default=0,
+    )
+    error = models.BigIntegerField(
+        _('max over-estimation of count'),
+        default=0,
+    )
+    total_time = models.FloatField(
+        _('total seconds'),
+        default=0,
+    )
+    max_time = models.FloatField(
+        _('max seconds'),
+        default=0,
+    )
+    modified_at = models.DateTimeField(
+        _('last flush time.'),
+    )
+
+    # Meta
+    class Meta:
+        verbose_name = _("Profile Sample")
+        verbose_name_plural = _("Profile Samples")
+        index_together = (('process', 'kind'), )
+
+    # Functions
+    def __str__(self):
+        return "{kind}:{key}:{count}".format(
+            kind=self.kind,
+            key=self.key[:50],
+            count=self.count,
+        )
@@ -62,8 +62,7 @@ class HttpService(models.Model):
     )
     created_at = models.DateTimeField(
         _('service request time.'),
-        auto_now=True,
-        db_index=True,
+        auto_now_add=True,
     )
 
     # Meta
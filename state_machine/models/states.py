@@ -12,10 +12,11 @@
 from __future__ import unicode_literals
 
 # 3rd party
+from collections import namedtuple
 from datetime import datetime
 
 # Django
-from django.db import models
+from django.db import connections, models
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -23,10 +24,76 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 # local
 
 # own app
-from state_machine import config
+from state_machine import config, transitions
 from state_machine.models.services import HttpService
 
 
+# outcome of a conditional transition, `previous_state` is state of task right before transition
+TransitionResult = namedtuple('TransitionResult', ('id', 'task_name', 'previous_state', 'version'))
+
+
+def transition_sql(table, new_state, modified_at, task_identifier, expected_state=None, expected_version=None):
+    """
+    :param table: quoted table name of TransactionStateMachine
+    :param new_state: new state of task
+    :param modified_at: modification time
+    :param task_identifier: task unique identifier
+    :param expected_state: state task must currently be in, None to skip the check
+    :param expected_version: version task must currently be at, None to skip the check
+    :return: conditional `UPDATE ... RETURNING id, task_name, previous state, version` statement & its `%s` params
+    """
+    predicate, predicate_params = transitions.SQL_PREDICATES[new_state]
+    retries = 't.retries + 1' if new_state == config.RESTART else 't.retries'
+    conditions, params = ['AND ' + predicate], [new_state, modified_at, task_identifier] + predicate_params
+
+    if expected_state is not None:
+        conditions.append('AND previous.state = %s')
+        params.append(expected_state)
+    if expected_version is not None:
+        conditions.append('AND previous.version = %s')
+        params.append(expected_version)
+
+    sql = ('UPDATE {table} AS t SET state = %s, modified_at = %s, version = t.version + 1, retries = {retries} '
+           'FROM (SELECT id, task_name, state, version, retries FROM {table} '
+           'WHERE task_identifier = %s FOR UPDATE) AS previous '
+           'WHERE t.id = previous.id {conditions} '
+           'RETURNING t.id, t.task_name, previous.state, t.version').format(table=table, retries=retries,
+                                                                           conditions=' '.join(conditions))
+    return sql, params
+
+
+class TransactionStateMachineQuerySet(models.QuerySet):
+    """
+
+    """
+
+    def transition(self, task_identifier, new_state, expected_state=None, expected_version=None):
+        """Change state of a task with a single `UPDATE ... RETURNING` statement.
+
+            - Transition is applied only if task is currently in `expected_state` and/or at `expected_version`
+              (when given), every applied transition increments `version`.
+            - Previous state is read in the same statement, its row is locked by the UPDATE anyway, so concurrent
+              transitions of a task are serialized and each one sees state left by the previous one.
+            - Transition must be allowed by transition graph of task name, checked by a precompiled predicate,
+              see `state_machine.transitions`. Every `restart` increments `retries`.
+
+        :param task_identifier: task unique identifier
+        :param new_state: new state of task
+        :param expected_state: state task must currently be in, None to skip the check
+        :param expected_version: version task must currently be at, None to skip the check
+        :return: TransitionResult, None if task does not exist or does not meet expectations
+        """
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        sql, params = transition_sql(table, new_state, datetime.now(), task_identifier,
+                                     expected_state=expected_state, expected_version=expected_version)
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        return TransitionResult(*row) if row else None
+
+
 class TransactionStateMachine(models.Model):
     """Manage Current State of any Task.
 
@@ -52,16 +119,34 @@ class TransactionStateMachine(models.Model):
         choices=config.STATES,
         help_text=_('Task state at any given time.'),
     )
+    retries = models.PositiveIntegerField(
+        _('number of restarts of task'),
+        default=0,
+        help_text=_('Incremented on every restart, capped by transition graph of task name.'),
+    )
+    version = models.PositiveIntegerField(
+        _('version of task state'),
+        default=0,
+        help_text=_('Incremented on every state change, used for optimistic concurrency.'),
+    )
     created_at = models.DateTimeField(
         _('Task state activity create time.'),
         auto_now=False,
-        db_index=True,
     )
     modified_at = models.DateTimeField(
         _('Task state activity modify time.'),
         auto_now=False,
-        db_index=True,
     )
+    archive = models.CharField(
+        _('archive location of life cycle'),
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text=_('Set once life cycle & services of a finished task are moved to archive, see '
+                    'state_machine.archive.'),
+    )
+
+    objects = TransactionStateMachineQuerySet.as_manager()
 
     # Meta
     class Meta:
@@ -69,6 +154,8 @@ class TransactionStateMachine(models.Model):
         verbose_name_plural = _("Transaction State Machine")
         ordering = ["-id"]
         get_latest_by = "id"
+        # a partial index on (state, id) of tasks which are not `complete` is created by migration 0010, see there
+        index_together = (('task_name', 'state'), )
 
     # Functions
     def __str__(self):
@@ -86,13 +173,43 @@ class TransactionStateMachine(models.Model):
         """
         return self.state
 
+    @property
+    def transition_graph(self):
+        """
+
+        :return: transition graph of task
+        """
+        return transitions.graph_for(self.task_name)
+
     @property
     def fetch_complete_life_cycle(self):
         """
 
         :return: fetch complete life cycle of any Transaction.
+
+            - `task` of every row is already known to the related manager (no extra query per row) and
+              services behind the Generic FK are prefetched with one query per service type.
+        """
+        return self.transactionlifecycle_set.prefetch_related('entity')
+
+    def iter_life_cycle(self, chunk_size):
+        """
+
+        :param chunk_size: max number of life cycle rows fetched per query
+        :return: generator of life cycle chunks, newest entry first
+
+            - Chunks are fetched by keyset (`id < last seen id`), so memory stays bounded by `chunk_size`
+              however long the history is.
         """
-        return self.transactionlifecycle_set.all()
+        life_cycle = self.fetch_complete_life_cycle.order_by('-id')
+        last_id = None
+        while True:
+            chunk = life_cycle if last_id is None else life_cycle.filter(id__lt=last_id)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
 
     def change_state(self, new_state):
         """
@@ -103,7 +220,10 @@ class TransactionStateMachine(models.Model):
         """
         self.state = new_state
         self.modified_at = datetime.now()
-        return self.save()
+        self.version = models.F('version') + 1
+        self.save(update_fields=['state', 'modified_at', 'version'])
+        self.refresh_from_db(fields=['version'])
+        return self
 
 
 class TransactionLifeCycle(models.Model):
@@ -116,16 +236,16 @@ class TransactionLifeCycle(models.Model):
     """
     task = models.ForeignKey(TransactionStateMachine,
                              verbose_name=_('transaction state machine'),
+                             db_index=False,
     )
     content_type = models.ForeignKey(ContentType,
-                                     db_index=True,
+                                     db_index=False,
                                      blank=True,
                                      null=True,
                                      help_text=_('Content Type of Object you want tyo map.'),
     )
     object_id = models.PositiveIntegerField(
         _('id of object you want to map'),
-        db_index=True,
         blank=True,
         null=True,
     )
@@ -139,8 +259,7 @@ class TransactionLifeCycle(models.Model):
     )
     created_at = models.DateTimeField(
         _('Task state activity create time.'),
-        auto_now=True,
-        db_index=True,
+        auto_now_add=True,
     )
 
     # Meta
@@ -149,6 +268,7 @@ class TransactionLifeCycle(models.Model):
         verbose_name_plural = _("Transaction Life Cycle")
         ordering = ["-id"]
         get_latest_by = "id"
+        index_together = (('task', 'id'), ('content_type', 'object_id'))
 
     # Functions
     def __str__(self):
@@ -163,5 +283,6 @@ class TransactionLifeCycle(models.Model):
 
         :return: related HTTP service object
         """
-        if self.content_type == ContentType.objects.get_for_model(HttpService):
-            return HttpService.objects.get(pk=self.object_id)
+        # compare ids, so neither ContentType nor HttpService is fetched again when `entity` is prefetched
+        if self.content_type_id == ContentType.objects.get_for_model(HttpService).id:
+            return self.entity
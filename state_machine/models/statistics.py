@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.models.statistics
+~~~~~~~~~~~~~~
+
+- This file contains incrementally maintained counters of task states & transitions (see state_machine.statistics)
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+# Django
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+# local
+
+# own app
+from state_machine import config
+
+
+class TaskStateCount(models.Model):
+    """Number of tasks of a task name currently in a state.
+
+        - Counters are split in shards, concurrent transitions of same task name update different rows instead of
+          queueing on one, a count is the sum over its shards (a single shard may go negative).
+    """
+    task_name = models.CharField(
+        _('task name'),
+        max_length=30,
+    )
+    state = models.CharField(
+        _('state of tasks'),
+        max_length=20,
+        choices=config.STATES,
+    )
+    shard = models.PositiveSmallIntegerField(
+        _('counter shard'),
+        default=0,
+    )
+    count = models.IntegerField(
+        _('number of tasks'),
+        default=0,
+    )
+
+    # Meta
+    class Meta:
+        verbose_name = _("Task State Count")
+        verbose_name_plural = _("Task State Counts")
+        unique_together = (('task_name', 'state', 'shard'), )
+
+    # Functions
+    def __str__(self):
+        return "{task_name}:{state}:{count}".format(
+            task_name=self.task_name,
+            state=self.state,
+            count=self.count,
+        )
+
+
+class TransitionRollup(models.Model):
+    """Number of transitions of a task name into a state within a minute.
+
+    """
+    bucket = models.DateTimeField(
+        _('start of minute'),
+    )
+    task_name = models.CharField(
+        _('task name'),
+        max_length=30,
+    )
+    state = models.CharField(
+        _('new state of tasks'),
+        max_length=20,
+        choices=config.STATES,
+    )
+    shard = models.PositiveSmallIntegerField(
+        _('counter shard'),
+        default=0,
+    )
+    count = models.IntegerField(
+        _('number of transitions'),
+        default=0,
+    )
+
+    # Meta
+    class Meta:
+        verbose_name = _("Transition Rollup")
+        verbose_name_plural = _("Transition Rollups")
+        unique_together = (('bucket', 'task_name', 'state', 'shard'), )
+
+    # Functions
+    def __str__(self):
+        return "{bucket}:{task_name}:{state}:{count}".format(
+            bucket=self.bucket,
+            task_name=self.task_name,
+            state=self.state,
+            count=self.count,
+        )
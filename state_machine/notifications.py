@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.notifications
+~~~~~~~~~~~~~~
+
+- Fan-out of committed state changes to clients waiting for them (see `wait_for_state` endpoint).
+
+    - Every write path sends `state_changed` inside its transaction, its receiver here issues `pg_notify` with
+      identifiers of changed tasks. NOTIFY is transactional, listeners get it only once transaction commits.
+    - One listener thread per process holds one dedicated connection which LISTENs, and wakes every waiter of a
+      notified task in that process, however many there are.
+    - A waiter of the viewset holds its worker thread while it waits. Waiters of the ASGI application
+      (state_machine.asgi) wait on its event loop, listener thread wakes them with `call_soon_threadsafe`.
+    - A notification only says "task changed", waiters read state & version themselves, so lost or merged
+      notifications are harmless. When listener loses its connection it wakes every waiter, they re-read too.
+    - On databases without LISTEN/NOTIFY changes are fanned out in-process only, after commit.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import asyncio
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+
+# Django
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+# NOTIFY payloads must stay below 8000 bytes
+MAX_PAYLOAD_SIZE = 7900
+
+# waiters subscribed to it are woken by a change of any task
+ALL = '*'
+
+
+def _payloads(task_identifiers):
+    """
+    :param task_identifiers: identifiers of changed tasks
+    :return: newline separated identifiers, split in payloads which fit a NOTIFY
+    """
+    payloads, current, size = [], [], 0
+    for identifier in sorted(task_identifiers):
+        length = len(identifier.encode('utf-8')) + 1
+        if current and size + length > MAX_PAYLOAD_SIZE:
+            payloads.append('\n'.join(current))
+            current, size = [], 0
+        current.append(identifier)
+        size += length
+    if current:
+        payloads.append('\n'.join(current))
+    return payloads
+
+
+class Waiter(object):
+    """Waiting client of a task
+
+    """
+    __slots__ = ('task_identifier', '_event')
+
+    def __init__(self, task_identifier):
+        """
+        :param task_identifier: task unique identifier
+        """
+        self.task_identifier = task_identifier
+        self._event = threading.Event()
+
+    def wait(self, timeout):
+        """
+        :param timeout: max seconds to wait
+        :return: whether task (may have) changed, waiter is re-armed for next change
+        """
+        notified = self._event.wait(timeout)
+        self._event.clear()
+        return notified
+
+    def notify(self):
+        self._event.set()
+
+
+class AsyncWaiter(object):
+    """Waiting coroutine of a task
+
+    """
+    __slots__ = ('task_identifier', '_event', '_loop')
+
+    def __init__(self, task_identifier, loop):
+        """
+        :param task_identifier: task unique identifier
+        :param loop: event loop waiter waits on
+        """
+        self.task_identifier = task_identifier
+        # created on loop, by a coroutine running there
+        self._event = asyncio.Event()
+        self._loop = loop
+
+    async def wait(self, timeout):
+        """
+        :param timeout: max seconds to wait
+        :return: whether task (may have) changed, waiter is re-armed for next change
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            notified = True
+        except asyncio.TimeoutError:
+            notified = False
+        self._event.clear()
+        return notified
+
+    def notify(self):
+        # called from listener thread, event belongs to loop
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # loop is closed, nobody waits any more
+            pass
+
+
+class StateListener(object):
+    """Process wide LISTEN connection & fan-out to waiters
+
+    """
+
+    def __init__(self, channel, alias=DEFAULT_DB_ALIAS):
+        """
+        :param channel: NOTIFY channel
+        :param alias: database alias to listen on
+        """
+        self.channel = channel
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._thread = None
+        self._pid = None
+        self._backoff = 1
+
+    def subscribe(self, task_identifier, loop=None):
+        """
+        :param task_identifier: task unique identifier
+        :param loop: event loop of an async waiter, None for a waiter blocking its thread
+        :return: Waiter (AsyncWaiter when loop is given), woken on every committed change of task
+        """
+        waiter = Waiter(task_identifier) if loop is None else AsyncWaiter(task_identifier, loop)
+        with self._lock:
+            self._waiters.setdefault(task_identifier, set()).add(waiter)
+            self._ensure_thread()
+        return waiter
+
+    def unsubscribe(self, waiter):
+        """
+        :param waiter: Waiter or AsyncWaiter returned by `subscribe`
+        """
+        with self._lock:
+            waiters = self._waiters.get(waiter.task_identifier)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[waiter.task_identifier]
+
+    def dispatch(self, task_identifiers):
+        """
+        :param task_identifiers: identifiers of changed tasks
+        """
+        if not task_identifiers:
+            return
+        with self._lock:
+            waiters = [waiter for identifier in task_identifiers for waiter in self._waiters.get(identifier, ())]
+            waiters.extend(self._waiters.get(ALL, ()))
+        for waiter in waiters:
+            waiter.notify()
+
+    def _wake_all(self):
+        with self._lock:
+            waiters = [waiter for waiters in self._waiters.values() for waiter in waiters]
+        for waiter in waiters:
+            waiter.notify()
+
+    def _ensure_thread(self):
+        """Start listener thread, once per process (a forked worker does not inherit thread of its parent).
+
+        """
+        if connections[self.alias].vendor != 'postgresql':
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='state-machine-listener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError):
+                pass
+            # notifications may have been missed meanwhile
+            self._wake_all()
+            time.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, 30)
+
+    def _listen(self):
+        connection = psycopg2.connect(**connections[self.alias].get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute('LISTEN "{0}"'.format(self.channel))
+            # waiters which subscribed before (re)connect may have missed a change
+            self._backoff = 1
+            self._wake_all()
+
+            while True:
+                if select.select([connection], [], [], config.WAIT['HEARTBEAT']) == ([], [], []):
+                    # idle, make sure connection is still alive
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    continue
+                connection.poll()
+                identifiers = set()
+                while connection.notifies:
+                    identifiers.update(connection.notifies.pop().payload.split('\n'))
+                self.dispatch(identifiers)
+        finally:
+            connection.close()
+
+
+listener = StateListener(config.WAIT['CHANNEL'])
+
+
+def notify(task_identifiers):
+    """Notify waiters of tasks once current transaction commits.
+
+    :param task_identifiers: identifiers of changed tasks
+    """
+    if not task_identifiers:
+        return
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        transaction.on_commit(lambda: listener.dispatch(task_identifiers))
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                       [config.WAIT['CHANNEL'], _payloads(task_identifiers)])
+
+
+def on_state_changed(sender, transitions, **kwargs):
+    """`state_changed` receiver
+
+    :param sender: sender of signal
+    :param transitions: list of Transition
+    """
+    notify(set(transition.task_identifier for transition in transitions))
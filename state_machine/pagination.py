@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.pagination
+~~~~~~~~~~~~~~
+
+- Paginators of state_machine micro-service
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from collections import OrderedDict
+
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.response import Response
+
+
+# Django
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+
+class LifeCycleCursorPagination(pagination.CursorPagination):
+    """Keyset pagination of a task life cycle, newest entry first.
+
+        - Pages are fetched with `WHERE id < <cursor> ORDER BY id DESC LIMIT n`, so cost of a page does not
+          grow with its position in history like OFFSET pagination does.
+    """
+    ordering = '-id'
+    page_size = config.LIFE_CYCLE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = config.LIFE_CYCLE_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """
+        :return: fixed keyset ordering, ordering filters of view are not applicable to a cursor
+        """
+        return (self.ordering, )
+
+    def get_page_size(self, request):
+        """
+        :param request: DRF request
+        :return: requested page size, bounded by `max_page_size`
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_list(self, rows, request):
+        """Keyset pagination of a life cycle which is already loaded (e.g archived), cursors are interchangeable with
+        those of `paginate_queryset`, so a client keeps paging when a task is archived meanwhile.
+
+        :param rows: serialized life cycle entries, newest first
+        :param request: DRF request
+        :return: paginated response
+        """
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        start, end = 0, page_size
+        if cursor is not None and cursor.position is not None:
+            try:
+                position = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if cursor.reverse:
+                # previous page, entries right before (newer than) position
+                end = sum(1 for row in rows if row['id'] > position)
+                start = max(end - page_size, 0)
+            else:
+                start = sum(1 for row in rows if row['id'] >= position)
+                end = start + page_size
+
+        page = rows[start:end]
+        next_link = previous_link = None
+        if page and end < len(rows):
+            next_link = self.encode_cursor(Cursor(offset=0, reverse=False, position=str(page[-1]['id'])))
+        if page and start > 0:
+            previous_link = self.encode_cursor(Cursor(offset=0, reverse=True, position=str(page[0]['id'])))
+
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', page),
+        ]))
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.parsers
+~~~~~~~~~~~~~~
+
+- Request parsers of state_machine micro-service
+
+    - `FastJSONParser` parses UTF-8 JSON through `orjson` when it is installed, other charsets & missing `orjson`
+      fall back to DRF `JSONParser`.
+    - `MessagePackParser` parses `application/msgpack` bodies, when `msgpack` is installed.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import codecs
+import json
+
+from rest_framework import exceptions
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:  # optional, JSON is parsed by DRF parser without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for MessagePack format
+    msgpack = None
+
+
+# Django
+from django.conf import settings
+
+
+# local
+
+
+# own app
+
+
+class NDJSONParser(BaseParser):
+    """Newline delimited JSON parser, every non empty line of request body is one JSON document.
+
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        :param stream: request body stream
+        :param media_type: requested media type
+        :param parser_context: parser context
+        :return: list of parsed documents
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = codecs.getreader(encoding)(stream)
+
+        data = []
+        for line_number, line in enumerate(reader, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError as exc:
+                raise exceptions.ParseError('NDJSON parse error at line {0} - {1}'.format(line_number, exc))
+        return data
+
+
+class FastJSONParser(JSONParser):
+    """JSON parser, `orjson` based
+
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        :param stream: request body stream
+        :param media_type: requested media type
+        :param parser_context: parser context
+        :return: parsed document
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super(FastJSONParser, self).parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise exceptions.ParseError('JSON parse error - {0}'.format(exc))
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack parser
+
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        :param stream: request body stream
+        :param media_type: requested media type
+        :param parser_context: parser context
+        :return: parsed document
+        """
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.exceptions.UnpackException) as exc:
+            raise exceptions.ParseError('MessagePack parse error - {0}'.format(str(exc) or exc.__class__.__name__))
+
+
+# parsers of API formats of `TransactionStateViewSet`, MessagePack is accepted only when `msgpack` is installed
+API_PARSERS = (FastJSONParser, ) + ((MessagePackParser, ) if msgpack is not None else ())
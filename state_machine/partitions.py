@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.partitions
+~~~~~~~~~~~~~~
+
+- Maintenance of `created_at` range partitions of append only tables (see migration 0007).
+
+    - Future partitions are created ahead of time so rows never land in DEFAULT partition.
+    - Old partitions are detached & dropped (optionally archived first), which costs the same however many rows
+      they hold, unlike a `DELETE` sweep followed by vacuum.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import calendar
+import gzip
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Django
+from django.db import connection, transaction
+from django.utils import timezone
+
+# local
+
+
+# own app
+from state_machine import models
+
+PARTITIONED_MODELS = (models.TransactionLifeCycle, models.HttpService)
+INTERVALS = ('day', 'week', 'month')
+
+# lower / upper are None for MINVALUE / MAXVALUE bounds, `is_default` partition has no bounds at all
+Partition = namedtuple('Partition', ('name', 'lower', 'upper', 'is_default'))
+
+_BOUND = re.compile(r"FROM \((?P<lower>[^)]+)\) TO \((?P<upper>[^)]+)\)")
+
+
+def _parse_bound(bound):
+    """
+    :param bound: bound of partition as rendered by `pg_get_expr`
+    :return: aware datetime, None for MINVALUE / MAXVALUE
+    """
+    bound = bound.strip("'")
+    if bound in ('MINVALUE', 'MAXVALUE'):
+        return None
+    value = datetime.strptime(bound[:19], '%Y-%m-%d %H:%M:%S')
+    return timezone.make_aware(value, timezone.utc)
+
+
+def list_partitions(table):
+    """
+    :param table: partitioned table name
+    :return: list of Partition, ordered by lower bound
+    """
+    with connection.cursor() as cursor:
+        # bounds are rendered in session time zone, Django sets it to UTC
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [table]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match is None:
+            partitions.append(Partition(name, None, None, True))
+            continue
+        partitions.append(Partition(name, _parse_bound(match.group('lower')), _parse_bound(match.group('upper')),
+                                    False))
+
+    return sorted(partitions, key=lambda p: (p.is_default, p.lower or datetime.min.replace(tzinfo=timezone.utc)))
+
+
+def add_months(value, months):
+    """
+    :param value: a point in time
+    :param months: number of months to add, negative to subtract
+    :return: same point months later, day is clamped to last day of that month (e.g Jan 31 -> Feb 28)
+    """
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def next_bound(bound, interval):
+    """
+    :param bound: lower bound of a partition
+    :param interval: `day`, `week` or `month`
+    :return: upper bound of partition
+    """
+    if interval == 'day':
+        return bound + timedelta(days=1)
+    if interval == 'week':
+        return bound + timedelta(weeks=1)
+    return add_months(bound, 1)
+
+
+def create_partitions(table, ahead, interval, now=None):
+    """Create partitions up to `ahead` intervals after now, starting at upper bound of latest partition.
+
+    :param table: partitioned table name
+    :param ahead: number of intervals to cover after now
+    :param interval: `day`, `week` or `month`
+    :param now: current time
+    :return: names of created partitions
+    """
+    now = now or timezone.now()
+    bounded = [partition for partition in list_partitions(table) if partition.upper is not None]
+    if not bounded:
+        return []
+
+    lower, until = bounded[-1].upper, now
+    for _ in range(ahead):
+        until = next_bound(until, interval)
+
+    created = []
+    quoted_table = connection.ops.quote_name(table)
+    with connection.cursor() as cursor:
+        while lower < until:
+            upper = next_bound(lower, interval)
+            name = '{0}_p{1}'.format(table, lower.strftime('%Y%m%d'))
+            cursor.execute(
+                'CREATE TABLE {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)'.format(
+                    partition=connection.ops.quote_name(name), table=quoted_table),
+                [lower, upper]
+            )
+            created.append(name)
+            lower = upper
+    return created
+
+
+def expired_partitions(table, retention, interval, now=None):
+    """
+    :param table: partitioned table name
+    :param retention: number of intervals to keep
+    :param interval: `day`, `week` or `month`
+    :param now: current time
+    :return: partitions whose rows are all older than retention
+    """
+    now = now or timezone.now()
+    cutoff = now
+    for _ in range(retention):
+        cutoff = _previous_bound(cutoff, interval)
+    return [partition for partition in list_partitions(table)
+            if partition.upper is not None and partition.upper <= cutoff]
+
+
+def _previous_bound(bound, interval):
+    """
+    :param bound: a point in time
+    :param interval: `day`, `week` or `month`
+    :return: same point one interval earlier
+    """
+    if interval == 'day':
+        return bound - timedelta(days=1)
+    if interval == 'week':
+        return bound - timedelta(weeks=1)
+    return add_months(bound, -1)
+
+
+def archive_partition(partition, archive_dir):
+    """
+    :param partition: partition name
+    :param archive_dir: directory archive is written to
+    :return: path of gzipped CSV archive of partition
+    """
+    if not os.path.isdir(archive_dir):
+        os.makedirs(archive_dir)
+    path = os.path.join(archive_dir, '{0}.csv.gz'.format(partition))
+
+    with gzip.open(path, 'wb') as archive, connection.cursor() as cursor:
+        cursor.copy_expert('COPY {0} TO STDOUT WITH (FORMAT csv, HEADER)'.format(
+            connection.ops.quote_name(partition)), archive)
+    return path
+
+
+def drop_partition(table, partition, archive_dir=None):
+    """Detach a partition, archive it when asked to, and drop it.
+
+    :param table: partitioned table name
+    :param partition: partition name
+    :param archive_dir: directory partition is archived to before drop, None to drop without archive
+    :return: archive path or None
+    """
+    path = None
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE {0} DETACH PARTITION {1}'.format(
+                connection.ops.quote_name(table), connection.ops.quote_name(partition)))
+        if archive_dir:
+            path = archive_partition(partition, archive_dir)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE {0}'.format(connection.ops.quote_name(partition)))
+    return path
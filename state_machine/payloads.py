@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.payloads
+~~~~~~~~~~~~~~
+
+- Offload of large service payloads (`HttpService.headers`, `dataIn`, `dataOut`) to a content-addressed blob store.
+
+    - A JSON value whose encoded size is above `THRESHOLD` is compressed & written to the store under the SHA-256
+      of its canonical JSON encoding, so identical payloads are stored once.
+    - The column keeps a reference `{"$payload": {"digest", "codec", "size", "preview"}}` instead of the value,
+      serializers resolve it only when the value is rendered.
+    - Blobs are written before the row that references them is committed, a rolled back request leaves an
+      unreferenced blob behind, which is harmless as blobs are immutable.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for `zstd` codec
+    zstandard = None
+
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+
+
+# local
+
+
+# own app
+from state_machine import config, models
+
+REFERENCE_KEY = '$payload'
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+# errors of reading a blob back, a corrupt blob is treated as a missing one
+_READ_ERRORS = (ValueError, EOFError, IOError, OSError, zlib.error) + (
+    (zstandard.ZstdError, ) if zstandard is not None else ())
+
+# payload columns of every service model
+OFFLOADED_FIELDS = {
+    models.HttpService: ('headers', 'dataIn', 'dataOut'),
+}
+
+
+class PayloadNotFound(Exception):
+    """Referenced blob is missing from payload store, or can not be read
+
+    """
+
+
+def _gzip_compress(data):
+    return gzip.compress(data)
+
+
+def _gzip_decompress(data):
+    return gzip.decompress(data)
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+CODECS = {
+    'gzip': (_gzip_compress, _gzip_decompress),
+    'zstd': (_zstd_compress, _zstd_decompress),
+}
+
+
+def _codec(name):
+    """
+    :param name: codec name
+    :return: (compress, decompress) callables of codec
+    """
+    if name not in CODECS:
+        raise ImproperlyConfigured('unknown payload codec {0}.'.format(name))
+    if name == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured('`zstd` payload codec requires `zstandard` package.')
+    return CODECS[name]
+
+
+class FileSystemPayloadStore(object):
+    """Blob store on local (or mounted) filesystem, blobs are laid out as `<location>/<ab>/<cd>/<digest>.<codec>`
+
+    """
+
+    def __init__(self, location):
+        """
+        :param location: root directory of store
+        """
+        self.location = location
+
+    def path(self, digest, codec):
+        """
+        :param digest: hex SHA-256 of payload
+        :param codec: codec blob is compressed with
+        :return: path of blob
+        """
+        return os.path.join(self.location, digest[:2], digest[2:4], '{0}.{1}'.format(digest, codec))
+
+    def exists(self, digest, codec):
+        """
+        :param digest: hex SHA-256 of payload
+        :param codec: codec blob is compressed with
+        :return: whether blob is stored
+        """
+        return os.path.exists(self.path(digest, codec))
+
+    def save(self, digest, codec, data):
+        """Write blob atomically (temporary file + rename), so readers never see a partial blob.
+
+        :param digest: hex SHA-256 of payload
+        :param codec: codec blob is compressed with
+        :param data: compressed bytes
+        """
+        path = self.path(digest, codec)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as blob:
+                blob.write(data)
+            os.rename(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def open(self, digest, codec):
+        """
+        :param digest: hex SHA-256 of payload
+        :param codec: codec blob is compressed with
+        :return: compressed bytes
+        """
+        try:
+            with open(self.path(digest, codec), 'rb') as blob:
+                return blob.read()
+        except (IOError, OSError):
+            raise PayloadNotFound(digest)
+
+
+_store = None
+
+
+def get_store():
+    """
+    :return: payload store configured by `STATE_MACHINE_PAYLOAD_STORE`
+    """
+    global _store
+    if _store is None:
+        if not config.PAYLOAD_STORE['LOCATION']:
+            raise ImproperlyConfigured('STATE_MACHINE_PAYLOAD_STORE requires `LOCATION` when it is enabled.')
+        _store = FileSystemPayloadStore(config.PAYLOAD_STORE['LOCATION'])
+    return _store
+
+
+def is_enabled():
+    """
+    :return: whether large payloads are offloaded
+    """
+    return config.PAYLOAD_STORE['ENABLED']
+
+
+def is_reference(value):
+    """
+    :param value: JSON column value
+    :return: whether value is a reference to an offloaded payload, client payloads which merely use
+        `REFERENCE_KEY` do not have its full shape & are served as they are
+    """
+    if not (isinstance(value, dict) and len(value) == 1 and isinstance(value.get(REFERENCE_KEY), dict)):
+        return False
+    reference = value[REFERENCE_KEY]
+    digest, size = reference.get('digest'), reference.get('size')
+    return (isinstance(digest, str) and _DIGEST.match(digest) is not None and reference.get('codec') in CODECS and
+            isinstance(size, int) and not isinstance(size, bool))
+
+
+def offload(value):
+    """
+    :param value: JSON value
+    :return: value as is when it is small, otherwise reference to it in payload store
+    """
+    if value is None or not is_enabled():
+        return value
+
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(encoded) <= config.PAYLOAD_STORE['THRESHOLD']:
+        return value
+
+    codec = config.PAYLOAD_STORE['CODEC']
+    compress, _ = _codec(codec)
+    digest = hashlib.sha256(encoded).hexdigest()
+
+    store = get_store()
+    if not store.exists(digest, codec):
+        store.save(digest, codec, compress(encoded))
+
+    return {REFERENCE_KEY: {
+        'digest': digest,
+        'codec': codec,
+        'size': len(encoded),
+        'preview': encoded[:config.PAYLOAD_STORE['PREVIEW_LENGTH']].decode('utf-8', 'ignore'),
+    }}
+
+
+def resolve(value):
+    """
+    :param value: JSON column value
+    :return: offloaded payload when value is a reference, otherwise value as is
+    :raise PayloadNotFound: when blob of reference is missing or can not be read
+    """
+    if not is_reference(value):
+        return value
+
+    reference = value[REFERENCE_KEY]
+    digest, codec = reference['digest'], reference['codec']
+    try:
+        _, decompress = _codec(codec)
+        store = get_store()
+    except ImproperlyConfigured:
+        # e.g store is not configured in this process, or `zstandard` is missing
+        raise PayloadNotFound(digest)
+    try:
+        return json.loads(decompress(store.open(digest, codec)).decode('utf-8'))
+    except _READ_ERRORS:
+        raise PayloadNotFound(digest)
+
+
+def offload_service_data(model, data):
+    """
+    :param model: service model
+    :param data: validated service data
+    :return: service data with large payloads replaced by references
+    """
+    fields = OFFLOADED_FIELDS.get(model)
+    if not fields or not is_enabled():
+        return data
+
+    data = dict(data)
+    for name in fields:
+        if name in data:
+            data[name] = offload(data[name])
+    return data
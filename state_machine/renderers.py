@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.renderers
+~~~~~~~~~~~~~~
+
+- Response renderers of state_machine micro-service
+
+    - `FastJSONRenderer` renders same JSON as DRF `JSONRenderer` through `orjson` when it is installed, it falls
+      back to DRF encoder for indented output & for data `orjson` does not know (e.g integers above 64 bit).
+    - `MessagePackRenderer` renders same data as MessagePack (`application/msgpack`), when `msgpack` is installed.
+      Values which are not native to JSON are converted as DRF encoder converts them, so both formats carry
+      same values (e.g datetimes as ISO 8601 strings).
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, JSON is rendered by DRF encoder without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for MessagePack format
+    msgpack = None
+
+
+# Django
+
+
+# local
+
+
+# own app
+
+
+def server_sent_event(event, data, event_id=None):
+    """
+    :param event: event name
+    :param data: JSON serializable event data
+    :param event_id: optional event id, sent back by clients as `Last-Event-ID` when they reconnect
+    :return: one server-sent event
+    """
+    lines = ['event: {0}'.format(event), 'data: {0}'.format(json.dumps(data, cls=JSONEncoder))]
+    if event_id is not None:
+        lines.insert(0, 'id: {0}'.format(event_id))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Server-sent events renderer.
+
+        - Event streams are written by views themselves (`StreamingHttpResponse`), this renderer lets DRF accept
+          `Accept: text/event-stream` and renders anything else a view returns (e.g errors) as one `error` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        :param data: response data
+        :param accepted_media_type: accepted media type
+        :param renderer_context: renderer context
+        :return: `error` event of data
+        """
+        if data is None:
+            return b''
+        return server_sent_event('error', data).encode(self.charset)
+
+
+def _default(obj):
+    """
+    :param obj: value which is not native to JSON
+    :return: its representation, as DRF encoder gives it
+    """
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer, `orjson` based
+
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        :param data: response data
+        :param accepted_media_type: accepted media type
+        :param renderer_context: renderer context
+        :return: compact UTF-8 JSON of data
+        """
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer
+
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        :param data: response data
+        :param accepted_media_type: accepted media type
+        :param renderer_context: renderer context
+        :return: MessagePack of data
+        """
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+# renderers of API formats of `TransactionStateViewSet`, MessagePack is offered only when `msgpack` is installed
+API_RENDERERS = (FastJSONRenderer, ) + ((MessagePackRenderer, ) if msgpack is not None else ())
@@ -40,10 +40,65 @@ change_state = views.TransactionStateViewSet.as_view({
     'put': 'change_state',
 })
 
+get_change_feed = views.TransactionStateViewSet.as_view({
+    'get': 'get_change_feed',
+})
+
+get_statistics = views.TransactionStateViewSet.as_view({
+    'get': 'get_statistics',
+})
+
+wait_for_state = views.TransactionStateViewSet.as_view({
+    'get': 'wait_for_state',
+})
+
+bulk_change_state = views.TransactionStateViewSet.as_view({
+    'post': 'bulk_change_state',
+})
+
+bulk_create_initial_state = views.TransactionStateViewSet.as_view({
+    'post': 'bulk_create_initial_state',
+})
+
+ingest_state_events = views.StateEventStreamView.as_view()
+
+database_health = views.DatabaseHealthView.as_view()
+
+metrics = views.MetricsView.as_view()
+
+get_current_states = views.TransactionStateViewSet.as_view({
+    'get': 'get_current_states',
+    'post': 'get_current_states',
+})
+
 urlpatterns = [
     url(r'^new/$',
         create_initial_state,
         name='create-initial-state'),
+    url(r'^current/$',
+        get_current_states,
+        name='get-current-states'),
+    url(r'^bulk/new/$',
+        bulk_create_initial_state,
+        name='bulk-create-initial-state'),
+    url(r'^bulk/change/$',
+        bulk_change_state,
+        name='bulk-change-state'),
+    url(r'^events/$',
+        ingest_state_events,
+        name='ingest-state-events'),
+    url(r'^feed/$',
+        get_change_feed,
+        name='get-change-feed'),
+    url(r'^statistics/$',
+        get_statistics,
+        name='get-statistics'),
+    url(r'^health/db/$',
+        database_health,
+        name='database-health'),
+    url(r'^metrics/$',
+        metrics,
+        name='metrics'),
     url(r'^(?P<task_identifier>[0-9a-z-]+)/current/$',
         get_current_state,
         name='get-current-state'),
@@ -53,4 +108,7 @@ urlpatterns = [
     url(r'^(?P<task_identifier>[0-9a-z-]+)/change/$',
         change_state,
         name='change-state'),
+    url(r'^(?P<task_identifier>[0-9a-z-]+)/wait/$',
+        wait_for_state,
+        name='wait-for-state'),
 ]
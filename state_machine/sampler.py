@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.sampler
+~~~~~~~~~~~~~~
+
+- Sampling profiler of hot tasks & slow queries, to find pathological tasks without full query logging.
+
+    - Hot tasks: a sample (`TASK_SAMPLE_RATE`) of transitions of every write path (`state_changed` receiver) is
+      counted in a space-saving top-K, its memory is bounded by `CAPACITY` whatever number of tasks.
+    - Slow queries: queries of `state_machine.db` cursors slower than `SLOW_QUERY_THRESHOLD` are counted per SQL,
+      with their total & max time, at most `CAPACITY` statements are kept (fastest max is evicted first).
+    - Samples live in memory of each worker process, a thread flushes them every `FLUSH_INTERVAL` seconds to
+      `ProfileSample` rows of that process, so they can be merged across processes by `profile_samples`
+      management command & browsed in admin.
+"""
+
+# future
+from __future__ import division, unicode_literals
+
+# 3rd party
+import heapq
+import os
+import random
+import re
+import socket
+import threading
+import time
+from datetime import timedelta
+
+
+# Django
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+# lists of placeholders differ by their length only, e.g `IN (%s, %s, %s)`
+_PLACEHOLDERS = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+
+MAX_SQL_LENGTH = 2000
+
+
+def _lowest(heap, current):
+    """
+    :param heap: heap of (value when pushed, key), one entry per key, values of keys only grow
+    :param current: dict of key -> current value
+    :return: (value, key) of key with lowest current value, its entry is left on top of heap
+    """
+    while True:
+        value, key = heap[0]
+        if current[key] == value:
+            return value, key
+        # value grew since entry was pushed
+        heapq.heapreplace(heap, (current[key], key))
+
+
+class SpaceSaving(object):
+    """Space-saving top-K of most frequent keys
+
+        - A new key which does not fit evicts key with lowest count and inherits that count as error, so counts
+          are over-estimated by at most their `error`, and every key more frequent than total / capacity is kept.
+        - Lowest count is found through a heap whose entries are refreshed lazily, O(log capacity) per eviction
+          instead of a scan of all keys under sampler lock.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: max number of counted keys
+        """
+        self.capacity = capacity
+        self._counts = {}  # key -> [count, error]
+        self._current = {}  # key -> count
+        self._heap = []  # (count when pushed, key)
+
+    def add(self, key, weight=1):
+        """
+        :param key: observed key
+        :param weight: number of occurrences it stands for
+        """
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += weight
+            self._current[key] = entry[0]
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = [weight, 0]
+            self._current[key] = weight
+            heapq.heappush(self._heap, (weight, key))
+        else:
+            count, victim = _lowest(self._heap, self._current)
+            del self._counts[victim], self._current[victim]
+            self._counts[key] = [count + weight, count]
+            self._current[key] = count + weight
+            heapq.heapreplace(self._heap, (count + weight, key))
+
+    def items(self):
+        """
+        :return: list of (key, count, error), most frequent first
+        """
+        return sorted(((key, count, error) for key, (count, error) in self._counts.items()),
+                      key=lambda item: item[1], reverse=True)
+
+
+class SlowQueries(object):
+    """Slowest statements, bounded, statement with fastest max time is found through a lazily refreshed heap
+
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: max number of kept statements
+        """
+        self.capacity = capacity
+        self._queries = {}  # sql -> [count, total time, max time]
+        self._current = {}  # sql -> max time
+        self._heap = []  # (max time when pushed, sql)
+
+    def add(self, sql, seconds):
+        """
+        :param sql: fingerprint of statement
+        :param seconds: duration of one execution
+        """
+        entry = self._queries.get(sql)
+        if entry is None:
+            if len(self._queries) >= self.capacity:
+                slowest, victim = _lowest(self._heap, self._current)
+                if slowest >= seconds:
+                    return
+                del self._queries[victim], self._current[victim]
+                heapq.heapreplace(self._heap, (seconds, sql))
+            else:
+                heapq.heappush(self._heap, (seconds, sql))
+            entry = self._queries[sql] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        self._current[sql] = entry[2]
+
+    def items(self):
+        """
+        :return: list of (sql, count, total time, max time), slowest first
+        """
+        return sorted(((sql, count, total, slowest) for sql, (count, total, slowest) in self._queries.items()),
+                      key=lambda item: item[3], reverse=True)
+
+
+def fingerprint(sql):
+    """
+    :param sql: SQL with placeholders, as given to cursor
+    :return: SQL which is same for all executions of a statement
+    """
+    return _PLACEHOLDERS.sub('(...)', sql)[:MAX_SQL_LENGTH]
+
+
+class Sampler(object):
+    """Samples of a worker process & their flusher thread
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self.tasks = SpaceSaving(config.SAMPLER['CAPACITY'])
+        self.queries = SlowQueries(config.SAMPLER['CAPACITY'])
+
+    def observe_transitions(self, task_identifiers):
+        """
+        :param task_identifiers: identifiers of tasks which changed state, repeated for every transition
+        """
+        rate = config.SAMPLER['TASK_SAMPLE_RATE']
+        sampled = [identifier for identifier in task_identifiers if rate >= 1 or random.random() < rate]
+        if not sampled:
+            return
+        with self._lock:
+            self._ensure_thread()
+            for identifier in sampled:
+                self.tasks.add(identifier, 1 / rate)
+
+    def observe_query(self, sql, seconds):
+        """
+        :param sql: SQL with placeholders
+        :param seconds: duration of query
+        """
+        if seconds < config.SAMPLER['SLOW_QUERY_THRESHOLD']:
+            return
+        with self._lock:
+            self._ensure_thread()
+            self.queries.add(fingerprint(sql), seconds)
+
+    def _ensure_thread(self):
+        """Start flusher thread, once per process (a forked worker does not inherit thread of its parent).
+
+        """
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        if self._pid is not None and self._pid != os.getpid():
+            # samples of parent process
+            self._reset()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='state-machine-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(config.SAMPLER['FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            except DatabaseError:
+                # e.g table is not migrated yet, samples are kept for next flush
+                pass
+            finally:
+                connections.close_all()
+
+    def flush(self):
+        """Replace `ProfileSample` rows of this process with its current samples.
+
+        """
+        from state_machine import models
+
+        with self._lock:
+            tasks, queries = self.tasks.items(), self.queries.items()
+        process = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        now = timezone.now()
+
+        rows = [models.ProfileSample(process=process, kind=models.TASK, key=key, count=int(count), error=int(error),
+                                     modified_at=now) for key, count, error in tasks]
+        rows.extend(models.ProfileSample(process=process, kind=models.QUERY, key=sql, count=count, total_time=total,
+                                         max_time=slowest, modified_at=now) for sql, count, total, slowest in queries)
+
+        with transaction.atomic():
+            models.ProfileSample.objects.filter(process=process).delete()
+            # rows of processes which are gone
+            models.ProfileSample.objects.filter(
+                modified_at__lt=now - timedelta(seconds=config.SAMPLER['STALE_AFTER'])).delete()
+            models.ProfileSample.objects.bulk_create(rows)
+
+
+sampler = Sampler()
+
+
+def on_state_changed(sender, transitions, **kwargs):
+    """`state_changed` receiver
+
+    :param sender: sender of signal
+    :param transitions: list of Transition
+    """
+    if config.SAMPLER['ENABLED']:
+        sampler.observe_transitions([transition.task_identifier for transition in transitions])
+
+
+def observe_query(sql, seconds):
+    """
+    :param sql: SQL with placeholders
+    :param seconds: duration of query
+    """
+    if config.SAMPLER['ENABLED']:
+        sampler.observe_query(sql, seconds)
+
+
+def top_tasks(limit, max_age=None):
+    """
+    :param limit: number of tasks
+    :param max_age: seconds, only samples flushed since then are merged, default `STALE_AFTER`
+    :return: list of (task identifier, estimated transitions, max over-estimation), merged across processes
+    """
+    from state_machine import models
+
+    merged = {}
+    for key, count, error in _recent(models.TASK, max_age).values_list('key', 'count', 'error'):
+        entry = merged.setdefault(key, [0, 0])
+        entry[0] += count
+        entry[1] += error
+    return sorted(((key, count, error) for key, (count, error) in merged.items()),
+                  key=lambda item: item[1], reverse=True)[:limit]
+
+
+def slow_queries(limit, max_age=None):
+    """
+    :param limit: number of statements
+    :param max_age: seconds, only samples flushed since then are merged, default `STALE_AFTER`
+    :return: list of (sql, count, total time, max time), merged across processes, slowest first
+    """
+    from state_machine import models
+
+    merged = {}
+    for key, count, total, slowest in _recent(models.QUERY, max_age).values_list('key', 'count', 'total_time',
+                                                                                 'max_time'):
+        entry = merged.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += count
+        entry[1] += total
+        entry[2] = max(entry[2], slowest)
+    return sorted(((key, count, total, slowest) for key, (count, total, slowest) in merged.items()),
+                  key=lambda item: item[3], reverse=True)[:limit]
+
+
+def _recent(kind, max_age):
+    """
+    :return: queryset of samples of kind, flushed within max_age seconds
+    """
+    from state_machine import models
+
+    if max_age is None:
+        max_age = config.SAMPLER['STALE_AFTER']
+    return models.ProfileSample.objects.filter(kind=kind, modified_at__gte=timezone.now() - timedelta(seconds=max_age))
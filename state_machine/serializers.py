@@ -23,7 +23,7 @@ from rest_framework import serializers
 
 
 # own app
-from state_machine import config
+from state_machine import config, payloads
 from state_machine.models import TransactionLifeCycle, TransactionStateMachine, HttpService
 
 
@@ -36,7 +36,7 @@ class TransactionStateMachineSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TransactionStateMachine
-        exclude = ('created_at', 'modified_at', )
+        exclude = ('created_at', 'modified_at', 'archive', )
 
     def create(self, validated_data):
         """
@@ -54,16 +54,42 @@ class TransactionStateMachineSerializer(serializers.ModelSerializer):
         return super(TransactionStateMachineSerializer, self).create(validated_data)
 
 
+class PayloadField(serializers.JSONField):
+    """JSON field of a payload which may be offloaded to payload store, reference is resolved only on render
+
+    """
+
+    def to_representation(self, value):
+        """
+        :param value: column value, payload or reference to it
+        :return: payload, reference as is when its blob is missing
+        """
+        try:
+            value = payloads.resolve(value)
+        except payloads.PayloadNotFound:
+            pass
+        return super(PayloadField, self).to_representation(value)
+
+
 class HttpServiceSerializer(serializers.ModelSerializer):
     """
 
     """
+    headers = PayloadField(required=False, allow_null=True)
+    dataIn = PayloadField(required=False, allow_null=True)
+    dataOut = PayloadField(required=False, allow_null=True)
 
     class Meta:
         model = HttpService
         exclude = ('id', )
 
 
+# serializer of every service model a life cycle entry may point to via Generic FK
+SERVICE_SERIALIZERS = {
+    HttpService: HttpServiceSerializer,
+}
+
+
 class TransactionLifeCycleSerializer(serializers.ModelSerializer):
     """
 
@@ -81,12 +107,40 @@ class TransactionLifeCycleSerializer(serializers.ModelSerializer):
         :param obj: TransactionLifeCycle object
         :return: object related service data
         """
-        return HttpServiceSerializer(instance=obj.get_http_service_object).data
+        service = obj.entity
+        serializer_cls = SERVICE_SERIALIZERS.get(service.__class__, HttpServiceSerializer)
+        return serializer_cls(instance=service).data
 
 
 class ChangeStateSerializer(serializers.Serializer):
     """Change State serializer
 
+        - `expected_state` and/or `expected_version` make the change conditional, it is applied only if task
+          is currently in that state / at that version.
+        - Views validate changes with `validators.CHANGE_STATE` (transition graph included), this serializer is
+          left for the legacy path of `benchmarks.write_path`.
     """
     state = serializers.ChoiceField(required=True,
                                     choices=config.STATES)
+    expected_state = serializers.ChoiceField(required=False,
+                                             choices=config.STATES)
+    expected_version = serializers.IntegerField(required=False,
+                                                min_value=0)
+
+
+class CurrentStatesSerializer(serializers.Serializer):
+    """Batch current state serializer
+
+    """
+    task_identifiers = serializers.ListField(required=True,
+                                             child=serializers.CharField(max_length=200))
+
+    def validate_task_identifiers(self, value):
+        """
+        :param value: list of task identifiers
+        :return: validated list
+        """
+        if len(value) > config.BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                'at most {0} identifiers are allowed per request.'.format(config.BULK_MAX_ITEMS))
+        return value
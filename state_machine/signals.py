@@ -0,0 +1,33 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.signals
+~~~~~~~~~~~~~~
+
+- Signals of state_machine micro-service
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from collections import namedtuple
+
+# Django
+from django.dispatch import Signal
+
+# local
+
+
+# own app
+
+
+# `previous_state` is None when task is created
+Transition = namedtuple('Transition', ('task_identifier', 'task_name', 'previous_state', 'state'))
+
+# Sent by every write path (single, bulk & streaming) with a list of `Transition`s, right after tasks are written
+# and still inside the writing transaction. Receivers which act outside of database must use
+# `transaction.on_commit`. ASGI application writes through its own connection & sends it after commit, with
+# `counted` True as it updated statistics counters inside its transaction.
+state_changed = Signal(providing_args=['transitions', 'counted'])
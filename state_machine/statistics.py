@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.statistics
+~~~~~~~~~~~~~~
+
+- Task counts per `task_name` per `state` & transition rates, from counters maintained on every transition.
+
+    - `state_changed` receiver upserts counter deltas inside writing transaction, so counters commit or roll back
+      together with transitions: -1 on previous state & +1 on new state of a task (`TaskStateCount`), +1 on new state
+      in bucket of current minute (`TransitionRollup`).
+    - Counters are split in `SHARDS` rows, each transaction picks one shard, so concurrent transitions of a task
+      name rarely wait on same row lock. Rows of one upsert are sorted, which keeps lock order stable.
+    - ASGI application runs same upserts on its own connection inside its transaction (`counter_rows` &
+      `upsert_sql`) and sends `state_changed` with `counted` after commit.
+    - Reads sum shards of counters & buckets of rollups, never scan tasks or life cycles.
+    - `rebuild_counts` recomputes counts from tasks, for counters which drifted (e.g transitions written before
+      counters existed). Rollups older than `ROLLUP_RETENTION` days are deleted by `prune_rollups`.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import random
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+
+# Django
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config, models
+
+
+def upsert_sql(model, key_fields, count, quote):
+    """
+    :param model: counter model
+    :param key_fields: fields of unique key of model, `shard` included
+    :param count: number of rows
+    :param quote: function quoting a name for database
+    :return: statement adding `count` column of rows to counters, creating missing ones, with `%s` placeholders
+    """
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field) for field in key_fields + ('count', ))
+    placeholders = ', '.join(['({0})'.format(', '.join(['%s'] * (len(key_fields) + 1)))] * count)
+    return ('INSERT INTO {table} ({columns}) VALUES {placeholders} '
+            'ON CONFLICT ({key}) DO UPDATE SET count = {table}.count + EXCLUDED.count').format(
+        table=table, columns=columns, placeholders=placeholders, key=', '.join(quote(field) for field in key_fields))
+
+
+def counter_rows(transitions):
+    """
+    :param transitions: list of signals.Transition
+    :return: list of (counter model, key fields, rows), a row is key values + delta of `count`, rows are sorted,
+             which keeps lock order stable, counters which do not change are left out
+    """
+    shard = random.randrange(config.STATISTICS['SHARDS'])
+    bucket = timezone.now().replace(second=0, microsecond=0)
+
+    counts, rollups = Counter(), Counter()
+    for transition in transitions:
+        if transition.previous_state is not None:
+            counts[(transition.task_name, transition.previous_state, shard)] -= 1
+        counts[(transition.task_name, transition.state, shard)] += 1
+        rollups[(bucket, transition.task_name, transition.state, shard)] += 1
+
+    counters = []
+    for model, key_fields, deltas in ((models.TaskStateCount, ('task_name', 'state', 'shard'), counts),
+                                      (models.TransitionRollup, ('bucket', 'task_name', 'state', 'shard'), rollups)):
+        rows = sorted((key + (delta, )) for key, delta in deltas.items() if delta)
+        if rows:
+            counters.append((model, key_fields, rows))
+    return counters
+
+
+def record(transitions):
+    """Update counters with transitions, inside current transaction.
+
+    :param transitions: list of signals.Transition
+    """
+    for model, key_fields, rows in counter_rows(transitions):
+        connection = connections[router.db_for_write(model)]
+        fields = [model._meta.get_field(field) for field in key_fields + ('count', )]
+        with connection.cursor() as cursor:
+            cursor.execute(upsert_sql(model, key_fields, len(rows), connection.ops.quote_name),
+                           [field.get_db_prep_value(value, connection)
+                            for row in rows for field, value in zip(fields, row)])
+
+
+def on_state_changed(sender, transitions, counted=False, **kwargs):
+    """`state_changed` receiver
+
+    :param sender: sender of signal
+    :param transitions: list of Transition
+    :param counted: sender already updated counters in its transaction
+    """
+    if config.STATISTICS['ENABLED'] and not counted:
+        record(transitions)
+
+
+def state_counts(task_name=None):
+    """
+    :param task_name: only count tasks of this task name
+    :return: OrderedDict of task name -> OrderedDict of state -> number of tasks
+    """
+    queryset = models.TaskStateCount.objects.all()
+    if task_name is not None:
+        queryset = queryset.filter(task_name=task_name)
+    rows = queryset.values('task_name', 'state').annotate(total=Sum('count')).order_by('task_name', 'state')
+
+    counts = OrderedDict()
+    for row in rows:
+        if row['total']:
+            counts.setdefault(row['task_name'], OrderedDict())[row['state']] = row['total']
+    return counts
+
+
+def transition_rates(minutes, task_name=None):
+    """
+    :param minutes: number of past minutes to report, current one included
+    :param task_name: only count transitions of this task name
+    :return: list of per minute buckets, ordered by minute, only minutes with transitions are listed
+    """
+    since = timezone.now().replace(second=0, microsecond=0) - timedelta(minutes=minutes - 1)
+    queryset = models.TransitionRollup.objects.filter(bucket__gte=since)
+    if task_name is not None:
+        queryset = queryset.filter(task_name=task_name)
+    rows = queryset.values('bucket', 'task_name', 'state').annotate(total=Sum('count')).order_by(
+        'bucket', 'task_name', 'state')
+
+    buckets = OrderedDict()
+    for row in rows:
+        bucket = buckets.setdefault(row['bucket'], OrderedDict((('minute', row['bucket']), ('transitions', {}))))
+        bucket['transitions'].setdefault(row['task_name'], OrderedDict())[row['state']] = row['total']
+    return list(buckets.values())
+
+
+def rebuild_counts():
+    """Recompute `TaskStateCount` from tasks.
+
+        - On PostgreSQL counters are locked against concurrent upserts meanwhile. A transition which is not committed
+          yet when tasks are counted upserts its delta after rebuild, on top of counts which do not include it yet.
+
+    :return: number of counted tasks
+    """
+    alias = router.db_for_write(models.TaskStateCount)
+    with transaction.atomic(using=alias):
+        connection = connections[alias]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('LOCK TABLE {0} IN EXCLUSIVE MODE'.format(
+                    connection.ops.quote_name(models.TaskStateCount._meta.db_table)))
+
+        rows = list(models.TransactionStateMachine.objects.using(alias).values('task_name', 'state').annotate(
+            total=Count('id')).order_by())
+        models.TaskStateCount.objects.using(alias).all().delete()
+        models.TaskStateCount.objects.using(alias).bulk_create([
+            models.TaskStateCount(task_name=row['task_name'], state=row['state'], shard=0, count=row['total'])
+            for row in rows
+        ])
+    return sum(row['total'] for row in rows)
+
+
+def prune_rollups(retention=None):
+    """
+    :param retention: days of rollups to keep, default `ROLLUP_RETENTION`
+    :return: number of deleted rollups
+    """
+    if retention is None:
+        retention = config.STATISTICS['ROLLUP_RETENTION']
+    before = timezone.now() - timedelta(days=retention)
+    deleted, _ = models.TransitionRollup.objects.filter(bucket__lt=before).delete()
+    return deleted
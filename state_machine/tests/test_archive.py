@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_archive
+~~~~~~~~~~~~~~
+
+- Archived life cycles are read back by life cycle endpoint, an archive this host can not read answers 503.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+
+# Django
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import archive, config, models
+
+
+class ArchivedLifeCycleTestCase(TestCase):
+    """Life cycle of an archived task
+
+    """
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        patcher = mock.patch.dict(config.ARCHIVE, {'LOCATION': self.location})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        now = timezone.now()
+        self.task = models.TransactionStateMachine.objects.create(
+            task_name='archive', task_identifier='task-1', state=config.COMPLETE, created_at=now, modified_at=now)
+        for state in (config.INIT, config.COMPLETE):
+            models.TransactionLifeCycle.objects.create(task=self.task, state=state)
+
+        archive_file = archive.ArchiveFile('life-cycles.jsonl.gz')
+        self.addCleanup(archive_file.close)
+        self.assertEqual(archive.archive_batch([self.task.id], archive_file), 1)
+
+    def _life_cycle(self):
+        return self.client.get(reverse('get-complete-transaction-life-cycle',
+                                       kwargs={'task_identifier': 'task-1'}))
+
+    def test_read_back(self):
+        self.assertFalse(models.TransactionLifeCycle.objects.filter(task=self.task).exists())
+        response = self._life_cycle()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row['state'] for row in json.loads(response.content.decode('utf-8'))],
+                         [config.COMPLETE, config.INIT])
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.location, 'life-cycles.jsonl.gz'))
+        response = self._life_cycle()
+        self.assertEqual(response.status_code, 503, response.content)
+
+    def test_truncated_file(self):
+        with open(os.path.join(self.location, 'life-cycles.jsonl.gz'), 'r+b') as archived:
+            archived.truncate(10)
+        self.assertEqual(self._life_cycle().status_code, 503)
@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_asgi
+~~~~~~~~~~~~~~
+
+- WSGI fallback: requests run in threads of their own, a blocked request does not stall others.
+- Wait for state: waiter on event loop is woken by a change dispatched from another thread, a stream stops waiting
+  once its client disconnects.
+- Requests of native routes are observed into metrics, with their `asyncpg` queries.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import asyncio
+import json
+import threading
+from unittest import mock
+
+
+# Django
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config, instrumentation, models, notifications
+from state_machine.asgi import StateMachineASGI, ThreadedWsgiToAsgi
+
+
+def _scope(path, query_string=b'', headers=()):
+    """
+    :param path: request path
+    :param query_string: query string of request
+    :param headers: (name, value) tuples of request headers
+    :return: ASGI scope of a GET request
+    """
+    return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string, 'headers': list(headers),
+            'http_version': '1.1'}
+
+
+class ThreadedWsgiToAsgiTestCase(SimpleTestCase):
+    """Fallback of ASGI application
+
+    """
+
+    def test_concurrent_requests_do_not_block_each_other(self):
+        released = threading.Event()
+
+        def wsgi_application(environ, start_response):
+            if environ['PATH_INFO'] == '/wait/':
+                # a long poll, returns only once the other request has been served
+                if not released.wait(5):
+                    start_response('504 Gateway Timeout', [])
+                    return [b'']
+            else:
+                released.set()
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+
+        application = StateMachineASGI(fallback=ThreadedWsgiToAsgi(wsgi_application, max_workers=2))
+
+        async def request(path):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                sent.append(message)
+
+            await application(_scope(path), receive, send)
+            return sent[0]['status']
+
+        async def requests():
+            waiting = asyncio.ensure_future(request('/wait/'))
+            # long poll is in flight before the releasing request arrives
+            await asyncio.sleep(0.1)
+            return await asyncio.gather(waiting, request('/release/'))
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(requests()), [200, 200])
+        finally:
+            loop.close()
+
+
+# listener thread would hold a LISTEN connection to test database, changes are dispatched by tests instead
+@mock.patch.object(notifications.StateListener, '_ensure_thread', lambda listener: None)
+class StateMachineASGITestCase(TransactionTestCase):
+    """Native routes of ASGI application
+
+    """
+    # tables are flushed with CASCADE only when apps are listed, partitioned tables are not known to Django
+    available_apps = ('django.contrib.contenttypes', 'django.contrib.auth', 'state_machine')
+
+    def setUp(self):
+        now = timezone.now()
+        models.TransactionStateMachine.objects.create(
+            task_name='wait', task_identifier='task-1', state=config.INIT, created_at=now, modified_at=now)
+        self.application = StateMachineASGI()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        if self.application._pool is not None:
+            self.loop.run_until_complete(self.application._pool.close())
+        self.loop.close()
+
+    def _change_state(self):
+        """Commit a change in another thread & wake waiters of task from there.
+
+        """
+        try:
+            models.TransactionStateMachine.objects.filter(task_identifier='task-1').update(
+                state=config.PROCESSING, version=1)
+            notifications.listener.dispatch(['task-1'])
+        finally:
+            connection.close()
+
+    def test_long_poll_woken_from_other_thread(self):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        async def requests():
+            waiting = asyncio.ensure_future(self.application(
+                _scope(self.application.prefix + 'task-1/wait/', b'timeout=10'), receive, send))
+            # waiter is subscribed before state changes
+            await asyncio.sleep(0.2)
+            await self.loop.run_in_executor(None, self._change_state)
+            await asyncio.wait_for(waiting, 5)
+
+        self.loop.run_until_complete(requests())
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(json.loads(sent[1]['body'].decode('utf-8')),
+                         {'current_state': config.PROCESSING, 'version': 1, 'timeout': False})
+
+    def test_stream_ends_on_disconnect(self):
+        sent, received = [], []
+        disconnected = self.loop.create_future()
+
+        async def receive():
+            received.append(True)
+            if len(received) == 1:
+                return {'type': 'http.request', 'body': b''}
+            return await disconnected
+
+        async def send(message):
+            sent.append(message)
+
+        async def requests():
+            streaming = asyncio.ensure_future(self.application(
+                _scope(self.application.prefix + 'task-1/wait/', headers=[(b'accept', b'text/event-stream')]),
+                receive, send))
+            await asyncio.sleep(0.2)
+            self.assertIn('task-1', notifications.listener._waiters)
+            disconnected.set_result({'type': 'http.disconnect'})
+            await asyncio.wait_for(streaming, 5)
+
+        self.loop.run_until_complete(requests())
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'event: state', sent[1]['body'])
+        self.assertNotIn('task-1', notifications.listener._waiters)
+
+    def test_native_request_is_observed(self):
+        labels = ('get-current-state', 'GET')
+        requests = instrumentation.REQUESTS._series.get(labels + (200, ), 0)
+        queries = instrumentation.DB_QUERIES._series.get(labels, [None, 0.0, 0])[1]
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(self.application(
+            _scope(self.application.prefix + 'task-1/current/'), receive, send))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(instrumentation.REQUESTS._series[labels + (200, )], requests + 1)
+        self.assertGreaterEqual(instrumentation.DB_QUERIES._series[labels][1], queries + 1)
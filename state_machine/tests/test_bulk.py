@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_bulk
+~~~~~~~~~~~~~~
+
+- Bulk task creation: both insert paths (multi-row VALUES & COPY) write every column a task needs.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+from unittest import mock
+
+
+# Django
+from django.test import TestCase
+from django.urls import reverse
+
+
+# local
+
+
+# own app
+from state_machine import config, models
+
+
+class BulkCreateTestCase(TestCase):
+    """Tasks created in bulk look like tasks created one by one
+
+    """
+
+    def _bulk_create(self, identifiers):
+        response = self.client.post(reverse('bulk-create-initial-state'), json.dumps([
+            {'task_name': 'bulk', 'task_identifier': identifier, 'state': config.INIT} for identifier in identifiers
+        ]), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result['status'] for result in response.json()]
+
+    def _assert_created(self, identifiers):
+        tasks = models.TransactionStateMachine.objects.filter(task_identifier__in=identifiers)
+        self.assertEqual(sorted(tasks.values_list('task_identifier', 'version', 'retries')),
+                         [(identifier, 0, 0) for identifier in sorted(identifiers)])
+        self.assertEqual(models.TransactionLifeCycle.objects.filter(task__in=tasks).count(), len(identifiers))
+
+    def test_values(self):
+        self.assertEqual(self._bulk_create(['values-1', 'values-2']), [200, 200])
+        self._assert_created(['values-1', 'values-2'])
+
+    def test_copy(self):
+        with mock.patch.object(config, 'BULK_COPY_THRESHOLD', 1):
+            self.assertEqual(self._bulk_create(['copy-1', 'copy-2', 'copy-1']), [200, 200, 409])
+        self._assert_created(['copy-1', 'copy-2'])
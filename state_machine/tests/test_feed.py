@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_feed
+~~~~~~~~~~~~~~
+
+- Change feed: events come in order of transactions which committed them, a transaction still running holds back
+  events committed after it started, whatever their ids or creation times.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import threading
+
+
+# Django
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config, feed, models
+
+
+class ChangeFeedTestCase(TransactionTestCase):
+    """Cursor of change feed never passes an event which may still be committed
+
+    """
+    # tables are flushed with CASCADE only when apps are listed, partitioned tables are not known to Django
+    available_apps = ('django.contrib.contenttypes', 'django.contrib.auth', 'state_machine')
+
+    def setUp(self):
+        now = timezone.now()
+        self.task = models.TransactionStateMachine.objects.create(
+            task_name='feed', task_identifier='task-1', state=config.INIT, created_at=now, modified_at=now)
+
+    def _insert(self, state):
+        return models.TransactionLifeCycle.objects.create(task=self.task, state=state).id
+
+    def _states(self, events):
+        return [event['state'] for event in events]
+
+    def _feed(self, after='0'):
+        response = self.client.get(reverse('get-change-feed'), {'after': after})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_cursor(self):
+        self._insert(config.INIT)
+        self._insert(config.PROCESSING)
+
+        first = self._feed()
+        self.assertEqual(self._states(first['events']), [config.INIT, config.PROCESSING])
+        self.assertEqual(first['cursor'], first['events'][-1]['cursor'])
+
+        self._insert(config.COMPLETE)
+        self.assertEqual(self._states(self._feed(first['cursor'])['events']), [config.COMPLETE])
+        self.assertEqual(self._feed(self._feed()['cursor'])['events'], [])
+
+    def test_transaction_in_progress(self):
+        inserted, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    self._insert(config.INIT)
+                    inserted.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        try:
+            self.assertTrue(inserted.wait(10))
+            # committed after slow writer took a lower id & started
+            self._insert(config.PROCESSING)
+            self.assertEqual(feed.read_events(feed.START, 10), [])
+        finally:
+            release.set()
+            writer.join()
+
+        # both transactions ended, events come in order of transactions
+        self.assertEqual(self._states(feed.read_events(feed.START, 10)), [config.INIT, config.PROCESSING])
+
+    def test_invalid_cursor(self):
+        for after in ('12', 'a-1', '1-'):
+            response = self.client.get(reverse('get-change-feed'), {'after': after})
+            self.assertEqual(response.status_code, 400, after)
+
+    def test_invalid_timeout(self):
+        for timeout in ('nan', 'inf', '-inf', 'soon'):
+            response = self.client.get(reverse('get-change-feed'), {'stream': 'true', 'timeout': timeout})
+            self.assertEqual(response.status_code, 400, timeout)
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_journal
+~~~~~~~~~~~~~~
+
+- Write-behind life cycle journal: entries of committed transactions are flushed, entries of rolled back ones are
+  not, and an unavailable journal falls back to synchronous rows.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+
+# Django
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import config, journal, models
+
+
+class JournalTestCase(TransactionTestCase):
+    """Flush of journal entries by status of their transaction
+
+    """
+    # tables are flushed with CASCADE only when apps are listed, partitioned tables are not known to Django
+    available_apps = ('django.contrib.contenttypes', 'django.contrib.auth', 'state_machine')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        patcher = mock.patch.dict(config.LIFE_CYCLE_JOURNAL, {'ENABLED': True,
+                                                              'PATH': os.path.join(directory, 'journal.db')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        journal._journal = None
+        self.addCleanup(setattr, journal, '_journal', None)
+
+        now = timezone.now()
+        self.task = models.TransactionStateMachine.objects.create(
+            task_name='journal', task_identifier='task-1', state=config.INIT, created_at=now, modified_at=now)
+
+    def _life_cycle(self):
+        return list(models.TransactionLifeCycle.objects.filter(task=self.task).values_list('state', flat=True))
+
+    def test_committed_request(self):
+        response = self.client.put(reverse('change-state', kwargs={'task_identifier': 'task-1'}),
+                                   json.dumps({'state': config.PROCESSING}), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(journal.get_journal().pending(), 1)
+        self.assertEqual(self._life_cycle(), [])
+
+        self.assertEqual(journal.flush(), 1)
+        self.assertEqual(self._life_cycle(), [config.PROCESSING])
+        self.assertEqual(journal.get_journal().pending(), 0)
+
+    def test_rolled_back_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                journal.record([journal.entry(self.task.id, config.PROCESSING)])
+                raise RuntimeError
+        with transaction.atomic():
+            journal.record([journal.entry(self.task.id, config.COMPLETE)])
+
+        self.assertEqual(journal.get_journal().pending(), 2)
+        self.assertEqual(journal.flush(), 2)
+        self.assertEqual(self._life_cycle(), [config.COMPLETE])
+
+    def test_transaction_in_progress(self):
+        with transaction.atomic():
+            journal.record([journal.entry(self.task.id, config.PROCESSING)])
+            # flusher stops at entries whose transaction is not committed yet
+            self.assertEqual(journal.flush(), 0)
+            self.assertEqual(journal.get_journal().pending(), 1)
+        self.assertEqual(journal.flush(), 1)
+        self.assertEqual(self._life_cycle(), [config.PROCESSING])
+
+    def test_journal_unavailable(self):
+        with mock.patch.object(journal.LifeCycleJournal, 'append', side_effect=sqlite3.OperationalError('disk full')):
+            with transaction.atomic():
+                journal.record([journal.entry(self.task.id, config.PROCESSING)])
+        self.assertEqual(self._life_cycle(), [config.PROCESSING])
+        self.assertEqual(journal.get_journal().pending(), 0)
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_partitions
+~~~~~~~~~~~~~~
+
+- Bounds of monthly partitions, on every day of month.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from datetime import datetime
+
+
+# Django
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+
+# local
+
+
+# own app
+from state_machine import partitions
+
+
+def _at(year, month, day):
+    return datetime(year, month, day, 12, tzinfo=timezone.utc)
+
+
+class MonthBoundsTestCase(SimpleTestCase):
+    """Month arithmetic of `next_bound` & `_previous_bound`
+
+    """
+
+    def test_month_start(self):
+        self.assertEqual(partitions.next_bound(_at(2017, 1, 1), 'month'), _at(2017, 2, 1))
+        self.assertEqual(partitions.next_bound(_at(2017, 12, 1), 'month'), _at(2018, 1, 1))
+        self.assertEqual(partitions._previous_bound(_at(2017, 1, 1), 'month'), _at(2016, 12, 1))
+
+    def test_month_end(self):
+        self.assertEqual(partitions.next_bound(_at(2017, 1, 31), 'month'), _at(2017, 2, 28))
+        self.assertEqual(partitions.next_bound(_at(2016, 1, 30), 'month'), _at(2016, 2, 29))
+        self.assertEqual(partitions.next_bound(_at(2017, 3, 31), 'month'), _at(2017, 4, 30))
+        self.assertEqual(partitions._previous_bound(_at(2017, 3, 31), 'month'), _at(2017, 2, 28))
+        self.assertEqual(partitions._previous_bound(_at(2017, 12, 31), 'month'), _at(2017, 11, 30))
+
+    def test_every_day_of_year(self):
+        day = _at(2016, 1, 1)
+        while day.year == 2016:
+            following = partitions.next_bound(day, 'month')
+            self.assertEqual((following.year * 12 + following.month) - (day.year * 12 + day.month), 1)
+            self.assertLessEqual(partitions._previous_bound(following, 'month'), day)
+            day = partitions.next_bound(day, 'day')
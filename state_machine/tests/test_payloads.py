@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_payloads
+~~~~~~~~~~~~~~
+
+- References to offloaded payloads, client payloads using reserved key must be served as they are.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+
+# Django
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+
+# local
+
+
+# own app
+from state_machine import config, payloads, serializers
+
+DIGEST = 'a' * 64
+
+
+class ReferenceTestCase(SimpleTestCase):
+    """`is_reference` & `resolve`
+
+    """
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        patcher = mock.patch.dict(config.PAYLOAD_STORE, {'ENABLED': True, 'LOCATION': self.location,
+                                                         'THRESHOLD': 16})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, payloads, '_store', None)
+        payloads._store = None
+
+    def test_client_values_are_not_references(self):
+        for value in ({payloads.REFERENCE_KEY: 'x'},
+                      {payloads.REFERENCE_KEY: {}},
+                      {payloads.REFERENCE_KEY: {'digest': '../../etc/passwd', 'codec': 'gzip', 'size': 1}},
+                      {payloads.REFERENCE_KEY: {'digest': DIGEST, 'codec': 'rot13', 'size': 1}},
+                      {payloads.REFERENCE_KEY: {'digest': DIGEST, 'codec': 'gzip', 'size': '1'}},
+                      {payloads.REFERENCE_KEY: {'digest': DIGEST, 'codec': 'gzip', 'size': 1}, 'other': 1}):
+            self.assertFalse(payloads.is_reference(value), value)
+            self.assertEqual(payloads.resolve(value), value)
+
+    def test_round_trip(self):
+        value = {'items': list(range(100))}
+        reference = payloads.offload(value)
+        self.assertTrue(payloads.is_reference(reference))
+        self.assertEqual(payloads.resolve(reference), value)
+
+    def test_missing_or_corrupt_blob(self):
+        reference = {payloads.REFERENCE_KEY: {'digest': DIGEST, 'codec': 'gzip', 'size': 1}}
+        with self.assertRaises(payloads.PayloadNotFound):
+            payloads.resolve(reference)
+
+        payloads.get_store().save(DIGEST, 'gzip', b'not gzip')
+        with self.assertRaises(payloads.PayloadNotFound):
+            payloads.resolve(reference)
+
+        field = serializers.PayloadField()
+        self.assertEqual(field.to_representation(reference), reference)
+
+    def test_store_not_configured(self):
+        payloads._store = None
+        reference = {payloads.REFERENCE_KEY: {'digest': DIGEST, 'codec': 'gzip', 'size': 1}}
+        with mock.patch.dict(config.PAYLOAD_STORE, {'ENABLED': False, 'LOCATION': None}):
+            with self.assertRaises(payloads.PayloadNotFound):
+                payloads.resolve(reference)
+
+
+class ReservedKeyTestCase(TestCase):
+    """Client payloads using reserved key, through life cycle endpoint
+
+    """
+
+    def test_life_cycle(self):
+        data_in = {payloads.REFERENCE_KEY: {'codec': 'gzip'}}
+        response = self.client.post(reverse('create-initial-state'), json.dumps({
+            'task_name': 'payloads', 'task_identifier': 'task-1', 'state': config.INIT,
+            'service': {'type': 'http', 'upstream_url': 'http://localhost:8003', 'method': 'post',
+                        'dataIn': data_in},
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get(reverse('get-complete-transaction-life-cycle',
+                                           kwargs={'task_identifier': 'task-1'}))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))[0]['service']['dataIn'], data_in)
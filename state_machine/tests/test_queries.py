@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_queries
+~~~~~~~~~~~~~~
+
+- Number of queries of hot endpoints, it must not grow with number of rows they read or write.
+
+    - Like every test of state_machine it needs PostgreSQL, run `python manage.py test state_machine`.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+import json
+from unittest import mock
+
+
+# Django
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.urls import reverse
+
+
+# local
+
+
+# own app
+from state_machine import cache, config, models
+
+SERVICE = {
+    'type': 'http',
+    'upstream_url': 'http://localhost:8003',
+    'method': 'post',
+    'headers': {'token': '0123654789'},
+    'dataIn': {'name': 'Daniel'},
+    'dataOut': {'user_id': '1'},
+}
+
+
+class HotEndpointQueriesTestCase(TestCase):
+    """Query count of create, change state, current states & life cycle endpoints
+
+    """
+
+    def setUp(self):
+        if cache.is_enabled():
+            cache._cache().clear()
+        # content types are cached per process, warm cache so counts do not depend on test order
+        ContentType.objects.get_for_model(models.HttpService)
+
+    def _create(self, task_identifier, service=None):
+        data = {'task_name': 'queries', 'task_identifier': task_identifier, 'state': config.INIT}
+        if service is not None:
+            data['service'] = service
+        response = self.client.post(reverse('create-initial-state'), json.dumps(data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def _change(self, task_identifier, state, service=None):
+        data = {'state': state}
+        if service is not None:
+            data['service'] = service
+        response = self.client.put(reverse('change-state', kwargs={'task_identifier': task_identifier}),
+                                   json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_create_initial_state(self):
+        # savepoints (4), task, life cycle, notify & statistics (2), plus service when there is one
+        with self.assertNumQueries(9):
+            self._create('task-1')
+        with self.assertNumQueries(10):
+            self._create('task-2', SERVICE)
+
+    def test_change_state(self):
+        self._create('task-1')
+        # savepoints (2), transition, life cycle, notify & statistics (2), plus service when there is one
+        with self.assertNumQueries(7):
+            self._change('task-1', config.PROCESSING)
+        with self.assertNumQueries(8):
+            self._change('task-1', config.COMPLETE, SERVICE)
+
+    def test_current_states(self):
+        identifiers = ['task-{0}'.format(number) for number in range(20)]
+        for identifier in identifiers:
+            self._create(identifier)
+
+        for count in (1, 20):
+            if cache.is_enabled():
+                cache._cache().clear()
+            with self.assertNumQueries(1):
+                response = self.client.post(reverse('get-current-states'),
+                                            json.dumps({'task_identifiers': identifiers[:count]}),
+                                            content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(json.loads(response.content.decode('utf-8'))['states']), count)
+
+    def test_current_states_by_prefix(self):
+        for identifier in ('task-1', 'task-2', 'task-3'):
+            self._create(identifier)
+
+        pages, url = [], reverse('get-current-states') + '?task_name_prefix=quer'
+        with mock.patch.object(config, 'BULK_MAX_ITEMS', 2):
+            while url is not None:
+                with self.assertNumQueries(1):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                data = json.loads(response.content.decode('utf-8'))
+                pages.append((sorted(data['states']), data['has_more']))
+                url = data['next']
+        self.assertEqual(pages, [(['task-1', 'task-2'], True), (['task-3'], False)])
+
+    def test_life_cycle(self):
+        self._create('short', SERVICE)
+        self._create('long', SERVICE)
+        for _ in range(25):
+            self._change('long', config.PROCESSING, SERVICE)
+            self._change('long', config.PROCESSING)
+
+        for task_identifier, entries in (('short', 1), ('long', 51)):
+            # task, life cycle rows & services of its one service type
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('get-complete-transaction-life-cycle',
+                                                   kwargs={'task_identifier': task_identifier}))
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(json.loads(response.content.decode('utf-8'))), entries)
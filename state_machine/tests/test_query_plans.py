@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_query_plans
+~~~~~~~~~~~~~~
+
+- Regression check of indexes (see migration 0010 & 0013): every query of main endpoints is served by the index
+  built for it.
+
+    - Queries are EXPLAINed with `enable_seqscan` off, planner then picks a sequential scan only when no index
+      serves query, so result does not depend on how many rows tables hold.
+    - Indexes of partitions are reported as index of partitioned table they belong to.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from collections import OrderedDict
+
+
+# Django
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+
+
+# local
+
+
+# own app
+from state_machine import config, feed, models
+
+TASKS = models.TransactionStateMachine._meta.db_table
+LIFE_CYCLES = models.TransactionLifeCycle._meta.db_table
+
+# index of partitioned table an index belongs to, index itself when it is not an index of a partition
+ROOT_INDEX_SQL = """
+    WITH RECURSIVE parents (index_oid) AS (
+        SELECT %s::regclass::oid
+        UNION
+        SELECT inhparent FROM pg_inherits JOIN parents ON inhrelid = index_oid
+    )
+    SELECT index_oid::regclass::text FROM parents
+    WHERE NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = index_oid)
+"""
+
+
+def endpoint_queries():
+    """
+    :return: OrderedDict of description -> (queryset as endpoints build it, names of indexes which may serve it)
+    """
+    tasks = models.TransactionStateMachine.objects.all()
+    life_cycles = models.TransactionLifeCycle.objects.all()
+    chunk_size = config.LIFE_CYCLE_STREAM_CHUNK_SIZE
+    # unique & pattern index of `task_identifier`, as named by Django, both serve equality
+    task_identifier_indexes = ('state_machine_transactionstatemac_task_identifier_8a6acf67_uniq',
+                               'state_machine_transactionstatemac_task_identifier_8a6acf67_like')
+
+    return OrderedDict((
+        ('current state of a task', (tasks.filter(task_identifier='task'), task_identifier_indexes)),
+        ('current states of tasks', (tasks.filter(task_identifier__in=['task-1', 'task-2']), task_identifier_indexes)),
+        ('life cycle of a task, first chunk', (life_cycles.filter(task_id=1).order_by('-id')[:chunk_size],
+                                               (LIFE_CYCLES + '_task_id_id_idx', ))),
+        ('life cycle of a task, next chunk', (life_cycles.filter(task_id=1, id__lt=1000).order_by('-id')[:chunk_size],
+                                              (LIFE_CYCLES + '_task_id_id_idx', ))),
+        ('life cycle of a service', (life_cycles.filter(content_type_id=1, object_id=1),
+                                     (LIFE_CYCLES + '_entity_idx', ))),
+        ('change feed', (feed.events_after((1000, 1000)).values_list(*feed.EVENT_FIELDS)[:config.FEED['BATCH_SIZE']],
+                         (LIFE_CYCLES + '_txid_id_idx', ))),
+        ('tasks per state of a task name', (tasks.filter(task_name='task').values('state').annotate(
+            total=Count('id')).order_by(), (TASKS + '_task_name_state_idx', ))),
+        ('in-flight tasks of a state', (tasks.filter(state=config.PROCESSING).order_by('-id')[:20],
+                                        (TASKS + '_in_flight_idx', ))),
+    ))
+
+
+def plan_nodes(node):
+    """
+    :param node: node of a JSON query plan
+    :return: generator of node & its children
+    """
+    yield node
+    for child in node.get('Plans', ()):
+        for descendant in plan_nodes(child):
+            yield descendant
+
+
+class QueryPlanTestCase(TestCase):
+    """Indexes used by queries of main endpoints
+
+    """
+
+    def _plan(self, cursor, queryset):
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        return cursor.fetchone()[0][0]['Plan']
+
+    def _root_index(self, cursor, index_name):
+        cursor.execute(ROOT_INDEX_SQL, [index_name])
+        return cursor.fetchone()[0]
+
+    def test_endpoint_queries(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for description, (queryset, index_names) in endpoint_queries().items():
+                nodes = list(plan_nodes(self._plan(cursor, queryset)))
+                scans = sorted(set(node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'))
+                indexes = set(self._root_index(cursor, node['Index Name']) for node in nodes if 'Index Name' in node)
+
+                self.assertEqual(scans, [], '{0}: sequential scan of {1}'.format(description, ', '.join(scans)))
+                self.assertTrue(indexes.intersection(index_names), '{0}: {1} is not used, plan uses {2}'.format(
+                    description, ' or '.join(index_names), ', '.join(sorted(indexes)) or 'no index'))
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.tests.test_sampler
+~~~~~~~~~~~~~~
+
+- Bounded samples: key with lowest count (fastest max time) is evicted, whatever it grew to since it was added.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.test import SimpleTestCase
+
+
+# local
+
+
+# own app
+from state_machine.sampler import SlowQueries, SpaceSaving
+
+
+class SpaceSavingTestCase(SimpleTestCase):
+    """Space-saving top-K
+
+    """
+
+    def test_evicts_lowest_count(self):
+        top = SpaceSaving(2)
+        top.add('a')
+        top.add('b')
+        top.add('a', 2)
+        top.add('b', 5)
+        # `a` was added first but is now lowest
+        top.add('c')
+        self.assertEqual(top.items(), [('b', 6, 0), ('c', 4, 3)])
+
+    def test_new_key_evicts_heir(self):
+        top = SpaceSaving(1)
+        for key in ('a', 'b', 'c'):
+            top.add(key)
+        self.assertEqual(top.items(), [('c', 3, 2)])
+
+
+class SlowQueriesTestCase(SimpleTestCase):
+    """Slowest statements
+
+    """
+
+    def test_evicts_fastest_max(self):
+        queries = SlowQueries(2)
+        queries.add('a', 0.1)
+        queries.add('b', 0.2)
+        queries.add('a', 0.5)
+        queries.add('c', 0.3)
+        self.assertEqual([item[0] for item in queries.items()], ['a', 'c'])
+
+    def test_faster_statement_is_not_kept(self):
+        queries = SlowQueries(1)
+        queries.add('a', 0.5)
+        queries.add('b', 0.4)
+        self.assertEqual(queries.items(), [('a', 1, 0.5, 0.5)])
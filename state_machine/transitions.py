@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.transitions
+~~~~~~~~~~~~~~
+
+- Transition graphs of state machine micro-service.
+
+    - Graphs are compiled once, on import, into frozensets per state, so checking a transition is two dict
+      lookups & a set membership test.
+    - For single state changes a SQL predicate per target state is compiled too, it lets the conditional
+      `UPDATE` check the graph of task's own `task_name` without reading the task first.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+
+
+# local
+
+
+# own app
+from state_machine import config
+
+DEFAULT = 'default'
+STATE_NAMES = frozenset(state for state, _ in config.STATES)
+
+
+class TransitionGraph(object):
+    """Compiled transition graph of a task name
+
+    """
+    __slots__ = ('name', 'targets', 'sources', 'terminal', 'max_retries')
+
+    def __init__(self, name, edges, terminal=(), max_retries=None):
+        """
+        :param name: task name graph belongs to, `DEFAULT` for default graph
+        :param edges: dict of state -> states it may change to
+        :param terminal: states which can not change any more
+        :param max_retries: max number of `restart`s of a task, None for no limit
+        """
+        unknown = (set(edges) | set(terminal) | set(s for targets in edges.values() for s in targets)) - STATE_NAMES
+        if unknown:
+            raise ImproperlyConfigured('Unknown states {0} in transitions of {1}'.format(sorted(unknown), name))
+
+        self.name = name
+        self.terminal = frozenset(terminal)
+        self.max_retries = max_retries
+        self.targets = dict(
+            (state, frozenset() if state in self.terminal else frozenset(edges.get(state, ())))
+            for state in STATE_NAMES
+        )
+        self.sources = dict(
+            (state, frozenset(source for source, targets in self.targets.items() if state in targets))
+            for state in STATE_NAMES
+        )
+
+    def allows(self, current_state, new_state, retries=0):
+        """
+        :param current_state: current state of task
+        :param new_state: requested state of task
+        :param retries: number of times task has restarted so far
+        :return: whether task may change from current to new state
+        """
+        if new_state not in self.targets.get(current_state, ()):
+            return False
+        if new_state == config.RESTART and self.max_retries is not None:
+            return retries < self.max_retries
+        return True
+
+
+def compile_graphs(default, per_task_name):
+    """
+    :param default: default graph definition
+    :param per_task_name: dict of task name -> graph definition
+    :return: dict of task name -> TransitionGraph, default one under `DEFAULT` key
+    """
+    graphs = {DEFAULT: TransitionGraph(DEFAULT, **default)}
+    for task_name, definition in per_task_name.items():
+        graphs[task_name] = TransitionGraph(task_name, **definition)
+    return graphs
+
+
+def _sql_condition(graph, new_state, alias):
+    """
+    :param graph: TransitionGraph
+    :param new_state: requested state of task
+    :param alias: SQL alias of task row before transition
+    :return: SQL condition allowing transition to `new_state` & its params
+    """
+    sources = sorted(graph.sources[new_state])
+    if not sources:
+        return 'FALSE', []
+
+    sql, params = '{0}.state = ANY(%s)'.format(alias), [sources]
+    if new_state == config.RESTART and graph.max_retries is not None:
+        sql += ' AND {0}.retries < %s'.format(alias)
+        params.append(graph.max_retries)
+    return sql, params
+
+
+def compile_sql_predicates(graphs, alias='previous'):
+    """
+    :param graphs: dict of task name -> TransitionGraph
+    :param alias: SQL alias of task row before transition
+    :return: dict of new state -> (SQL predicate, params) checking graph of task's own name
+    """
+    predicates = {}
+    named = sorted(name for name in graphs if name != DEFAULT)
+
+    for new_state in STATE_NAMES:
+        default_sql, default_params = _sql_condition(graphs[DEFAULT], new_state, alias)
+        if not named:
+            predicates[new_state] = ('({0})'.format(default_sql), default_params)
+            continue
+
+        sql, params = ['CASE {0}.task_name'.format(alias)], []
+        for name in named:
+            condition, condition_params = _sql_condition(graphs[name], new_state, alias)
+            sql.append('WHEN %s THEN ({0})'.format(condition))
+            params.extend([name] + condition_params)
+        sql.append('ELSE ({0}) END'.format(default_sql))
+        params.extend(default_params)
+        predicates[new_state] = (' '.join(sql), params)
+
+    return predicates
+
+
+GRAPHS = compile_graphs(config.DEFAULT_TRANSITIONS, config.TRANSITIONS)
+SQL_PREDICATES = compile_sql_predicates(GRAPHS)
+
+
+def graph_for(task_name):
+    """
+    :param task_name: name of task
+    :return: TransitionGraph of task name
+    """
+    return GRAPHS.get(task_name, GRAPHS[DEFAULT])
+
+
+def is_possible(current_state, new_state):
+    """
+    :param current_state: current state of task
+    :param new_state: requested state of task
+    :return: whether any graph allows change from current to new state, used when task name is not known yet
+    """
+    return any(new_state in graph.targets[current_state] for graph in GRAPHS.values())
@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+- state_machine.validators
+~~~~~~~~~~~~~~
+
+- Precompiled payload validators of write endpoints.
+
+    - DRF serializers build (deep copy) their field instances on every request and `ModelSerializer` adds a
+      uniqueness validator which costs a SELECT per request. Write endpoints validate with these validators instead,
+      they are compiled once, on import, out of model fields so limits & choices stay in sync with models.
+    - Uniqueness of `task_identifier` is left to the database unique constraint.
+    - Errors have same shape & messages as DRF serializer errors i.e `{field: [message]}`.
+"""
+
+# future
+from __future__ import unicode_literals
+
+# 3rd party
+from rest_framework.exceptions import ValidationError
+
+
+# Django
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import URLValidator
+from django.db import models as db_models
+from django.utils import six
+
+
+# local
+
+
+# own app
+from state_machine import config, models, transitions
+
+REQUIRED = 'This field is required.'
+BLANK = 'This field may not be blank.'
+NULL = 'This field may not be null.'
+INVALID_STRING = 'Not a valid string.'
+INVALID_CHOICE = '"{0}" is not a valid choice.'
+INVALID_INTEGER = 'A valid integer is required.'
+INVALID_URL = 'Enter a valid URL.'
+MAX_LENGTH = 'Ensure this field has no more than {0} characters.'
+MIN_VALUE = 'Ensure this value is greater than or equal to {0}.'
+
+
+def _string_check(max_length=None, choices=None, allow_blank=False, url=False):
+    """
+    :param max_length: max length of string
+    :param choices: allowed values
+    :param allow_blank: whether empty string is allowed
+    :param url: whether string must be a URL
+    :return: check callable, returns value or error message
+    """
+    choices = frozenset(choices) if choices else None
+    url_validator = URLValidator() if url else None
+
+    def check(value):
+        # numbers are coerced to strings, same as DRF CharField
+        if isinstance(value, bool) or not isinstance(value, six.string_types + six.integer_types + (float, )):
+            return None, INVALID_STRING
+        value = six.text_type(value)
+        if choices is not None:
+            return (value, None) if value in choices else (None, INVALID_CHOICE.format(value))
+        # surrounding whitespace is trimmed, same as DRF CharField
+        value = value.strip()
+        if not value and not allow_blank:
+            return None, BLANK
+        if max_length is not None and len(value) > max_length:
+            return None, MAX_LENGTH.format(max_length)
+        if url_validator is not None:
+            try:
+                url_validator(value)
+            except DjangoValidationError:
+                return None, INVALID_URL
+        return value, None
+
+    return check
+
+
+def _integer_check(min_value=None):
+    """
+    :param min_value: min allowed value
+    :return: check callable, returns value or error message
+    """
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, six.integer_types + six.string_types):
+            return None, INVALID_INTEGER
+        try:
+            value = int(value)
+        except ValueError:
+            return None, INVALID_INTEGER
+        if min_value is not None and value < min_value:
+            return None, MIN_VALUE.format(min_value)
+        return value, None
+
+    return check
+
+
+def _any_check(value):
+    """
+    :param value: any JSON value
+    :return: value as is
+    """
+    return value, None
+
+
+def _model_field_check(field):
+    """
+    :param field: Django model field
+    :return: check callable of field
+    """
+    if isinstance(field, db_models.CharField):
+        return _string_check(max_length=field.max_length,
+                             choices=[choice for choice, _ in field.choices] or None,
+                             allow_blank=field.blank,
+                             url=isinstance(field, db_models.URLField))
+    if isinstance(field, db_models.IntegerField):
+        return _integer_check(min_value=0 if isinstance(field, db_models.PositiveIntegerField) else None)
+    # JSON fields
+    return _any_check
+
+
+class CompiledValidator(object):
+    """Validator of a flat JSON object
+
+    """
+    __slots__ = ('fields', 'validate')
+
+    def __init__(self, fields, validate=None):
+        """
+        :param fields: list of (name, required, allow_null, check) tuples
+        :param validate: optional callable validating whole object after fields, returns error message or None
+        """
+        self.fields = tuple(fields)
+        self.validate = validate
+
+    def __call__(self, data):
+        """
+        :param data: user input data
+        :return: validated data, only known fields
+        """
+        if not isinstance(data, dict):
+            raise ValidationError({'non_field_errors': ['Invalid data. Expected a dictionary.']})
+
+        validated, errors = {}, {}
+        for name, required, allow_null, check in self.fields:
+            if name not in data:
+                if required:
+                    errors[name] = [REQUIRED]
+                continue
+            value = data[name]
+            if value is None:
+                if allow_null:
+                    validated[name] = None
+                else:
+                    errors[name] = [NULL]
+                continue
+            value, error = check(value)
+            if error is not None:
+                errors[name] = [error]
+            else:
+                validated[name] = value
+
+        if not errors and self.validate is not None:
+            error = self.validate(validated)
+            if error is not None:
+                errors['non_field_errors'] = [error]
+
+        if errors:
+            raise ValidationError(errors)
+        return validated
+
+    @classmethod
+    def for_model(cls, model, field_names, required=(), extra=(), validate=None):
+        """
+        :param model: Django model
+        :param field_names: model fields to validate
+        :param required: fields which are required even if model has a default for them
+        :param extra: extra (name, required, allow_null, check) tuples
+        :param validate: optional callable validating whole object
+        :return: CompiledValidator
+        """
+        fields = []
+        for name in field_names:
+            field = model._meta.get_field(name)
+            is_required = name in required or not (field.blank or field.null or field.has_default())
+            fields.append((name, is_required, field.null, _model_field_check(field)))
+        return cls(fields + list(extra), validate=validate)
+
+
+def _validate_transition(data):
+    """
+    :param data: validated state change
+    :return: error message when no transition graph allows `expected_state` -> `state`
+    """
+    expected_state = data.get('expected_state')
+    if expected_state is not None and not transitions.is_possible(expected_state, data['state']):
+        return 'transition from {0} to {1} is not allowed.'.format(expected_state, data['state'])
+
+
+_STATE_CHOICES = [state for state, _ in config.STATES]
+_CHANGE_STATE_FIELDS = (
+    ('expected_state', False, False, _string_check(choices=_STATE_CHOICES)),
+    ('expected_version', False, False, _integer_check(min_value=0)),
+)
+
+CREATE_STATE = CompiledValidator.for_model(
+    models.TransactionStateMachine, ('task_name', 'task_identifier', 'state'), required=('state', ))
+
+CHANGE_STATE = CompiledValidator.for_model(
+    models.TransactionStateMachine, ('state', ), required=('state', ),
+    extra=_CHANGE_STATE_FIELDS, validate=_validate_transition)
+
+BULK_CHANGE_STATE = CompiledValidator.for_model(
+    models.TransactionStateMachine, ('task_identifier', 'state'), required=('state', ),
+    extra=_CHANGE_STATE_FIELDS, validate=_validate_transition)
+
+HTTP_SERVICE = CompiledValidator.for_model(
+    models.HttpService, ('upstream_url', 'method', 'headers', 'dataIn', 'dataOut'))
@@ -12,18 +12,38 @@
 from __future__ import unicode_literals
 
 # 3rd party
+import json
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+
 from rest_framework import exceptions
 from rest_framework import viewsets, status, permissions
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
 
 # Django
+from django.db import DatabaseError, IntegrityError, connections, router, transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.contenttypes.models import ContentType
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
 
 # local
 
 # own app
-from state_machine import models, config, serializers
+from state_machine import (archive, bulk, cache, feed, instrumentation, journal, models, config, notifications,
+                           pagination, parsers, payloads, renderers, serializers, signals, statistics, transitions,
+                           validators)
+from state_machine.db import routers
+from state_machine.exceptions import Conflict, ServiceUnavailable
 
 
 class TransactionStateViewSet(viewsets.GenericViewSet):
@@ -41,12 +61,63 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
     model = models.TransactionStateMachine
     # TODO : remove AllowAny permission with proper permission class
     permission_classes = (permissions.AllowAny, )
+    # API formats (JSON through `orjson`, MessagePack) replace DRF JSON renderer & parser
+    parser_classes = parsers.API_PARSERS + tuple(
+        parser for parser in api_settings.DEFAULT_PARSER_CLASSES if parser is not JSONParser) + (parsers.NDJSONParser, )
+    renderer_classes = renderers.API_RENDERERS + tuple(
+        renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if renderer is not JSONRenderer)
+
+    # write actions always answer in an API format, skip negotiation over browsable/CoreJSON/OpenAPI renderers
+    lean_actions = ('create_initial_state', 'change_state', 'bulk_create_initial_state', 'bulk_change_state')
 
     service = None  # determine wether service key sent in request and a valid service it is
     service_type = None
     service_content_type = None
     service_object_id = None
 
+    def get_renderers(self):
+        """
+        :return: renderers of current action
+        """
+        if self.action in self.lean_actions:
+            return [renderer() for renderer in renderers.API_RENDERERS]
+        if self.action == 'wait_for_state':
+            return [renderer() for renderer in renderers.API_RENDERERS] + [renderers.EventStreamRenderer()]
+        return super(TransactionStateViewSet, self).get_renderers()
+
+    def _validate_service(self, data):
+        """
+        :param data: user input data which may contain `service` key
+        :return: type of requested service
+        """
+        if not type(data.get('service')) is dict:
+            raise exceptions.ParseError({'detail': 'service must be of dict type.'})
+        # validate type of requested service
+        service_type = data.get('service').get('type', None)
+        if not service_type or service_type not in config.ENABLED_SERVICES:
+            raise exceptions.NotAcceptable({'detail': 'unknown service requested.'})
+        return service_type
+
+    # names of unique constraints of `task_identifier` column, looked up on first conflict
+    _task_identifier_constraints = None
+
+    def _is_task_identifier_conflict(self, exc):
+        """
+        :param exc: IntegrityError raised by inserting a task
+        :return: whether it violates uniqueness of `task_identifier`, not any other constraint
+        """
+        constraint_name = getattr(getattr(exc.__cause__, 'diag', None), 'constraint_name', None)
+        if constraint_name is None:
+            return False
+        if TransactionStateViewSet._task_identifier_constraints is None:
+            connection = connections[router.db_for_write(self.model)]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, self.model._meta.db_table)
+            TransactionStateViewSet._task_identifier_constraints = frozenset(
+                name for name, constraint in constraints.items()
+                if constraint['unique'] and constraint['columns'] == ['task_identifier'])
+        return constraint_name in TransactionStateViewSet._task_identifier_constraints
+
     def _validate_request(self, request):
         """
         :param request: Django request
@@ -54,23 +125,18 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
 
         # validate if service key exists in requested data
         if 'service' in request.data.keys():
-            if not type(request.data.get('service')) is dict:
-                raise exceptions.ParseError({'detail': 'service must be of dict type.'})
-            # validate type of requested service
-            self.service_type = request.data.get('service').get('type', None)
-            if not self.service_type or self.service_type not in config.ENABLED_SERVICES:
-                raise exceptions.NotAcceptable({'detail': 'unknown service requested.'})
+            self.service_type = self._validate_service(request.data)
             self.service = True
 
-    def _choose_service_serializer(self, service_type):
+    def _choose_service_validator(self, service_type):
         """
 
         :param service_type: type of service
-        :return: Service Serializer
+        :return: Service payload validator
         """
         if service_type == config.HTTP:
             self.service_content_type = ContentType.objects.get_for_model(models.HttpService)
-            return serializers.HttpServiceSerializer
+            return validators.HTTP_SERVICE
         raise ValueError({'detail': 'unknown service requested.'})
 
     def _validate_data(self, serializer_cls, data):
@@ -80,19 +146,123 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
         :return: validated serializer instance
         """
         serializer = serializer_cls(data=data)
-        serializer.is_valid(raise_exception=True)
+        with instrumentation.timed('serialize'):
+            serializer.is_valid(raise_exception=True)
         return serializer
 
-    def _validate_and_save_service_data(self, request):
+    def _validate_service_data(self, request):
         """
         :param request: Django request
+        :return: validated service data
+        """
+        validator = self._choose_service_validator(self.service_type)
+        with instrumentation.timed('serialize'):
+            return validator(request.data.get('service'))
+
+    def _save_service_data(self, service_data):
+        """
+        :param service_data: validated service data
         :return: Service Model object id (For Generic FK)
         """
+        model = self.service_content_type.model_class()
+        return model.objects.create(**payloads.offload_service_data(model, service_data)).id
 
-        serializer = self._choose_service_serializer(self.service_type)
-        serializer = self._validate_data(serializer, request.data.get('service'))
-        service = serializer.save()
-        return service.id
+    def _save_life_cycle(self, task_id, state, service_data):
+        """
+        :param task_id: id of task
+        :param state: state of life cycle entry
+        :param service_data: validated service data, None when request has no service
+        """
+        if journal.is_enabled():
+            # life cycle & service rows are written behind, see state_machine.journal
+            service = (self.service_content_type, service_data) if self.service else None
+            journal.record([journal.entry(task_id, state, service)])
+            return
+
+        life_cycle_data = {
+            'task_id': task_id,
+            'state': state
+        }
+
+        # if service present in request then save service data
+        if self.service:
+            # add content type and object_id in life_cycle_dict
+            life_cycle_data.update({
+                'content_type': self.service_content_type,
+                'object_id': self._save_service_data(service_data)
+            })
+
+        models.TransactionLifeCycle.objects.create(**life_cycle_data)
+
+    def _validate_bulk_item(self, validator, item):
+        """
+        :param validator: validator against which item is to be validated
+        :param item: single item of bulk request data
+        :return: validated data of item, requested service as (content_type, validated data) or None
+        """
+        if not type(item) is dict:
+            raise exceptions.ParseError({'detail': 'item must be of dict type.'})
+
+        data = validator(item)
+
+        service = None
+        if 'service' in item.keys():
+            service_validator = self._choose_service_validator(self._validate_service(item))
+            service = (self.service_content_type, service_validator(item.get('service')))
+
+        return data, service
+
+    def _validate_bulk_items(self, items, validator, build):
+        """
+        :param items: bulk request items
+        :param validator: validator against which every item is to be validated
+        :param build: callable building a bulk write object out of validated data & service
+        :return: list of (index, bulk write object) of valid items, result list holding errors of invalid items
+        """
+        valid_items = []
+        results = [None] * len(items)
+
+        for index, item in enumerate(items):
+            try:
+                with instrumentation.timed('serialize'):
+                    validated = self._validate_bulk_item(validator, item)
+                valid_items.append((index, build(*validated)))
+            except exceptions.APIException as exc:
+                results[index] = {
+                    'task_identifier': item.get('task_identifier') if type(item) is dict else None,
+                    'status': exc.status_code,
+                    'detail': exc.detail,
+                }
+
+        return valid_items, results
+
+    def _validate_bulk_request(self, request):
+        """
+        :param request: Django request
+        :return: list of bulk request items
+        """
+        if not type(request.data) is list:
+            raise exceptions.ParseError({'detail': 'request data must be of list type.'})
+        if len(request.data) > config.BULK_MAX_ITEMS:
+            raise exceptions.ParseError(
+                {'detail': 'at most {0} items are allowed per request.'.format(config.BULK_MAX_ITEMS)})
+        return request.data
+
+    def _raise_transition_error(self, task_identifier, new_state):
+        """Explain why a conditional transition was not applied, only called on failure path.
+
+        :param task_identifier: task unique identifier
+        :param new_state: requested state of task
+        """
+        task_instance = self.model.objects.filter(
+            task_identifier=task_identifier
+        ).only('task_name', 'state', 'retries').first()
+        if task_instance is None:
+            raise Http404
+        if not task_instance.transition_graph.allows(task_instance.state, new_state, task_instance.retries):
+            raise Conflict({'detail': 'transition from {0} to {1} is not allowed.'.format(task_instance.state,
+                                                                                         new_state)})
+        raise Conflict()
 
     def get_object(self, task_identifier):
         """
@@ -137,36 +307,33 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
             }
         }
         """
-        life_cycle_data = dict()
-
         # ----- validate request and its data ---- #
 
         # validate for service key
         self._validate_request(request)
 
-        # Validate for main Transaction state Model
-        transaction_state = self._validate_data(serializers.TransactionStateMachineSerializer, request.data)
-
-        # if service present oin request then save service data
-        if self.service:
-            service_object_id = self._validate_and_save_service_data(request)
-
-            # add content type and object_id in life_cycle_dict
-            life_cycle_data.update({
-                'content_type': self.service_content_type,
-                'object_id': service_object_id
-            })
+        # Validate for main Transaction state Model, uniqueness of `task_identifier` is left to database
+        with instrumentation.timed('serialize'):
+            task_data = validators.CREATE_STATE(request.data)
+        service_data = self._validate_service_data(request) if self.service else None
 
-        # save main Transaction
-        transaction = transaction_state.save()
+        with transaction.atomic():
+            # save main Transaction
+            created_at = modified_at = datetime.now()
+            try:
+                with transaction.atomic():
+                    task = self.model.objects.create(created_at=created_at, modified_at=modified_at, **task_data)
+            except IntegrityError as exc:
+                if not self._is_task_identifier_conflict(exc):
+                    raise
+                raise Conflict({'detail': 'task_identifier already exists.'})
 
-        life_cycle_data.update({
-            'task': transaction,
-            'state': request.data.get('state')
-        })
+            # save Transaction life cycle instance
+            self._save_life_cycle(task.id, task.state, service_data)
 
-        # save Transaction life cycle instance
-        models.TransactionLifeCycle.objects.create(**life_cycle_data)
+            signals.state_changed.send(sender=self.__class__, transitions=[
+                signals.Transition(task.task_identifier, task.task_name, None, task.state)
+            ])
 
         return Response(status=status.HTTP_200_OK)
 
@@ -175,31 +342,414 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
         :param request: Django request
         :param task_identifier: task identifier of whom you want to get current state
         :return: current state of any Transaction/Task
+
+            - state is served from read-through cache (when enabled), see `state_machine.cache`
         """
-        task_instance = self.get_object(task_identifier)
-        return Response({'current_state': task_instance.get_current_state}, status=status.HTTP_200_OK)
+        with routers.read_for([task_identifier]):
+            current_state = cache.get_current_state(task_identifier)
+        if current_state is None:
+            raise Http404
+        return Response({'current_state': current_state}, status=status.HTTP_200_OK)
+
+    def get_current_states(self, request):
+        """
+        :param request: Django request
+        :return: current states of many Transactions/Tasks
+
+        - POST, current states of listed tasks, served from read-through cache (when enabled) and a single
+          `IN` query for rest of them. Identifiers which do not exist are listed in `missing`.
+        - GET `?task_name_prefix=`, current states of tasks whose name starts with prefix, `BULK_MAX_ITEMS` of
+          them per page in order of creation. `has_more` tells whether more tasks match, `next` is URL of next
+          page (keyset cursor `?after=` on id), None on last page.
+
+        POST EXAMPLE :
+        {
+            "task_identifiers": ["1a", "1b", "1c"]
+        }
+
+        RESPONSE EXAMPLE :
+        {
+            "states": {"1a": "processing", "1b": "complete"},
+            "missing": ["1c"]
+        }
+        """
+        if request.method == 'GET':
+            task_name_prefix = request.query_params.get('task_name_prefix')
+            if not task_name_prefix:
+                raise exceptions.ParseError({'detail': 'task_name_prefix is required.'})
+            try:
+                after = int(request.query_params.get('after', 0))
+                if after < 0:
+                    raise ValueError(after)
+            except ValueError:
+                raise exceptions.ParseError({'detail': 'after must be a non-negative integer.'})
+
+            # one row more than a page tells whether there is a next page
+            rows = list(self.model.objects.filter(
+                task_name__startswith=task_name_prefix, id__gt=after
+            ).order_by('id').values_list('id', 'task_identifier', 'state')[:config.BULK_MAX_ITEMS + 1])
+            has_more = len(rows) > config.BULK_MAX_ITEMS
+            rows = rows[:config.BULK_MAX_ITEMS]
+            return Response({
+                'states': dict((task_identifier, state) for _, task_identifier, state in rows),
+                'missing': [],
+                'has_more': has_more,
+                'next': replace_query_param(request.build_absolute_uri(), 'after', rows[-1][0]) if has_more else None,
+            }, status=status.HTTP_200_OK)
+
+        serializer = self._validate_data(serializers.CurrentStatesSerializer, request.data)
+        task_identifiers = serializer.validated_data.get('task_identifiers')
+
+        with routers.read_for(task_identifiers):
+            states = cache.get_current_states(task_identifiers)
+        missing = [identifier for identifier in OrderedDict.fromkeys(task_identifiers) if identifier not in states]
+
+        return Response({'states': states, 'missing': missing}, status=status.HTTP_200_OK)
 
     def get_complete_transaction_life_cycle(self, request, task_identifier):
         """
         :param request: Django request
         :param task_identifier: task identifier of whom you want to get complete life cycle
         :return:
+
+            - `?stream=true` streams complete life cycle as a JSON array, fetched in keyset chunks.
+            - `?cursor=` and/or `?page_size=` returns one page of cursor paginated life cycle with
+              `next` & `previous` links.
+            - otherwise complete life cycle is returned as a JSON array.
+            - life cycle of an archived task is read back from archive, in same formats (see state_machine.archive).
+        """
+        pinned = routers.is_pinned([task_identifier])
+
+        with routers.use_primary(pinned):
+            task_instance = self.get_object(task_identifier)
+
+            if task_instance.archive:
+                return self._archived_life_cycle(request, task_instance)
+
+            if request.query_params.get('stream') in ('1', 'true'):
+                return StreamingHttpResponse(self._stream_life_cycle(task_instance, pinned),
+                                             content_type='application/json')
+
+            if 'cursor' in request.query_params or 'page_size' in request.query_params:
+                paginator = pagination.LifeCycleCursorPagination()
+                page = paginator.paginate_queryset(task_instance.fetch_complete_life_cycle, request, view=self)
+                serializer = serializers.TransactionLifeCycleSerializer(instance=page, many=True)
+                with instrumentation.timed('serialize'):
+                    data = serializer.data
+                return paginator.get_paginated_response(data)
+
+            serializer = serializers.TransactionLifeCycleSerializer(instance=task_instance.fetch_complete_life_cycle,
+                                                                    many=True)
+            with instrumentation.timed('serialize'):
+                data = serializer.data
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def _archived_life_cycle(self, request, task_instance):
+        """
+        :param request: Django request
+        :param task_instance: archived Transaction/task instance
+        :return: life cycle of task, as `get_complete_transaction_life_cycle` returns a live one, 503 when archive
+            can not be read on this host
+        """
+        try:
+            with instrumentation.timed('serialize'):
+                rows = archive.read_life_cycle(task_instance)
+        except archive.ArchiveUnavailable:
+            raise ServiceUnavailable({'detail': 'archived life cycle of task is unavailable.'})
+
+        if request.query_params.get('stream') in ('1', 'true'):
+            # already in memory, same body as a stream of a live life cycle
+            return HttpResponse(JSONEncoder().encode(rows), content_type='application/json')
+
+        if 'cursor' in request.query_params or 'page_size' in request.query_params:
+            return pagination.LifeCycleCursorPagination().paginate_list(rows, request)
+
+        return Response(rows, status=status.HTTP_200_OK)
+
+    def _stream_life_cycle(self, task_instance, pinned=False):
+        """
+        :param task_instance: Transaction/task instance
+        :param pinned: whether task is pinned to primary, generator runs after view returned
+        :return: generator of JSON array pieces
+        """
+        encoder = JSONEncoder()
+        separator = '['
+        with routers.use_primary(pinned):
+            for chunk in task_instance.iter_life_cycle(config.LIFE_CYCLE_STREAM_CHUNK_SIZE):
+                for row in serializers.TransactionLifeCycleSerializer(instance=chunk, many=True).data:
+                    yield separator + encoder.encode(row)
+                    separator = ','
+        yield '[]' if separator == '[' else ']'
+
+    def _read_state(self, task_identifier):
+        """
+        :param task_identifier: task unique identifier
+        :return: (task_name, state, version) read from primary, None if task does not exist
+        """
+        with routers.use_primary():
+            return self.model.objects.filter(
+                task_identifier=task_identifier
+            ).values_list('task_name', 'state', 'version').first()
+
+    def _wait_params(self, query_params, last_event_id=None):
+        """
+        :param query_params: query parameters of request
+        :param last_event_id: `Last-Event-ID` header of request, None when missing
+        :return: (states to wait for or None, version to wait past or None, timeout)
+        """
+        states = query_params.get('states')
+        if states:
+            states = frozenset(state.strip() for state in states.split(','))
+            if not states <= transitions.STATE_NAMES:
+                raise exceptions.ParseError({'detail': 'unknown states {0}.'.format(
+                    ', '.join(sorted(states - transitions.STATE_NAMES)))})
+
+        version = query_params.get('version', last_event_id)
+        timeout = query_params.get('timeout', config.WAIT['DEFAULT_TIMEOUT'])
+        try:
+            version = int(version) if version not in (None, '') else None
+            timeout = float(timeout)
+            if not math.isfinite(timeout):
+                # nan passes clamping below
+                raise ValueError(timeout)
+            timeout = min(max(timeout, 0), config.WAIT['MAX_TIMEOUT'])
+        except ValueError:
+            raise exceptions.ParseError({'detail': 'version must be an integer and timeout a number.'})
+        return states or None, version, timeout
+
+    @staticmethod
+    def _release_connections():
+        """Give database connections back (to pool) while request only waits.
+
+        """
+        for db in connections.all():
+            if not db.in_atomic_block:
+                db.close()
+
+    def wait_for_state(self, request, task_identifier):
+        """
+        :param request: Django request
+        :param task_identifier: task identifier of whom you want to wait for a state change
+        :return: current state once task changes, without busy polling
+
+            - `?states=complete,fail` waits until task is in one of those states, `?version=` waits until task
+              is past that version, otherwise waits for next committed change.
+            - `?timeout=` seconds, at most `WAIT['MAX_TIMEOUT']`, current state is returned with `timeout: true`
+              when nothing happened meanwhile.
+            - `Accept: text/event-stream` streams every change as a server-sent event (id is version, so
+              reconnecting clients resume with `Last-Event-ID`) until task reaches one of `states` or a terminal
+              state, for at most `WAIT['SSE_MAX_DURATION']` seconds.
+            - Waiters are woken by LISTEN/NOTIFY, see `state_machine.notifications`.
+            - Every waiter holds a worker thread until it returns, up to `WAIT['MAX_TIMEOUT']` (long-poll) or
+              `WAIT['SSE_MAX_DURATION']` seconds (stream). ASGI application (state_machine.asgi) serves this
+              endpoint on its event loop instead, only MessagePack requests reach this view there.
+
+        RESPONSE EXAMPLE :
+        {
+            "current_state": "complete",
+            "version": 4,
+            "timeout": false
+        }
+        """
+        states, version, timeout = self._wait_params(request.query_params, request.META.get('HTTP_LAST_EVENT_ID'))
+
+        # subscribe before reading, a change committed in between still wakes waiter
+        waiter = notifications.listener.subscribe(task_identifier)
+        try:
+            row = self._read_state(task_identifier)
+            if row is None:
+                raise Http404
+        except Exception:
+            notifications.listener.unsubscribe(waiter)
+            raise
+
+        if request.accepted_renderer.format == renderers.EventStreamRenderer.format:
+            response = StreamingHttpResponse(self._stream_state_events(task_identifier, waiter, row, states, version),
+                                             content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        try:
+            task_name, state, current_version = row
+            since = current_version if version is None else version
+            deadline = time.time() + timeout
+            while not (state in states if states else current_version > since):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._release_connections()
+                if not waiter.wait(remaining):
+                    continue
+                row = self._read_state(task_identifier)
+                if row is None:
+                    break
+                _, state, current_version = row
+        finally:
+            notifications.listener.unsubscribe(waiter)
+
+        reached = state in states if states else current_version > since
+        return Response({'current_state': state, 'version': current_version, 'timeout': not reached},
+                        status=status.HTTP_200_OK)
+
+    def _stream_state_events(self, task_identifier, waiter, row, states, last_version=None):
+        """
+        :param task_identifier: task unique identifier
+        :param waiter: subscribed Waiter of task
+        :param row: (task_name, state, version) at subscription
+        :param states: states which end stream, None for terminal states of task graph
+        :param last_version: version client has already seen, current state is not repeated for it
+        :return: generator of server-sent events
         """
-        task_instance = self.get_object(task_identifier)
-        serializer = serializers.TransactionLifeCycleSerializer(instance=task_instance.fetch_complete_life_cycle,
-                                                                many=True)
+        task_name, state, version = row
+        final_states = states or transitions.graph_for(task_name).terminal
+        deadline = time.time() + config.WAIT['SSE_MAX_DURATION']
+        try:
+            if version != last_version:
+                yield renderers.server_sent_event('state', {'current_state': state, 'version': version}, version)
+            while state not in final_states:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._release_connections()
+                if not waiter.wait(min(remaining, config.WAIT['HEARTBEAT'])):
+                    # comment line, keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                row = self._read_state(task_identifier)
+                if row is None:
+                    break
+                if row[2] != version:
+                    _, state, version = row
+                    yield renderers.server_sent_event('state', {'current_state': state, 'version': version},
+                                                      version)
+        finally:
+            notifications.listener.unsubscribe(waiter)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get_change_feed(self, request):
+        """
+        :param request: Django request
+        :return: state transitions of all tasks after a cursor, in order
+
+            - `?after=` cursor of last event consumer has seen (0 to start from beginning of feed), `?limit=` max
+              events per batch (default `FEED['BATCH_SIZE']`, at most `FEED['MAX_BATCH_SIZE']`).
+            - Returned `cursor` is `after` of next call, it is unchanged when there is nothing new. Events come in
+              order of transactions which committed them (see state_machine.feed), not of `id`.
+            - `?stream=true` tails the feed as NDJSON, one event per line, until `?timeout=` seconds (at most
+              `WAIT['SSE_MAX_DURATION']`) passed. New events wake it through LISTEN/NOTIFY, an empty line is
+              sent every `WAIT['HEARTBEAT']` seconds of silence.
+
+        RESPONSE EXAMPLE :
+        {
+            "events": [
+                {"cursor": "1870-101", "id": 101, "task_identifier": "1a", "task_name": "My first Task",
+                 "state": "processing", "created_at": "2017-03-16T11:33:00.000000Z"}
+            ],
+            "cursor": "1870-101",
+            "has_more": false
+        }
+        """
+        try:
+            after = feed.parse_cursor(request.query_params.get('after', '0'))
+            limit = int(request.query_params.get('limit', config.FEED['BATCH_SIZE']))
+            timeout = float(request.query_params.get('timeout', config.WAIT['SSE_MAX_DURATION']))
+            if not math.isfinite(timeout):
+                # nan passes clamping below
+                raise ValueError(timeout)
+        except ValueError:
+            raise exceptions.ParseError({'detail': 'after must be a feed cursor, limit an integer and timeout a '
+                                                   'number.'})
+        limit = min(max(limit, 1), config.FEED['MAX_BATCH_SIZE'])
+
+        if request.query_params.get('stream') in ('1', 'true'):
+            timeout = min(max(timeout, 0), config.WAIT['SSE_MAX_DURATION'])
+            return StreamingHttpResponse(self._stream_change_feed(after, limit, timeout),
+                                         content_type='application/x-ndjson')
+
+        events = feed.read_events(after, limit)
+        return Response({
+            'events': events,
+            'cursor': events[-1]['cursor'] if events else feed.format_cursor(after),
+            'has_more': len(events) == limit,
+        }, status=status.HTTP_200_OK)
+
+    def _stream_change_feed(self, after, limit, timeout):
+        """
+        :param after: (txid, id) to start after
+        :param limit: max events read per query
+        :param timeout: seconds to tail feed for
+        :return: generator of NDJSON lines
+        """
+        encoder = JSONEncoder()
+        deadline = time.time() + timeout
+        waiter = notifications.listener.subscribe(notifications.ALL)
+        try:
+            while True:
+                events = feed.read_events(after, limit)
+                for event in events:
+                    yield encoder.encode(event) + '\n'
+                if events:
+                    after = feed.parse_cursor(events[-1]['cursor'])
+                    if len(events) == limit:
+                        continue
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._release_connections()
+                # events become readable when older transactions end, without notification, so wait at most a
+                # heartbeat
+                if not waiter.wait(min(remaining, config.WAIT['HEARTBEAT'])):
+                    yield '\n'
+        finally:
+            notifications.listener.unsubscribe(waiter)
+
+    def get_statistics(self, request):
+        """
+        :param request: Django request
+        :return: number of tasks per task name per state & transitions per minute
+
+            - `?task_name=` limits both to one task name, `?minutes=` number of past minutes of rates (default
+              `STATISTICS['RATE_WINDOW']`, at most `STATISTICS['MAX_RATE_WINDOW']`).
+            - Read from counters maintained on every transition, cost grows with number of task names, states &
+              minutes, not with number of tasks.
+
+        RESPONSE EXAMPLE :
+        {
+            "counts": {"My first Task": {"complete": 120, "processing": 4}},
+            "rates": [
+                {"minute": "2017-03-16T11:33:00Z", "transitions": {"My first Task": {"complete": 3}}}
+            ],
+            "minutes": 60
+        }
+        """
+        task_name = request.query_params.get('task_name')
+        try:
+            minutes = int(request.query_params.get('minutes', config.STATISTICS['RATE_WINDOW']))
+        except ValueError:
+            raise exceptions.ParseError({'detail': 'minutes must be an integer.'})
+        minutes = min(max(minutes, 1), config.STATISTICS['MAX_RATE_WINDOW'])
+
+        return Response({
+            'counts': statistics.state_counts(task_name),
+            'rates': statistics.transition_rates(minutes, task_name),
+            'minutes': minutes,
+        }, status=status.HTTP_200_OK)
 
     def change_state(self, request, task_identifier):
         """
         :param request: Django request
         :param task_identifier: task identifier of whom you want to get complete life cycle
-        :return: 200_ok
+        :return: 200_ok with new state & version of task, 409 if task does not meet expectations of request
+
+        - state is changed by a single conditional `UPDATE ... RETURNING` statement, see
+          `TransactionStateMachineQuerySet.transition`.
 
         POST EXAMPLE :
         {
             "state": "fail",
+            "expected_state": "processing",
             "service": {
                 "type":"http",
                 "upstream_url": "http://localhost:8002",
@@ -216,37 +766,304 @@ class TransactionStateViewSet(viewsets.GenericViewSet):
             }
         }
 
+        RESPONSE EXAMPLE :
+        {
+            "state": "fail",
+            "version": 3
+        }
         """
-        life_cycle_data = dict()
-        task_instance = self.get_object(task_identifier)
-
         # ----- validate request and its data ---- #
 
         # validate new state
-        serializer = self._validate_data(serializers.ChangeStateSerializer, request.data)
+        with instrumentation.timed('serialize'):
+            change_data = validators.CHANGE_STATE(request.data)
+        new_state = change_data.get('state')
 
         # validate for service key
         self._validate_request(request)
 
-        # if service present oin request then save service data
-        if self.service:
-            service_object_id = self._validate_and_save_service_data(request)
+        # validate service data before touching the task
+        service_data = self._validate_service_data(request) if self.service else None
 
-            # add content type and object_id in life_cycle_dict
-            life_cycle_data.update({
-                'content_type': self.service_content_type,
-                'object_id': service_object_id
-            })
+        with transaction.atomic():
+            # update state, only if task meets expectations of request
+            result = self.model.objects.transition(task_identifier, new_state,
+                                                   expected_state=change_data.get('expected_state'),
+                                                   expected_version=change_data.get('expected_version'))
+            if result is None:
+                self._raise_transition_error(task_identifier, new_state)
 
-        life_cycle_data.update({
-            'task': task_instance,
-            'state': serializer.data.get('state')
-        })
+            # save Transaction life cycle instance
+            self._save_life_cycle(result.id, new_state, service_data)
 
-        # update state
-        task_instance.change_state(serializer.data.get('state'))
+            signals.state_changed.send(sender=self.__class__, transitions=[
+                signals.Transition(task_identifier, result.task_name, result.previous_state, new_state)
+            ])
 
-        # save Transaction life cycle instance
-        models.TransactionLifeCycle.objects.create(**life_cycle_data)
+        return Response({'state': new_state, 'version': result.version}, status=status.HTTP_200_OK)
+
+    def bulk_change_state(self, request):
+        """
+        :param request: Django request
+        :return: 200_ok with result of every item, in same order as request data
+
+        - Every item is validated on its own, invalid or unknown items are reported in their result
+          and do not stop the rest of the batch.
+
+        POST EXAMPLE :
+        [
+            {
+                "task_identifier": "1a",
+                "state": "complete",
+                "expected_state": "processing"
+            },
+            {
+                "task_identifier": "1b",
+                "state": "complete",
+                "service": {
+                    "type":"http",
+                    "upstream_url": "http://localhost:8002",
+                    "method": "post",
+                    "dataOut": {
+                        "user_id": "1"
+                    }
+                }
+            }
+        ]
+
+        RESPONSE EXAMPLE :
+        [
+            {"task_identifier": "1a", "status": 200, "state": "complete", "version": 2},
+            {"task_identifier": "1b", "status": 404, "detail": "Not found."}
+        ]
+        """
+        items = self._validate_bulk_request(request)
+
+        # ----- validate every item, collect errors per item ---- #
+        changes, results = self._validate_bulk_items(
+            items,
+            validators.BULK_CHANGE_STATE,
+            bulk.StateChange.from_validated_data
+        )
+
+        # ----- apply all valid changes at once ---- #
+        for index, result in bulk.apply_state_changes(changes):
+            results[index] = result
 
-        return Response(status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(results, status=status.HTTP_200_OK)
+
+    def bulk_create_initial_state(self, request):
+        """
+        :param request: Django request
+        :return: 200_ok with result of every item, in same order as request data
+
+        - Accepts a JSON array or a NDJSON stream (`Content-Type: application/x-ndjson`) of items having
+          same format as `create_initial_state`.
+        - An already existing (or repeated) `task_identifier` is reported as 409 for that item only.
+
+        POST EXAMPLE :
+        [
+            {
+                "task_name": "My first Task",
+                "task_identifier": "1a",
+                "state":"init"
+            },
+            {
+                "task_name": "My first Task",
+                "task_identifier": "1a",
+                "state":"init"
+            }
+        ]
+
+        RESPONSE EXAMPLE :
+        [
+            {"task_identifier": "1a", "status": 200, "state": "init"},
+            {"task_identifier": "1a", "status": 409, "detail": "task_identifier already exists."}
+        ]
+        """
+        items = self._validate_bulk_request(request)
+
+        # ----- validate every item, collect errors per item ---- #
+        new_tasks, results = self._validate_bulk_items(
+            items,
+            validators.CREATE_STATE,
+            lambda data, service: bulk.NewTask(data.get('task_name'), data.get('task_identifier'),
+                                               data.get('state'), service)
+        )
+
+        # ----- insert all valid tasks at once ---- #
+        for index, result in bulk.create_tasks(new_tasks):
+            results[index] = result
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class StateEventStreamView(View):
+    """Streaming ingestion of state change events.
+
+        - Request body is a NDJSON stream, every line is an item having same format as `bulk_change_state`.
+        - Body is read line by line through a generator pipeline (lines -> events -> micro batches), it is never
+          buffered as a whole, and every micro batch is committed on its own via `bulk.apply_state_changes`.
+        - Response is a NDJSON stream too, one line per committed micro batch, so producers get acks while
+          they are still sending.
+        - This is a plain Django view, so DRF content negotiation, parsing & authentication are skipped.
+    """
+
+    def _read_lines(self, request):
+        """
+        :param request: Django request
+        :return: generator of raw body lines
+        """
+        wsgi_input = request.META.get('wsgi.input')
+        if not request.META.get('CONTENT_LENGTH') and request.META.get('wsgi.input_terminated') and wsgi_input:
+            # chunked request, server de-chunks it and marks end of input for us
+            return iter(wsgi_input.readline, b'')
+        return iter(request)
+
+    def _parse_events(self, lines):
+        """
+        :param lines: raw body lines
+        :return: generator of (line number, event or None, error or None)
+        """
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line.decode('utf-8')), None
+            except ValueError as exc:
+                yield line_number, None, 'JSON parse error - {0}'.format(exc)
+
+    def _batches(self, events, batch_size):
+        """
+        :param events: parsed events
+        :param batch_size: max events per batch
+        :return: generator of event lists
+        """
+        batch = []
+        for event in events:
+            batch.append(event)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _apply_batch(self, batch):
+        """
+        :param batch: list of (line number, event or None, error or None)
+        :return: batch acknowledgement
+        """
+        # items are validated exactly like `bulk_change_state` items
+        validator = TransactionStateViewSet()
+        changes, errors = [], []
+
+        for line_number, event, error in batch:
+            if error is not None:
+                errors.append({'line': line_number, 'status': 400, 'detail': error})
+                continue
+            try:
+                data, service = validator._validate_bulk_item(validators.BULK_CHANGE_STATE, event)
+            except exceptions.APIException as exc:
+                errors.append({'line': line_number, 'status': exc.status_code, 'detail': exc.detail})
+                continue
+            changes.append((line_number, bulk.StateChange.from_validated_data(data, service)))
+
+        applied = 0
+        for line_number, result in bulk.apply_state_changes(changes):
+            if result['status'] == status.HTTP_200_OK:
+                applied += 1
+            else:
+                result['line'] = line_number
+                errors.append(result)
+
+        return {'events': len(batch), 'applied': applied, 'errors': sorted(errors, key=lambda e: e['line'])}
+
+    def _acknowledge(self, batches):
+        """
+        :param batches: generator of event batches
+        :return: generator of NDJSON acknowledgement lines
+        """
+        for number, batch in enumerate(batches, start=1):
+            ack = self._apply_batch(batch)
+            ack['batch'] = number
+            yield json.dumps(ack) + '\n'
+
+    def _batch_size(self, request):
+        """
+        :param request: Django request
+        :return: requested micro batch size, bounded by `STREAM_MAX_BATCH_SIZE`
+        """
+        try:
+            batch_size = int(request.GET.get('batch_size', config.STREAM_BATCH_SIZE))
+        except ValueError:
+            batch_size = config.STREAM_BATCH_SIZE
+        return max(1, min(batch_size, config.STREAM_MAX_BATCH_SIZE))
+
+    def post(self, request):
+        """
+        :param request: Django request
+        :return: NDJSON stream of batch acknowledgements
+
+        POST EXAMPLE (Content-Type: application/x-ndjson) :
+        {"task_identifier": "1a", "state": "processing"}
+        {"task_identifier": "1b", "state": "complete"}
+
+        RESPONSE EXAMPLE :
+        {"batch": 1, "events": 2, "applied": 1, "errors": [{"line": 2, "status": 404, ...}]}
+        """
+        events = self._parse_events(self._read_lines(request))
+        batches = self._batches(events, self._batch_size(request))
+        return StreamingHttpResponse(self._acknowledge(batches), content_type='application/x-ndjson')
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class DatabaseHealthView(View):
+    """Health check of databases, for load balancers & monitoring.
+
+        - Runs `SELECT 1` on every configured database and reports its latency, plus connection pool metrics
+          (`in_use`, `idle`, waits & wait time) when database uses pooled backend `state_machine.db`.
+        - 503 when any database does not answer.
+    """
+
+    def get(self, request):
+        """
+        :param request: Django request
+        :return: 200_ok / 503 with status of every database
+        """
+        healthy, databases = True, OrderedDict()
+        for alias in connections:
+            database = OrderedDict()
+            started = time.time()
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                database['status'] = 'ok'
+            except DatabaseError as exc:
+                healthy = False
+                database['status'] = 'error'
+                database['error'] = str(exc).strip()
+            database['latency'] = round(time.time() - started, 6)
+
+            pool_stats = getattr(connections[alias], 'pool_stats', None)
+            if pool_stats is not None:
+                database['pool'] = pool_stats()
+            databases[alias] = database
+
+        return JsonResponse({'status': 'ok' if healthy else 'error', 'databases': databases},
+                            status=200 if healthy else 503)
+
+
+class MetricsView(View):
+    """Prometheus metrics of this worker process (see state_machine.instrumentation).
+
+    """
+
+    def get(self, request):
+        """
+        :param request: Django request
+        :return: metrics in Prometheus text exposition format
+        """
+        return HttpResponse(instrumentation.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')